@@ -1,8 +1,6 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.graph_objects as go
-import numpy_financial as npf
 from datetime import datetime
 from io import BytesIO
 from openpyxl import Workbook
@@ -11,28 +9,62 @@ from openpyxl.utils.dataframe import dataframe_to_rows
 from openpyxl.worksheet.datavalidation import DataValidation
 from openpyxl.styles import Border, Side, Alignment
 from statistics import median
-
+from underwriting import (
+    DEFAULT_SIMULATED_PATHS,
+    GROWTH_BOUNDS,
+    HOLDING_PERIOD_GRID,
+    LEAGUE_AVERAGE_MULTIPLE,
+    DealInputs,
+    comps_multiple,
+    deal_key,
+    default_config,
+    generate_quarters,
+    get_surface,
+    load_registry,
+    quarter_to_year,
+    render_table,
+    simulate_stream,
+    source_version,
+    table_stylesheet,
+)
+from underwriting import metrics
+from underwriting.charts import sensitivity_heatmap
+from underwriting.excel_export import record_deal
+from underwriting.export_panel import export_controls
+from underwriting.debug_panel import render_metrics_panel, start_rerun
+from underwriting.stages import (
+    comparables_stage,
+    deal_stage,
+    growth_chart_stage,
+    growth_solution_stage,
+    multiple_chart_stage,
+    projections_stage,
+    quarters_stage,
+    scrubber_stage,
+    summary_stage,
+)
+
+
+# Per-stage timing and memory for this run, recorded only when NBA_MODEL_METRICS is set
+rerun_metrics = start_rerun()
 
 # Page Title
 st.title("NBA Team Underwriting Dashboard")
 
-def generate_quarters(start_year, end_year):
-    quarters = []
-    for year in range(start_year, end_year + 1):
-        for quarter in range(1, 5):
-            quarters.append(f"{quarter}Q{year % 100:02d}")
-    return quarters
-
 quarter_options = generate_quarters(2025, 2040)
 
+# Teams and comparable transactions are loaded once from data/
+registry = load_registry()
+
 # Team Selection Dropdown
-team = st.selectbox("Select Team", options=["Select Team", "Boston Celtics"], index=0)
+team = st.selectbox("Select Team", options=["Select Team"] + registry.team_names(), index=0)
 
 # Set financial inputs based on the selected team
-if team == "Boston Celtics":
-    starting_revenue = 390
-    starting_debt = 325
-    starting_enterprise_value = 5660
+if team != "Select Team":
+    target = registry.team(team)
+    starting_revenue = target.starting_revenue
+    starting_debt = target.starting_debt
+    starting_enterprise_value = target.starting_enterprise_value
 
     st.sidebar.header("Inputs")
 
@@ -54,32 +86,30 @@ if team == "Boston Celtics":
     exit_quarter = st.sidebar.selectbox("Exit Quarter", options=quarter_options, index=quarter_options.index("2Q32"))
     desired_moic = st.sidebar.number_input("Desired MOIC (x)", min_value=1.0, value=2.5, step=0.1)
 
-    def quarter_to_year(quarter):
-        try:
-            quarter_num = int(quarter[0])
-            if quarter_num not in [1, 2, 3, 4]:
-                raise ValueError("Quarter must be between 1 and 4.")
-            year = int("20" + quarter[2:])
-            return year + (quarter_num - 1) / 4
-        except (ValueError, IndexError):
-            st.error("Invalid quarter format. Use the format '1Q25'.")
-        return None
-
-    entry_year = quarter_to_year(entry_quarter)
-    exit_year = quarter_to_year(exit_quarter)
+    try:
+        entry_year = quarter_to_year(entry_quarter)
+        exit_year = quarter_to_year(exit_quarter)
+    except ValueError as e:
+        st.error(str(e))
+        st.stop()
     holding_period_years = exit_year - entry_year
 
     # Initial TEV/Revenue multiple
     entry_tev_revenue = starting_enterprise_value / starting_revenue
 
+    # Closest comparable transactions by revenue, EV, market size and recency; they drive
+    # the comps multiple, the growth comparison chart and the Comparable Transactions sheet
+    comparables = comparables_stage(team, starting_revenue, starting_enterprise_value)
+    comps_tev_revenue = round(comps_multiple(comparables), 1)
+
     def reset_to_average():
-        return 11.9
+        return LEAGUE_AVERAGE_MULTIPLE
 
     def reset_to_entry():
         return entry_tev_revenue
 
     def reset_to_comps():
-        return 13.1
+        return comps_tev_revenue
 
     new_tev_revenue = entry_tev_revenue
     
@@ -95,128 +125,71 @@ if team == "Boston Celtics":
             new_tev_revenue = reset_to_average()
 
     with col_set_buttons[2]:
-        if st.button("Closest Comps Multiple"):
+        if st.button("Closest Comps Multiple", disabled=not comparables):
             new_tev_revenue = reset_to_comps()
 
         
     st.header("TEV/Revenue Multiple Scale")
-    new_tev_revenue = st.slider("Adjust Exit TEV/Revenue Multiple", min_value=5.0, max_value=20.0, value=new_tev_revenue, step=0.1)
+    # Optionally precompute every slider position into the chart so scrubbing stays in the browser
+    scrub_in_browser = st.toggle("Scrub Exit Multiple In Browser")
+    if not scrub_in_browser:
+        new_tev_revenue = st.slider("Adjust Exit TEV/Revenue Multiple", min_value=5.0, max_value=20.0, value=new_tev_revenue, step=0.1)
 
     # Graph 1
-    fig_tev_revenue = go.Figure()
-    fig_tev_revenue.add_trace(go.Bar(
-        x=["Entry", "NBA Average", "Comps", "Exit"],
-        y=[entry_tev_revenue, 11.9, 13.1, new_tev_revenue],
-        marker_color=["#007A33", "gray", "navy", "#007A33"],
-        text=[f"{entry_tev_revenue:.1f}", "11.9", "13.1", f"{new_tev_revenue:.1f}"],
-        textposition="outside"
-    ))
-    fig_tev_revenue.update_layout(
-        title="TEV/Revenue Comparison",
-        yaxis_title="TEV/Revenue Multiple",
-        template="plotly_white",
-        barmode="group",
-        height=500,
-        width=600
-    )
-
-    def solve_for_revenue_growth():
-        def objective(revenue_growth):
-            exit_revenue = starting_revenue * ((1 + revenue_growth / 100) ** holding_period_years)
-            exit_tev = exit_revenue * new_tev_revenue
-            moic = exit_tev / starting_enterprise_value
-            return abs(moic - desired_moic)
-
-        from scipy.optimize import minimize
-        result = minimize(objective, x0=[10], bounds=[(0, 30)])
-        return result.x[0]
+    fig_tev_revenue = multiple_chart_stage(entry_tev_revenue, LEAGUE_AVERAGE_MULTIPLE, comps_tev_revenue, new_tev_revenue, target.color)
 
-    required_revenue_growth = solve_for_revenue_growth()
+    growth_solution = growth_solution_stage(
+        desired_moic, starting_enterprise_value, starting_revenue, new_tev_revenue, holding_period_years
+    )
+    required_revenue_growth = growth_solution.revenue_growth
+    if not growth_solution.feasible:
+        st.warning(
+            f"A {desired_moic:.1f}x MOIC is not reachable with revenue growth between "
+            f"{GROWTH_BOUNDS[0]:.0f}% and {GROWTH_BOUNDS[1]:.0f}%; showing {required_revenue_growth:.1f}%."
+        )
 
     # Graph 2
-    comparables = {"Warriors": 14, "Knicks": 12, "Lakers": 9}
-    fig_growth = go.Figure()
-    fig_growth.add_trace(go.Bar(
-        x=list(comparables.keys()) + ["Required"],
-        y=list(comparables.values()) + [required_revenue_growth],
-        marker_color=["#FFC72C", "#006BB6", "#552583", "#007A33"],
-        text=[f"{val:.1f}" for val in list(comparables.values()) + [required_revenue_growth]],
-        textposition="outside"
+    fig_growth = growth_chart_stage(comparables, required_revenue_growth, target.color)
+
+    # Underwrite on enterprise value (debt is not netted out in this model)
+    deal = deal_stage(DealInputs(
+        ownership_stake=ownership_stake,
+        starting_enterprise_value=starting_enterprise_value,
+        starting_revenue=starting_revenue,
+        revenue_growth=required_revenue_growth,
+        exit_multiple=new_tev_revenue,
+        holding_period_years=holding_period_years,
+        starting_debt=starting_debt,
+        include_debt=False,
     ))
-    fig_growth.update_layout(
-        title="Implied Revenue Growth Rate vs Comparables",
-        yaxis_title="Revenue Growth Rate (%)",
-        template="plotly_white",
-        barmode="group",
-        height=500,
-        width=600
+    projected_revenue = deal.projected_revenue
+    cash_flows = deal.cash_flows
+    entry_cash_flow = deal.entry_cash_flow
+    exit_cash_flow = deal.exit_cash_flow
+    irr = deal.irr
+    moic = deal.moic
+
+    with metrics.span("charts"):
+        if scrub_in_browser:
+            st.plotly_chart(
+                scrubber_stage(deal.inputs, entry_tev_revenue, LEAGUE_AVERAGE_MULTIPLE, comps_tev_revenue, target.color, desired_moic=desired_moic),
+                use_container_width=True
+            )
+            st.plotly_chart(fig_growth, use_container_width=True)
+        else:
+            col1, col2 = st.columns(2)
+            with col1:
+                st.plotly_chart(fig_tev_revenue, use_container_width=True)
+            with col2:
+                st.plotly_chart(fig_growth, use_container_width=True)
+
+    # Projections DataFrame (also exported) and its HTML table
+    projections_styled, html_table = projections_stage(
+        deal.inputs, int(entry_year), (("Revenue", "projected_revenue"), ("Cash Flow", "cash_flows")), corner=" "
     )
 
-    col1, col2 = st.columns(2)
-    with col1:
-        st.plotly_chart(fig_tev_revenue, use_container_width=True)
-    with col2:
-        st.plotly_chart(fig_growth, use_container_width=True)
-
-    projected_revenue = [starting_revenue * ((1 + required_revenue_growth / 100) ** year) for year in range(int(holding_period_years) + 1)]
-    entry_cash_flow = ownership_stake / 100 * starting_enterprise_value
-    exit_cash_flow = ownership_stake / 100 * (projected_revenue[-1] * new_tev_revenue)
-
-    cash_flows = [
-        -entry_cash_flow
-    ] + [0] * (int(holding_period_years) - 1) + [exit_cash_flow]
-
-    def calculate_irr(cash_flows):
-        return npf.irr(cash_flows) * 100
-
-    irr = calculate_irr(cash_flows)
-    moic = exit_cash_flow / abs(entry_cash_flow)
-
-    def generate_styled_table(df):
-        table_html = '<table style="border-collapse: collapse; width: 100%; font-family: Arial, sans-serif;">'
-        table_html += '<tr style="background-color: #0056b3; color: white; font-weight: bold; text-align: center;">'
-        for col in df.columns:
-            table_html += f'<th style="padding: 10px; border: 1px solid #ddd;">{col}</th>'
-        table_html += '</tr>'
-        for _, row in df.iterrows():
-            table_html += '<tr style="background-color: white; text-align: center;">'
-            for cell in row:
-                # Format numbers to 1 decimal place and handle negatives with parentheses
-                if isinstance(cell, (float, int)):
-                    formatted_cell = f"({abs(cell):,.1f})" if cell < 0 else f"{cell:,.1f}"
-                else:
-                    formatted_cell = cell  # Keep non-numeric cells as is
-                table_html += f'<td style="padding: 10px; border: 1px solid #ddd;">{formatted_cell}</td>'
-            table_html += '</tr>'
-        table_html += '</table>'
-        return table_html
-
-    projections_styled = pd.DataFrame({
-        " ": ["Revenue", "Cash Flow"],
-        **{f"{int(entry_year) + i}": [projected_revenue[i], cash_flows[i]] for i in range(len(projected_revenue))}
-    })
-
-
-    # Generate the styled HTML table
-    html_table = generate_styled_table(projections_styled)
-
-    def generate_quarters_table_html_horizontal(df):
-        html = '<table style="width: 100%; border-collapse: collapse;">'
-        html += '<thead><tr style="background-color: #0056b3; color: white; text-align: center;">'
-        html += ''.join(f'<th style="padding: 8px; border: 1px solid #ddd;">{col}</th>' for col in df.columns)
-        html += '</tr></thead><tbody>'
-        for _, row in df.iterrows():
-            html += '<tr>'
-            for cell in row:
-                # Format numbers to 1 decimal place and handle negatives with parentheses
-                if isinstance(cell, (float, int)):
-                    formatted_cell = f"({abs(cell):,.1f})" if cell < 0 else f"{cell:,.1f}"
-                else:
-                    formatted_cell = cell  # Keep non-numeric cells as is
-                html += f'<td style="padding: 8px; border: 1px solid #ddd; text-align: center;">{formatted_cell}</td>'
-            html += '</tr>'
-        html += '</tbody></table>'
-        return html
+    # Stylesheet shared by the HTML tables below
+    st.markdown(table_stylesheet(), unsafe_allow_html=True)
 
     # Toggle for displaying quarterly data
     st.subheader("Projected Financials (in $MM)")
@@ -224,62 +197,15 @@ if team == "Boston Celtics":
     view_option = st.selectbox("View By", options=["Years", "Quarters"], index=0)
 
     if view_option == "Quarters":
-        # Generate quarters data for the expanded view
-        quarter_labels = []
-        revenue_row = []
-        cash_flow_row = []
-
-        for year_idx, annual_revenue in enumerate(projected_revenue):
-            year = int(entry_year) + year_idx
-            for q in range(1, 5):
-                quarter_label = f"{q}Q{str(year)[-2:]}"
-                quarter_labels.append(quarter_label)
-
-                # Divide annual revenue by 4 for each quarter (keep as numeric)
-                revenue_row.append(annual_revenue / 4)
-
-                # Cash flow logic (keep as numeric)
-                if quarter_label == entry_quarter:
-                    # Entry Quarter: Investment (negative cash flow)
-                    cash_flow_row.append(cash_flows[0])
-                elif quarter_label == exit_quarter:
-                    # Exit Quarter: Return (positive cash flow)
-                    cash_flow_row.append(cash_flows[-1])
-                else:
-                    # Intermediate Quarters: No cash flow
-                    cash_flow_row.append(0.0)
-
-        # Create a DataFrame for the quarters table
-        quarters_table = pd.DataFrame(
-            [revenue_row, cash_flow_row],
-            columns=quarter_labels,
-            index=["Revenue", "Cash Flow"]
-        ).reset_index()
-
-        quarters_table.rename(columns={"index": ""}, inplace=True)
-
-        # Generate the styled HTML table
-        def generate_quarters_table_html_horizontal(df):
-            html = '<table style="width: 100%; border-collapse: collapse;">'
-            html += '<thead><tr style="background-color: #0056b3; color: white; text-align: center;">'
-            html += ''.join(f'<th style="padding: 8px; border: 1px solid #ddd;">{col}</th>' for col in df.columns)
-            html += '</tr></thead><tbody>'
-            for _, row in df.iterrows():
-                html += '<tr>'
-                for cell in row:
-                    # Format numbers to 1 decimal place and handle negatives with parentheses
-                    if isinstance(cell, (float, int)):
-                        formatted_cell = f"({abs(cell):,.1f})" if cell < 0 else f"{cell:,.1f}"
-                    else:
-                        formatted_cell = cell  # Keep non-numeric cells as is
-                    html += f'<td style="padding: 8px; border: 1px solid #ddd; text-align: center;">{formatted_cell}</td>'
-                html += '</tr>'
-            html += '</tbody></table>'
-            return html
-
-        # Generate and display the styled HTML table
-        html_quarters_table = generate_quarters_table_html_horizontal(quarters_table)
+        # Quarter-by-quarter revenue and cash flows from the entry quarter to the exit quarter
+        quarterly, html_quarters_table = quarters_stage(deal.inputs, entry_quarter, exit_quarter)
+        quarter_labels = quarterly.labels
+        revenue_row = quarterly.revenue
+        cash_flow_row = quarterly.cash_flows
+
+        # Display the styled HTML table
         st.markdown(html_quarters_table, unsafe_allow_html=True)
+        st.caption(f"Quarter-precise XIRR on quarter-end dates: {quarterly.irr:.1f}%")
 
     else:
         # Show the original yearly table
@@ -288,46 +214,48 @@ if team == "Boston Celtics":
 
     st.subheader("Investment Summary (in $MM)")
         
-    investment_summary = pd.DataFrame({
-        "Metric": [
-            "Entry Equity",
-            "Exit Equity",
-            "IRR (%)",
-            "MOIC",
-            "Entry Multiple",
-            "Exit Multiple",
-            "Implied Revenue Growth Rate (%)"
-        ],
-        "Value": [
-            f"${entry_cash_flow:,.0f}",
-            f"${exit_cash_flow:,.0f}",
-            f"{irr:.1f}%",
-            f"{moic:.1f}x",
-            f"{entry_tev_revenue:.1f}x",
-            f"{new_tev_revenue:.1f}x",
-            f"{required_revenue_growth:.1f}%"
-        ]
-    })
-    
-    def generate_summary_table_html(df):
-        html = '<table style="width: 100%; border-collapse: collapse;">'
-        html += '<thead><tr style="background-color: #0056b3; color: white; text-align: left;">'
-        html += ''.join(f'<th style="padding: 8px; border: 1px solid #ddd;">{col}</th>' for col in df.columns)
-        html += '</tr></thead><tbody>'
-        for _, row in df.iterrows():
-            html += '<tr>'
-            for col_idx, cell in enumerate(row):
-                if col_idx == 1:  # Right-align the second column (Value column)
-                    html += f'<td style="padding: 8px; border: 1px solid #ddd; text-align: right;">{cell}</td>'
-                else:  # Left-align the first column (Metric column)
-                    html += f'<td style="padding: 8px; border: 1px solid #ddd; text-align: left;">{cell}</td>'
-            html += '</tr>'
-        html += '</tbody></table>'
-        return html
-
+    investment_summary, html_summary = summary_stage((
+        ("Entry Equity", f"${entry_cash_flow:,.0f}"),
+        ("Exit Equity", f"${exit_cash_flow:,.0f}"),
+        ("IRR (%)", f"{irr:.1f}%"),
+        ("MOIC", f"{moic:.1f}x"),
+        ("Entry Multiple", f"{entry_tev_revenue:.1f}x"),
+        ("Exit Multiple", f"{new_tev_revenue:.1f}x"),
+        ("Implied Revenue Growth Rate (%)", f"{required_revenue_growth:.1f}%"),
+    ))
 
     # Display the table
-    st.markdown(generate_summary_table_html(investment_summary), unsafe_allow_html=True)
+    st.markdown(html_summary, unsafe_allow_html=True)
+
+    # IRR sensitivity over every exit multiple / revenue growth position, precomputed once per deal
+    if st.checkbox("Show IRR Sensitivity Heatmap") and 1 <= deal.inputs.projection_years <= HOLDING_PERIOD_GRID[-1]:
+        with metrics.span("sensitivity_heatmap"):
+            surface = get_surface(deal.inputs)
+            st.plotly_chart(
+                sensitivity_heatmap(surface, deal.inputs.projection_years, marker=(new_tev_revenue, required_revenue_growth)),
+                use_container_width=True
+            )
+
+    # Monte Carlo distribution of returns around the point estimate, streamed as chunks finish
+    if st.checkbox("Run Monte Carlo Simulation"):
+        simulated_paths = int(st.number_input("Simulated Paths", min_value=10000, value=DEFAULT_SIMULATED_PATHS, step=25000))
+        mc_progress = st.progress(0.0)
+        mc_table = st.empty()
+        with metrics.span("monte_carlo"):
+            for mc in simulate_stream(default_config(deal.inputs), simulated_paths, seed=0):
+                mc_progress.progress(mc.paths / simulated_paths)
+                mc_summary = pd.DataFrame({
+                    "Metric": ["Paths", "P5 IRR (%)", "P50 IRR (%)", "P95 IRR (%)", "Mean MOIC", "P(MOIC < 1x)"],
+                    "Value": [
+                        f"{mc.paths:,}",
+                        f"{mc.irr_p5:.1f}%",
+                        f"{mc.irr_p50:.1f}%",
+                        f"{mc.irr_p95:.1f}%",
+                        f"{mc.mean_moic:.1f}x",
+                        f"{mc.prob_moic_below_1:.1%}"
+                    ]
+                })
+                mc_table.markdown(render_table(mc_summary, "summary", value_column_class="value"), unsafe_allow_html=True)
 
 
     # Function to style Excel headers
@@ -449,15 +377,16 @@ if team == "Boston Celtics":
     def add_comparable_transactions_sheet(wb):
         # Add Comparable Transactions Sheet
         ws_comparables = wb.create_sheet(title="Comparable Transactions")
+        target_fill = target.color.lstrip("#")
 
-        # Hardcoded data
+        # Comparable transactions from the registry, followed by the target
         comparables_data = [
             ["Date", "Team", "Transaction Value", "TEV/Revenue", "5-Year Revenue Growth"],
-            ["7/3/2024", "Golden State Warriors", 6250, 14.9, .14],
-            ["2/24/2024", "New York Knicks", 5340, 12.8, .12],
-            ["12/2/2023", "Los Angeles Lakers", 5870, 11.6, .09],
+            *[[c.display_date, c.team, c.transaction_value, c.ev_revenue, c.revenue_growth / 100] for c in comparables],
             ["", "TargetCo", starting_enterprise_value, entry_tev_revenue, (required_revenue_growth/100)],
         ]
+        target_row = len(comparables_data) + 1  # TargetCo row (row after the last comp)
+        last_comp_row = target_row - 1
 
         # Add data to Comparable Transactions starting at B2
         for row_idx, row in enumerate(comparables_data, start=2):
@@ -474,9 +403,9 @@ if team == "Boston Celtics":
                 # Center-align all information in cells
                 cell.alignment = Alignment(horizontal="center", vertical="center")
 
-                # Apply light green color to TargetCo row
-                if row_idx == 6:  # TargetCo row is at index 6 (row after Lakers)
-                    cell.fill = PatternFill(start_color="007A33", end_color="007A33", fill_type="solid")
+                # Apply the team color to TargetCo row
+                if row_idx == target_row:
+                    cell.fill = PatternFill(start_color=target_fill, end_color=target_fill, fill_type="solid")
                     cell.font = Font(color="FFFFFF")
               
         # Style headers (B2:F2)
@@ -490,27 +419,27 @@ if team == "Boston Celtics":
             cell.font = header_font
             cell.alignment = header_alignment
 
-        # Add line under the header row (B5:F5)
+        # Add line under the last comp row
         for col in range(2, 7):
-            cell = ws_comparables.cell(row=5, column=col)
+            cell = ws_comparables.cell(row=last_comp_row, column=col)
             cell.border = Border(bottom=Side(style="thin"))
 
-        # Add line under the Mean row (B8:F8)
+        # Add line under the TargetCo row
         for col in range(2, 7):
-            cell = ws_comparables.cell(row=6, column=col)
+            cell = ws_comparables.cell(row=target_row, column=col)
             cell.border = Border(bottom=Side(style="thin"))
   
 
         # Add Median row dynamically
         median_row = ["Median", ""]
         median_row_formulas = [
-            f"=MEDIAN(D3:D5)",  # Transaction Value
-            f"=MEDIAN(E3:E5)",  # EV/Sales
-            f"=MEDIAN(F3:F5)"   # Revenue Growth
+            f"=MEDIAN(D3:D{last_comp_row})",  # Transaction Value
+            f"=MEDIAN(E3:E{last_comp_row})",  # EV/Sales
+            f"=MEDIAN(F3:F{last_comp_row})"   # Revenue Growth
         ]
 
         for col_idx, value in enumerate(median_row + median_row_formulas, start=2):
-            cell = ws_comparables.cell(row=7, column=col_idx, value=value if col_idx <= 3 else None)
+            cell = ws_comparables.cell(row=target_row + 1, column=col_idx, value=value if col_idx <= 3 else None)
             if col_idx > 3:
                 cell.value = median_row_formulas[col_idx - 4]
             cell.alignment = Alignment(horizontal="center", vertical="center")
@@ -525,13 +454,13 @@ if team == "Boston Celtics":
         # Add Mean row dynamically
         mean_row = ["Mean", ""]
         mean_row_formulas = [
-            f"=AVERAGE(D3:D5)",  # Transaction Value
-            f"=AVERAGE(E3:E5)",  # EV/Sales
-            f"=AVERAGE(F3:F5)"   # Revenue Growth
+            f"=AVERAGE(D3:D{last_comp_row})",  # Transaction Value
+            f"=AVERAGE(E3:E{last_comp_row})",  # EV/Sales
+            f"=AVERAGE(F3:F{last_comp_row})"   # Revenue Growth
         ]
 
         for col_idx, value in enumerate(mean_row + mean_row_formulas, start=2):
-            cell = ws_comparables.cell(row=8, column=col_idx, value=value if col_idx <= 3 else None)
+            cell = ws_comparables.cell(row=target_row + 2, column=col_idx, value=value if col_idx <= 3 else None)
             if col_idx > 3:
                 cell.value = mean_row_formulas[col_idx - 4]
             cell.alignment = Alignment(horizontal="center", vertical="center")
@@ -555,31 +484,37 @@ if team == "Boston Celtics":
 
         return wb
     
-    # Prepare DataFrames for Export
-    if view_option == "Years":
-        projections_df = projections_styled  # Use the annual projections
-    else:
-        projections_df = pd.DataFrame(
-            [revenue_row, cash_flow_row],
-            columns=quarter_labels,
-            index=["Revenue ($M)", "Cash Flow ($M)"]
-        ).reset_index()
-
-    summary_df = investment_summary  # Use the summary DataFrame
-
     # Generate Workbook
-    wb = export_to_excel_one_sheet(projections_df, summary_df)
-    wb = add_comparable_transactions_sheet(wb)
-
-    # Save Workbook to BytesIO for Download
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-
-    # Export Button in Streamlit
-    st.download_button(
-        label="Download Excel File",
-        data=output,
-        file_name="CelticsModel_v1.xlsx",
-        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-    )
+    @metrics.timed("excel_export")
+    def build_workbook_bytes(report):
+        # Prepare DataFrames for Export
+        if view_option == "Years":
+            projections_df = projections_styled  # Use the annual projections
+        else:
+            projections_df = pd.DataFrame(
+                [revenue_row, cash_flow_row],
+                columns=quarter_labels,
+                index=["Revenue ($M)", "Cash Flow ($M)"]
+            ).reset_index()
+
+        summary_df = investment_summary  # Use the summary DataFrame
+
+        report(0.1, "Projections and summary")
+        wb = export_to_excel_one_sheet(projections_df, summary_df)
+        report(0.5, "Comparable transactions")
+        wb = add_comparable_transactions_sheet(wb)
+        record_deal(wb, "app", deal.inputs, view=view_option, entry_quarter=entry_quarter, exit_quarter=exit_quarter)
+
+        # Save Workbook to BytesIO for Download
+        report(0.8, "Writing file")
+        output = BytesIO()
+        wb.save(output)
+        return output.getvalue()
+
+    # The workbook is built in the background on request, once per set of deal inputs
+    workbook_key = deal_key(deal.inputs, entry_quarter, exit_quarter, view_option, comparables, target, source_version(__file__))
+    export_controls(workbook_key, build_workbook_bytes, f"{target.short_name.replace(' ', '')}Model_v1.xlsx")
+
+# Close this run's timing and show the Performance panel when instrumentation is on
+rerun_metrics.finish()
+render_metrics_panel()
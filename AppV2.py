@@ -1,49 +1,121 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import numpy_financial as npf
-import plotly.graph_objects as go
 from io import BytesIO
 from openpyxl import Workbook
 from openpyxl.styles import Font, Alignment, PatternFill, Border, Side
 from openpyxl.utils.dataframe import dataframe_to_rows
+from underwriting import (
+    DEFAULT_SIMULATED_PATHS,
+    EXIT_MULTIPLE_GRID,
+    GROWTH_GRID,
+    HOLDING_PERIOD_GRID,
+    LEAGUE_AVERAGE_MULTIPLE,
+    LEAGUE_DEBT_CAP,
+    DealInputs,
+    DebtTerms,
+    FundTerms,
+    Refinancing,
+    comps_multiple,
+    deal_key,
+    deal_waterfall,
+    default_config,
+    generate_quarters,
+    get_surface,
+    goal_seek,
+    goal_seek_curve,
+    load_registry,
+    quarter_index,
+    quarter_to_year,
+    render_table,
+    simulate_stream,
+    source_version,
+    table_stylesheet,
+)
+from underwriting import metrics
+from underwriting.charts import goal_seek_chart, sensitivity_heatmap
+from underwriting.excel_export import record_deal
+from underwriting.export_panel import session_export_controls
+from underwriting.debug_panel import render_metrics_panel, start_rerun
+from underwriting.stages import (
+    comparables_stage,
+    deal_stage,
+    growth_chart_stage,
+    multiple_chart_stage,
+    projections_stage,
+    quarterly_stage,
+    scrubber_stage,
+    summary_stage,
+)
+
+# Per-stage timing and memory for this run, recorded only when NBA_MODEL_METRICS is set
+rerun_metrics = start_rerun()
 
 # Page Title
 st.title("NBA Team Underwriting Dashboard")
 
+# Teams and comparable transactions are loaded once from data/
+registry = load_registry()
+
 # Team Selection
-team = st.selectbox("Select Team", options=["Select Team", "Memphis Grizzlies"], index=0)
+team = st.selectbox("Select Team", options=["Select Team"] + registry.team_names(), index=0)
 
 # Generate quarters for dropdown (still used for entry/exit periods)
-def generate_quarters(start_year, end_year):
-    quarters = []
-    for year in range(start_year, end_year + 1):
-        for quarter in range(1, 5):
-            quarters.append(f"{quarter}Q{year % 100:02d}")
-    return quarters
-
 quarter_options = generate_quarters(2025, 2040)
 
 # Team-specific inputs and calculations
-if team == "Memphis Grizzlies":
+if team != "Select Team":
     st.sidebar.header("Inputs")
-    starting_revenue = 220
-    starting_debt = 300
-    ending_debt = 250
-    starting_enterprise_value = 2112
+    target = registry.team(team)
+    starting_revenue = target.starting_revenue
+    starting_debt = target.starting_debt
+    ending_debt = target.ending_debt
+    starting_enterprise_value = target.starting_enterprise_value
 
     ownership_stake = st.sidebar.number_input("Desired Ownership Stake (%)", min_value=1.0, value=5.0, step=0.5)
     starting_enterprise_value = st.sidebar.number_input(
         "Starting Enterprise Value ($M)", min_value=0.0, value=float(starting_enterprise_value), step=10.0
     )
     starting_debt = st.sidebar.number_input(
-        "Starting Debt ($M)", min_value=0.0, value=float(starting_debt), step=5.0, max_value=475.0
+        "Starting Debt ($M)", min_value=0.0, value=float(starting_debt), step=5.0, max_value=LEAGUE_DEBT_CAP
     )
     ending_debt = st.sidebar.number_input(
-        "Ending Debt ($M)", min_value=0.0, value=float(ending_debt), step=5.0, max_value=475.0
+        "Ending Debt ($M)", min_value=0.0, value=float(ending_debt), step=5.0, max_value=LEAGUE_DEBT_CAP
+    )
+
+    # Debt schedule: amortization profile, interest and an optional refinancing
+    debt_profile = st.sidebar.selectbox("Debt Profile", options=["Amortizing", "Bullet", "Cash Sweep"], index=0)
+    interest_rate = st.sidebar.number_input("Interest Rate (%)", min_value=0.0, value=0.0, step=0.25)
+    cash_margin = st.sidebar.number_input(
+        "Cash for Debt Service (% of Revenue)", min_value=0.0, max_value=100.0, value=0.0, step=1.0
     )
+    refinance_year = st.sidebar.number_input("Refinance After Year (0 = Never)", min_value=0, value=0, step=1)
+    refinancings = ()
+    if refinance_year:
+        refinanced_debt = st.sidebar.number_input(
+            "Refinanced Debt ($M)", min_value=0.0, value=float(starting_debt), step=5.0, max_value=LEAGUE_DEBT_CAP
+        )
+        refinancings = (Refinancing(year=refinance_year, balance=refinanced_debt),)
+    debt_terms = DebtTerms(
+        profile=debt_profile.lower().replace(" ", "_"),
+        interest_rate=interest_rate,
+        cash_margin=cash_margin,
+        refinancings=refinancings,
+    )
+
+    # Fund vehicle: management fees, preferred return, GP catch-up and carried interest turn
+    # the gross returns of the stake into what the LPs keep
+    fund_terms = None
+    if st.sidebar.checkbox("Net of Fund Fees and Carry"):
+        fund_terms = FundTerms(
+            management_fee=st.sidebar.number_input("Management Fee (% per Year)", min_value=0.0, value=2.0, step=0.25),
+            preferred_return=st.sidebar.number_input("Preferred Return (%)", min_value=0.0, value=8.0, step=0.5),
+            catch_up=st.sidebar.number_input("GP Catch-Up (%)", min_value=0.0, max_value=100.0, value=100.0, step=5.0),
+            carried_interest=st.sidebar.number_input(
+                "Carried Interest (%)", min_value=0.0, max_value=99.0, value=20.0, step=1.0
+            ),
+        )
 
-    debt_paid = starting_debt - ending_debt
     starting_equity = starting_enterprise_value - starting_debt  # Updated entry equity calculation
 
     starting_revenue = st.sidebar.number_input(
@@ -55,12 +127,6 @@ if team == "Memphis Grizzlies":
     exit_quarter = st.sidebar.selectbox("Exit Quarter", options=quarter_options, index=quarter_options.index("2Q32"))
     desired_revenue_growth = st.sidebar.number_input("Desired Revenue Growth (%)", min_value=0.0, value=10.0, step=0.1)
 
-    # Convert Quarter to Year
-    def quarter_to_year(quarter):
-        quarter_num = int(quarter[0])
-        year = int("20" + quarter[2:])
-        return year + (quarter_num - 1) / 4
-
     entry_year = int(quarter_to_year(entry_quarter))
     exit_year = int(quarter_to_year(exit_quarter))
     holding_period_years = exit_year - entry_year
@@ -68,210 +134,270 @@ if team == "Memphis Grizzlies":
     # Initial TEV/Revenue multiple
     entry_tev_revenue = starting_enterprise_value / starting_revenue
 
+    # Closest comparable transactions by revenue, EV, growth, market size and recency; they drive
+    # the comps multiple, the growth comparison chart and the Comparable Transactions sheet
+    comparables = comparables_stage(team, starting_revenue, starting_enterprise_value, desired_revenue_growth)
+    comps_tev_revenue = round(comps_multiple(comparables), 1)
+
     # Initialize new_tev_revenue in session state if it doesn't exist
     if "new_tev_revenue" not in st.session_state:
         st.session_state.new_tev_revenue = entry_tev_revenue  # Default to entry TEV/Revenue multiple
 
     # TEV/Revenue Multiple Reset Options
     def reset_to_average():
-        st.session_state.new_tev_revenue = 11.9
+        st.session_state.new_tev_revenue = LEAGUE_AVERAGE_MULTIPLE
 
     def reset_to_entry():
         st.session_state.new_tev_revenue = entry_tev_revenue
 
     def reset_to_comps():
-        st.session_state.new_tev_revenue = 10.4
-
-    # Buttons to set specific multiples
-    col_set_buttons = st.columns([1, 1, 1], gap="small")
-    with col_set_buttons[0]:
-        if st.button("Entry Multiple"):
-            reset_to_entry()
-    with col_set_buttons[1]:
-        if st.button("League Avg Multiple"):
-            reset_to_average()
-    with col_set_buttons[2]:
-        if st.button("Closest Comps Multiple"):
-            reset_to_comps()
-
-    # Slider for adjusting the exit multiple
-    st.header("EV/Revenue Multiple Scale")
-    st.session_state.new_tev_revenue = st.slider(
-        "Adjust Exit EV/Revenue Multiple",
-        min_value=5.0,
-        max_value=20.0,
-        value=st.session_state.new_tev_revenue,  # Use the session state value
-        step=0.1,
-    )
-
-    # Graph 1: TEV/Revenue Comparison
-    fig_tev_revenue = go.Figure()
-    fig_tev_revenue.add_trace(go.Bar(
-        x=["Entry", "NBA Average", "Comps", "Exit"],
-        y=[
+        st.session_state.new_tev_revenue = comps_tev_revenue
+
+    # The multiple buttons, slider and everything priced off the exit multiple form one
+    # fragment: interacting with them reruns only this section, not the sidebar and comps
+    @st.fragment
+    def exit_multiple_section():
+        with start_rerun("exit_multiple_section", fragment=True):
+            render_exit_multiple_section()
+
+    def render_exit_multiple_section():
+
+        # Buttons to set specific multiples
+        col_set_buttons = st.columns([1, 1, 1], gap="small")
+        with col_set_buttons[0]:
+            if st.button("Entry Multiple"):
+                reset_to_entry()
+        with col_set_buttons[1]:
+            if st.button("League Avg Multiple"):
+                reset_to_average()
+        with col_set_buttons[2]:
+            if st.button("Closest Comps Multiple", disabled=not comparables):
+                reset_to_comps()
+
+        # Slider for adjusting the exit multiple
+        st.header("EV/Revenue Multiple Scale")
+        # Optionally precompute every slider position into the chart so scrubbing stays in the browser
+        scrub_in_browser = st.toggle("Scrub Exit Multiple In Browser")
+        if not scrub_in_browser:
+            st.session_state.new_tev_revenue = st.slider(
+                "Adjust Exit EV/Revenue Multiple",
+                min_value=5.0,
+                max_value=20.0,
+                value=st.session_state.new_tev_revenue,  # Use the session state value
+                step=0.1,
+            )
+
+        # Graph 1: TEV/Revenue Comparison
+        fig_tev_revenue = multiple_chart_stage(
             entry_tev_revenue,
-            11.9,  # League Avg Multiple
-            10.4,  # Closest Comps Multiple
+            LEAGUE_AVERAGE_MULTIPLE,
+            comps_tev_revenue,  # Closest Comps Multiple
             st.session_state.new_tev_revenue,  # Exit Multiple from session state
-        ],
-        marker_color=["#5D76A9", "gray", "darkgrey", "#5D76A9"],
-        text=[
-            f"{entry_tev_revenue:.1f}",
-            "11.9",
-            "10.4",
-            f"{st.session_state.new_tev_revenue:.1f}",
-        ],
-        textposition="outside"
-    ))
-    fig_tev_revenue.update_layout(
-        title="EV/Revenue Comparison",
-        yaxis_title="EV/Revenue Multiple",
-        template="plotly_white",
-        barmode="group",
-        height=500,
-        width=600
-    )
+            target.color,
+            comps_color="darkgrey",
+            label="EV/Revenue",
+        )
 
-    # Graph 2: Revenue Growth Comparison
-    comparables = {"Hornets": 14, "Hawks": 12, "Pelicans": 9}
-    fig_growth = go.Figure()
-    fig_growth.add_trace(go.Bar(
-        x=list(comparables.keys()) + ["Imputed"],
-        y=list(comparables.values()) + [desired_revenue_growth],
-        marker_color=["#1D1160", "#C8102E", "#0C2340", "#5D76A9"],
-        text=[f"{val:.1f}" for val in list(comparables.values()) + [desired_revenue_growth]],
-        textposition="outside"
-    ))
-    fig_growth.update_layout(
-        title="Desired Revenue Growth Rate vs Comparables",
-        yaxis_title="Revenue Growth Rate (%)",
-        template="plotly_white",
-        barmode="group",
-        height=500,
-        width=600
-    )
+        # Graph 2: Revenue Growth Comparison
+        fig_growth = growth_chart_stage(
+            comparables,
+            desired_revenue_growth,
+            target.color,
+            label="Imputed",
+            title="Desired Revenue Growth Rate vs Comparables",
+        )
 
-    # Display Graphs
-    col1, col2 = st.columns(2)
-    with col1:
-        st.plotly_chart(fig_tev_revenue, use_container_width=True)
-    with col2:
-        st.plotly_chart(fig_growth, use_container_width=True)
-
-
-
-    # Revenue Projections Based on Desired Revenue Growth
-    annual_revenue_growth = desired_revenue_growth / 100
-    projected_revenue = [
-        starting_revenue * ((1 + annual_revenue_growth) ** year)
-        for year in range(int(holding_period_years) + 1)
-    ]
-
-    # Corrected Entry & Exit Cash Flow Calculations
-    entry_cash_flow = ownership_stake / 100 * starting_equity  # Ownership % of entry equity
-    exit_equity = (projected_revenue[-1] * st.session_state.new_tev_revenue) - ending_debt  # Exit equity = TEV - Ending Debt
-    exit_cash_flow = ownership_stake / 100 * exit_equity  # Ownership % of exit equity
-
-    cash_flows = [-entry_cash_flow] + [0] * (int(holding_period_years) - 1) + [exit_cash_flow]
-
-    def calculate_irr(cash_flows):
-        return npf.irr(cash_flows) * 100
-
-    irr = calculate_irr(cash_flows)
-    moic = exit_cash_flow / abs(entry_cash_flow)
-
-    # Projections Table
-    years = list(range(entry_year, exit_year + 1))
-    projections_table = pd.DataFrame({
-        "": ["Revenue", "Debt Level", "Cash Flow"],
-        **{
-            str(year): [
-                projected_revenue[i],  # Revenue
-                starting_debt - (debt_paid * i / (len(years) - 1)),  # Debt Paydown
-                cash_flows[i]
-            ]
-            for i, year in enumerate(years)
-        }
-    })
-
-
-    # Styled HTML Table
-    def generate_styled_table_horizontal(df):
-        table_html = '<table style="border-collapse: collapse; width: 100%; font-family: Arial, sans-serif;">'
-        table_html += '<thead><tr style="background-color: #0056b3; color: white; font-weight: bold; text-align: center;">'
-        table_html += ''.join(f'<th style="padding: 10px; border: 1px solid #ddd;">{col}</th>' for col in df.columns)
-        table_html += '</tr></thead><tbody>'
-
-        for _, row in df.iterrows():
-            table_html += f'<tr style="background-color: white; text-align: center;">'
-            for i, cell in enumerate(row):
-                # Check if the cell is numeric
-                if isinstance(cell, (float, int)):
-                    # Format negative numbers with parentheses
-                    formatted_cell = f"({abs(cell):,.1f})" if cell < 0 else f"{cell:,.1f}"
-                else:
-                    # Leave non-numeric cells as-is
-                    formatted_cell = cell
-                # Bold the first column (row labels)
-                table_html += f'<td style="padding: 10px; border: 1px solid #ddd; {"font-weight: bold;" if i == 0 else ""}">{formatted_cell}</td>'
-            table_html += '</tr>'
+        # Revenue projections, entry/exit equity and returns from the underwriting engine
+        deal = deal_stage(DealInputs(
+            ownership_stake=ownership_stake,
+            starting_enterprise_value=starting_enterprise_value,
+            starting_revenue=starting_revenue,
+            revenue_growth=desired_revenue_growth,
+            exit_multiple=st.session_state.new_tev_revenue,
+            holding_period_years=holding_period_years,
+            starting_debt=starting_debt,
+            ending_debt=ending_debt,
+            debt_terms=debt_terms,
+        ))
+        projected_revenue = deal.projected_revenue
+        cash_flows = deal.cash_flows
+        entry_cash_flow = deal.entry_cash_flow  # Ownership % of entry equity
+        exit_cash_flow = deal.exit_cash_flow  # Ownership % of exit equity (TEV - debt at exit)
+        irr = deal.irr
+        moic = deal.moic
+        debt_paid = starting_debt - deal.debt_levels[-1]
+
+        # League rules cap team debt; a schedule that breaches the cap is not priced
+        if not deal.within_debt_cap:
+            st.error(
+                f"Debt peaks at ${max(deal.debt_levels):,.0f}M, above the league cap of ${LEAGUE_DEBT_CAP:,.0f}M. "
+                "Lower the debt, raise the cash for debt service or change the profile."
+            )
+            st.session_state.export_request = None
+            return
+
+        # Display Graphs
+        with metrics.span("charts"):
+            if scrub_in_browser:
+                st.plotly_chart(
+                    scrubber_stage(
+                        deal.inputs,
+                        entry_tev_revenue,
+                        LEAGUE_AVERAGE_MULTIPLE,
+                        comps_tev_revenue,
+                        target.color,
+                        comps_color="darkgrey",
+                        label="EV/Revenue",
+                    ),
+                    use_container_width=True
+                )
+                st.plotly_chart(fig_growth, use_container_width=True)
+            else:
+                col1, col2 = st.columns(2)
+                with col1:
+                    st.plotly_chart(fig_tev_revenue, use_container_width=True)
+                with col2:
+                    st.plotly_chart(fig_growth, use_container_width=True)
+
+        # Projections Table
+        projections_table, html_projections = projections_stage(
+            deal.inputs,
+            entry_year,
+            (("Revenue", "projected_revenue"), ("Debt Level", "debt_levels"), ("Cash Flow", "cash_flows")),
+            first_column_class="label",
+        )
 
-        table_html += '</tbody></table>'
-        return table_html
 
+        # Stylesheet shared by the HTML tables below
+        st.markdown(table_stylesheet(), unsafe_allow_html=True)
 
-    st.subheader("Projected Financials (Annual, in $M)")
-    st.markdown(generate_styled_table_horizontal(projections_table), unsafe_allow_html=True)
+        st.subheader("Projected Financials (Annual, in $M)")
+        st.markdown(html_projections, unsafe_allow_html=True)
 
-    st.subheader("Investment Summary (in $M)")
+        st.subheader("Investment Summary (in $M)")
         
-    investment_summary = pd.DataFrame({
-        "Metric": [
-            "Ownership Stake",
-            "IRR (%)",
-            "MOIC",
-            "Entry Equity",
-            "Exit Equity",
-            "Debt Paid Off",
-            "Entry Multiple",
-            "Exit Multiple",
-            "Revenue Growth Rate (%)",
-            "Holding Period"
-        ],
-        "Value": [
-            f"{ownership_stake:.1f}%",
-            f"{irr:.1f}%",
-            f"{moic:.1f}x",
-            f"${entry_cash_flow:,.0f}",
-            f"${exit_cash_flow:,.0f}",
-            f"${debt_paid:,.0f}",
-            f"{entry_tev_revenue:.1f}x",
-            f"{st.session_state.new_tev_revenue:.1f}x",  # Updated
-            f"{desired_revenue_growth:.1f}%",
-            f"{holding_period_years:.0f}yrs"
-        ]
-    })
-
-    
-    def generate_summary_table_html(df):
-        html = '<table style="width: 100%; border-collapse: collapse;">'
-        html += '<thead><tr style="background-color: #0056b3; color: white; text-align: left;">'
-        html += ''.join(f'<th style="padding: 8px; border: 1px solid #ddd;">{col}</th>' for col in df.columns)
-        html += '</tr></thead><tbody>'
-        for _, row in df.iterrows():
-            html += '<tr>'
-            for col_idx, cell in enumerate(row):
-                if col_idx == 1:  # Right-align the second column (Value column)
-                    html += f'<td style="padding: 8px; border: 1px solid #ddd; text-align: right;">{cell}</td>'
-                else:  # Left-align the first column (Metric column)
-                    html += f'<td style="padding: 8px; border: 1px solid #ddd; text-align: left;">{cell}</td>'
-            html += '</tr>'
-        html += '</tbody></table>'
-        return html
-
-
-    # Display the table
-    st.markdown(generate_summary_table_html(investment_summary), unsafe_allow_html=True)
+        investment_summary, html_summary = summary_stage((
+            ("Ownership Stake", f"{ownership_stake:.1f}%"),
+            ("IRR (%)", f"{irr:.1f}%"),
+            ("MOIC", f"{moic:.1f}x"),
+            ("Entry Equity", f"${entry_cash_flow:,.0f}"),
+            ("Exit Equity", f"${exit_cash_flow:,.0f}"),
+            ("Debt Paid Off", f"${debt_paid:,.0f}"),
+            ("Entry Multiple", f"{entry_tev_revenue:.1f}x"),
+            ("Exit Multiple", f"{st.session_state.new_tev_revenue:.1f}x"),  # Updated
+            ("Revenue Growth Rate (%)", f"{desired_revenue_growth:.1f}%"),
+            ("Holding Period", f"{holding_period_years:.0f}yrs"),
+        ))
+
+        # Display the table
+        st.markdown(html_summary, unsafe_allow_html=True)
+
+        # The summary is gross of the fund; LPs keep what is left after fees and the GP's carry
+        if fund_terms is not None:
+            net = deal_waterfall(deal, fund_terms).net
+            st.caption(
+                f"Net to LPs after {fund_terms.management_fee:.2f}% fees, a {fund_terms.preferred_return:.1f}% "
+                f"preferred return and {fund_terms.carried_interest:.0f}% carry: {net.irr:.1f}% / {net.moic:.1f}x "
+                f"(GP: ${net.management_fees:,.0f}M fees, ${net.carried_interest:,.0f}M carry)"
+            )
+
+        # The annual model above counts whole years; this holds for the exact quarters between entry and exit
+        if quarter_index(exit_quarter) > quarter_index(entry_quarter):
+            quarterly = quarterly_stage(deal.inputs, entry_quarter, exit_quarter)
+            st.caption(
+                f"Quarter-precise XIRR ({entry_quarter} to {exit_quarter}, quarter-end dates): "
+                f"{quarterly.irr:.1f}% / {quarterly.moic:.1f}x"
+            )
+
+        # IRR sensitivity over every exit multiple / revenue growth position, precomputed once per deal
+        if st.checkbox("Show IRR Sensitivity Heatmap") and 1 <= deal.inputs.projection_years <= HOLDING_PERIOD_GRID[-1]:
+            with metrics.span("sensitivity_heatmap"):
+                surface = get_surface(deal.inputs)
+                st.plotly_chart(
+                    sensitivity_heatmap(surface, deal.inputs.projection_years, marker=(st.session_state.new_tev_revenue, desired_revenue_growth)),
+                    use_container_width=True
+                )
+
+        # Solve one input back from a target IRR or MOIC, e.g. the most that can be paid for a 20% IRR,
+        # and trace it across every exit multiple (or, when solving for the multiple, every growth rate)
+        if st.checkbox("Goal Seek"):
+            goal_seek_inputs = {
+                "Max Entry Enterprise Value ($M)": "starting_enterprise_value",
+                "Required Exit Multiple": "exit_multiple",
+                "Required Revenue Growth (%)": "revenue_growth",
+                "Shortest Holding Period (Years)": "holding_period_years",
+                "Max Ending Debt ($M)": "ending_debt",
+            }
+            col_solve, col_target, col_value = st.columns(3)
+            with col_solve:
+                solve_label = st.selectbox("Solve For", options=list(goal_seek_inputs))
+            with col_target:
+                goal_target = st.radio("Target", options=["IRR", "MOIC"], horizontal=True)
+            with col_value:
+                if goal_target == "IRR":
+                    goal_value = st.number_input("Target IRR (%)", value=20.0, step=0.5)
+                else:
+                    goal_value = st.number_input("Target MOIC (x)", min_value=0.1, value=2.5, step=0.1)
+            solve_for = goal_seek_inputs[solve_label]
+
+            with metrics.span("goal_seek"):
+                solution = goal_seek(deal.inputs, solve_for, goal_target.lower(), goal_value)
+                if solve_for == "exit_multiple":
+                    vary, vary_label, vary_grid = "revenue_growth", "Revenue Growth Rate (%)", GROWTH_GRID
+                else:
+                    vary, vary_label, vary_grid = "exit_multiple", "Exit EV/Revenue Multiple", EXIT_MULTIPLE_GRID
+                curve = goal_seek_curve(deal.inputs, solve_for, goal_target.lower(), goal_value, vary, vary_grid)
+
+            if solution.feasible:
+                st.metric(solve_label, f"{solution.value:,.1f}")
+            else:
+                st.warning(f"{solve_label}: no value within range reaches a {goal_value:.1f}{'%' if goal_target == 'IRR' else 'x'} {goal_target}.")
+            st.plotly_chart(
+                goal_seek_chart(
+                    curve,
+                    vary_grid,
+                    vary_label,
+                    solve_label,
+                    target.color,
+                    marker=(getattr(deal.inputs, vary), solution.value) if solution.feasible else None,
+                ),
+                use_container_width=True
+            )
+
+        # Monte Carlo distribution of returns around the point estimate, streamed as chunks finish
+        if st.checkbox("Run Monte Carlo Simulation"):
+            if fund_terms is not None:
+                st.caption("Simulated returns are net to LPs.")
+            simulated_paths = int(st.number_input("Simulated Paths", min_value=10000, value=DEFAULT_SIMULATED_PATHS, step=25000))
+            mc_progress = st.progress(0.0)
+            mc_table = st.empty()
+            with metrics.span("monte_carlo"):
+                mc_config = default_config(deal.inputs, fund_terms=fund_terms)
+                for mc in simulate_stream(mc_config, simulated_paths, seed=0):
+                    mc_progress.progress(mc.paths / simulated_paths)
+                    mc_summary = pd.DataFrame({
+                        "Metric": [
+                            "Paths", "P5 IRR (%)", "P50 IRR (%)", "P95 IRR (%)", "Mean MOIC", "P(MOIC < 1x)",
+                            "P(Debt Over Cap)",
+                        ],
+                        "Value": [
+                            f"{mc.paths:,}",
+                            f"{mc.irr_p5:.1f}%",
+                            f"{mc.irr_p50:.1f}%",
+                            f"{mc.irr_p95:.1f}%",
+                            f"{mc.mean_moic:.1f}x",
+                            f"{mc.prob_moic_below_1:.1%}",
+                            f"{mc.prob_over_debt_cap:.1%}",
+                        ]
+                    })
+                    mc_table.markdown(render_table(mc_summary, "summary", value_column_class="value"), unsafe_allow_html=True)
+            if mc.prob_over_debt_cap > 0:
+                st.caption("Returns are over the simulated paths whose debt stays within the league cap.")
+
+        # Hand this deal's workbook to the export controls, a sibling fragment
+        export_excel_button(
+            projections_table, investment_summary, deal, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth
+        )
 
     # Function to style Excel headers
     def style_headers(ws, start_row, start_col, end_col, underline=False, bold=True, empty_col=None):
@@ -292,7 +418,7 @@ if team == "Memphis Grizzlies":
             empty_cell.font = Font(color="FFFFFF")
             empty_cell.value = None
 
-    def export_to_excel(projections_df, summary_df):
+    def export_to_excel(projections_df, summary_df, straight_line_debt=True):
         # Create a workbook
         wb = Workbook()
 
@@ -328,8 +454,9 @@ if team == "Memphis Grizzlies":
         debt_paid_off_cell = f"$C$15/LEFT($C$19, LEN($C$19)-3)"
 
         for col_idx in range(3, len(projections_df.columns) + 2):  # Start at C4
-            if col_idx == 3:
-                ws_summary.cell(row=debt_row, column=col_idx, value=projections_df.iloc[1, 1])
+            # Only a straight-line paydown can be rebuilt from Debt Paid Off; other schedules keep their balances
+            if col_idx == 3 or not straight_line_debt:
+                ws_summary.cell(row=debt_row, column=col_idx, value=projections_df.iloc[1, col_idx - 2])
             else:
                 prev_col = ws_summary.cell(row=debt_row, column=col_idx - 1).coordinate
                 current_cell = ws_summary.cell(row=debt_row, column=col_idx)
@@ -392,8 +519,10 @@ if team == "Memphis Grizzlies":
         ws_summary.cell(row=11, column=3).value = f"=IRR({cash_flow_range})"
         ws_summary.cell(row=11, column=3).number_format = "0.0%"
 
-        # Overwrite C12: MOIC Calculation
-        ws_summary.cell(row=12, column=3).value = "=C14/C13"
+        # Overwrite C12: MOIC Calculation (refinancing flows count as returned or invested capital)
+        ws_summary.cell(row=12, column=3).value = (
+            "=C14/C13" if straight_line_debt else f'=SUMIF({cash_flow_range},">0")/-SUMIF({cash_flow_range},"<0")'
+        )
         ws_summary.cell(row=12, column=3).number_format = "0.0x"
 
         # Overwrite C13: Equity Value at Entry
@@ -436,19 +565,20 @@ if team == "Memphis Grizzlies":
 
 
     # Function to add Comparable Transactions sheet
-    def add_comparable_transactions_sheet(wb, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth):
+    def add_comparable_transactions_sheet(wb, comparables, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth):
 
         # Add Comparable Transactions Sheet
         ws_comparables = wb.create_sheet(title="Comparable Transactions")
+        target_fill = target.color.lstrip("#")
 
-        # Hardcoded data
+        # Comparable transactions from the registry, followed by the target
         comparables_data = [
             ["Date", "Team", "Transaction Value", "TEV/Revenue", "5-Year Revenue Growth"],
-            ["7/3/2024", "Charlotte Hornets", 1850, 9.1, .14],
-            ["2/24/2024", "Atlanta Hawks", 2210, 11.3, .12],
-            ["12/2/2023", "New Orleans Pelicans", 1980, 10.8, .09],
+            *[[c.display_date, c.team, c.transaction_value, c.ev_revenue, c.revenue_growth / 100] for c in comparables],
             ["", "TargetCo", starting_enterprise_value, entry_tev_revenue, (desired_revenue_growth/100)],
         ]
+        target_row = len(comparables_data) + 1  # TargetCo row (row after the last comp)
+        last_comp_row = target_row - 1
 
         # Add data to Comparable Transactions starting at B2
         for row_idx, row in enumerate(comparables_data, start=2):
@@ -465,9 +595,9 @@ if team == "Memphis Grizzlies":
                 # Center-align all information in cells
                 cell.alignment = Alignment(horizontal="center", vertical="center")
 
-                # Apply light green color to TargetCo row
-                if row_idx == 6:  # TargetCo row is at index 6 (row after Lakers)
-                    cell.fill = PatternFill(start_color="5D76A9", end_color="5D76A9", fill_type="solid")
+                # Apply the team color to TargetCo row
+                if row_idx == target_row:
+                    cell.fill = PatternFill(start_color=target_fill, end_color=target_fill, fill_type="solid")
                     cell.font = Font(color="FFFFFF")
               
         # Style headers (B2:F2)
@@ -481,27 +611,27 @@ if team == "Memphis Grizzlies":
             cell.font = header_font
             cell.alignment = header_alignment
 
-        # Add line under the header row (B5:F5)
+        # Add line under the last comp row
         for col in range(2, 7):
-            cell = ws_comparables.cell(row=5, column=col)
+            cell = ws_comparables.cell(row=last_comp_row, column=col)
             cell.border = Border(bottom=Side(style="thin"))
 
-        # Add line under the Mean row (B8:F8)
+        # Add line under the TargetCo row
         for col in range(2, 7):
-            cell = ws_comparables.cell(row=6, column=col)
+            cell = ws_comparables.cell(row=target_row, column=col)
             cell.border = Border(bottom=Side(style="thin"))
   
 
         # Add Median row dynamically
         median_row = ["Median", ""]
         median_row_formulas = [
-            f"=MEDIAN(D3:D5)",  # Transaction Value
-            f"=MEDIAN(E3:E5)",  # EV/Sales
-            f"=MEDIAN(F3:F5)"   # Revenue Growth
+            f"=MEDIAN(D3:D{last_comp_row})",  # Transaction Value
+            f"=MEDIAN(E3:E{last_comp_row})",  # EV/Sales
+            f"=MEDIAN(F3:F{last_comp_row})"   # Revenue Growth
         ]
 
         for col_idx, value in enumerate(median_row + median_row_formulas, start=2):
-            cell = ws_comparables.cell(row=7, column=col_idx, value=value if col_idx <= 3 else None)
+            cell = ws_comparables.cell(row=target_row + 1, column=col_idx, value=value if col_idx <= 3 else None)
             if col_idx > 3:
                 cell.value = median_row_formulas[col_idx - 4]
             cell.alignment = Alignment(horizontal="center", vertical="center")
@@ -516,13 +646,13 @@ if team == "Memphis Grizzlies":
         # Add Mean row dynamically
         mean_row = ["Mean", ""]
         mean_row_formulas = [
-            f"=AVERAGE(D3:D5)",  # Transaction Value
-            f"=AVERAGE(E3:E5)",  # EV/Sales
-            f"=AVERAGE(F3:F5)"   # Revenue Growth
+            f"=AVERAGE(D3:D{last_comp_row})",  # Transaction Value
+            f"=AVERAGE(E3:E{last_comp_row})",  # EV/Sales
+            f"=AVERAGE(F3:F{last_comp_row})"   # Revenue Growth
         ]
 
         for col_idx, value in enumerate(mean_row + mean_row_formulas, start=2):
-            cell = ws_comparables.cell(row=8, column=col_idx, value=value if col_idx <= 3 else None)
+            cell = ws_comparables.cell(row=target_row + 2, column=col_idx, value=value if col_idx <= 3 else None)
             if col_idx > 3:
                 cell.value = mean_row_formulas[col_idx - 4]
             cell.alignment = Alignment(horizontal="center", vertical="center")
@@ -546,23 +676,39 @@ if team == "Memphis Grizzlies":
 
         return wb
 
-    # Export Button in Streamlit
-    def export_excel_button(projections_table, investment_summary, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth):
-        wb = export_to_excel(projections_table, investment_summary)
-        wb = add_comparable_transactions_sheet(wb, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth)
-
-        # Save Workbook to BytesIO for Download
-        output = BytesIO()
-        wb.save(output)
-        output.seek(0)
-
-        # Export Button in Streamlit
-        st.download_button(
-            label="Download Excel File",
-            data=output,
-            file_name="Grizzlies_v1.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    # Stores the workbook request for export_controls in session state; the controls are a
+    # separate fragment, so moving the exit multiple does not rerun them
+    def export_excel_button(projections_table, investment_summary, deal, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth):
+        @metrics.timed("excel_export")
+        def build_workbook_bytes(report):
+            report(0.1, "Projections and summary")
+            wb = export_to_excel(projections_table, investment_summary, deal.inputs.debt_terms.straight_line)
+            report(0.5, "Comparable transactions")
+            wb = add_comparable_transactions_sheet(wb, comparables, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth)
+            record_deal(wb, "app_v2", deal.inputs)
+
+            # Save Workbook to BytesIO for Download
+            report(0.8, "Writing file")
+            output = BytesIO()
+            wb.save(output)
+            return output.getvalue()
+
+        # The workbook is built in the background on request, once per set of deal inputs
+        workbook_key = deal_key(deal.inputs, entry_year, exit_year, comparables, target, source_version(__file__))
+        st.session_state.export_request = (
+            workbook_key,
+            build_workbook_bytes,
+            f"{target.short_name.replace(' ', '')}_v1.xlsx",
+            f"Download Excel File ({deal.inputs.exit_multiple:.1f}x Exit)",
         )
 
-    # Call the function
-    export_excel_button(projections_table, investment_summary, starting_enterprise_value, entry_tev_revenue, desired_revenue_growth)
+    # Render the exit multiple section now that the export helpers it uses are defined
+    exit_multiple_section()
+
+    # Export controls, a sibling of the exit multiple section: they rerun on their own
+    # buttons and read the latest deal from session state when they do
+    session_export_controls("export_request")
+
+# Close this run's timing and show the Performance panel when instrumentation is on
+rerun_metrics.finish()
+render_metrics_panel()
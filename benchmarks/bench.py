@@ -0,0 +1,490 @@
+import argparse
+import asyncio
+import atexit
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+import timeit
+from dataclasses import replace
+from io import BytesIO
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+# Time the computations themselves, not reads from a result store left by earlier runs
+os.environ.setdefault("NBA_MODEL_RESULT_CACHE", "off")
+
+from underwriting import (  # noqa: E402
+    EXIT_MULTIPLE_GRID,
+    DealInputs,
+    DebtTerms,
+    ResultCache,
+    calculate_irr,
+    check_workbook,
+    deal_cash_flows,
+    distribution_waterfall,
+    entry_exit_waterfall,
+    evaluate_batch,
+    evaluate_quarterly_batch,
+    get_surface,
+    goal_seek,
+    goal_seek_batch,
+    project_quarterly,
+    quarter_index,
+    render_table,
+    result_key,
+    returns_from_cash_flows,
+    solve_for_revenue_growth,
+    solve_for_revenue_growth_batch,
+    underwrite,
+)
+from underwriting.excel_export import PipelineDeal, export_pipeline_workbook  # noqa: E402
+from underwriting.stages import clear_stages  # noqa: E402
+
+
+BASELINE_PATH = Path(__file__).resolve().parent / "baseline.json"
+# A benchmark regresses when it runs this many times slower than its saved baseline
+DEFAULT_THRESHOLD = 1.5
+ENTRY_QUARTER = "2Q25"
+
+# name -> (setup, {param: values}); setup(**params) returns the zero-argument call to time
+BENCHMARKS = {}
+
+
+def benchmark(name, **params):
+    def decorator(setup):
+        BENCHMARKS[name] = (setup, params)
+        return setup
+    return decorator
+
+
+# Every benchmark x parameter combination as (case name, setup, params)
+def iter_cases(pattern=None):
+    for name, (setup, params) in BENCHMARKS.items():
+        keys = list(params)
+        for values in itertools.product(*(params[k] for k in keys)):
+            case_params = dict(zip(keys, values))
+            label = ",".join(f"{k}={v}" for k, v in case_params.items())
+            case = f"{name}[{label}]" if label else name
+            if pattern is None or pattern in case:
+                yield case, setup, case_params
+
+
+def deal_inputs(holding_period=7, include_debt=True):
+    return DealInputs(
+        ownership_stake=10.0,
+        starting_enterprise_value=2112.0,
+        starting_revenue=220.0,
+        revenue_growth=10.0,
+        exit_multiple=14.5,
+        holding_period_years=holding_period,
+        starting_debt=300.0,
+        ending_debt=250.0,
+        include_debt=include_debt,
+    )
+
+
+def exit_quarter_for(holding_period):
+    return f"2Q{25 + holding_period:02d}"
+
+
+def random_deals(count, seed=0):
+    rng = np.random.default_rng(seed)
+    return dict(
+        ownership_stake=rng.uniform(1, 20, count),
+        starting_enterprise_value=rng.uniform(2000, 6000, count),
+        starting_revenue=rng.uniform(200, 450, count),
+        revenue_growth=rng.uniform(0, 15, count),
+        exit_multiple=rng.uniform(5, 20, count),
+        starting_debt=rng.uniform(0, 400, count),
+        ending_debt=rng.uniform(0, 300, count),
+    )
+
+
+# Engine
+
+@benchmark("underwrite", holding_period=[1, 7, 15])
+def bench_underwrite(holding_period):
+    inputs = deal_inputs(holding_period)
+    return lambda: underwrite(inputs)
+
+
+@benchmark("calculate_irr", holding_period=[1, 7, 15])
+def bench_calculate_irr(holding_period):
+    cash_flows = underwrite(deal_inputs(holding_period)).cash_flows
+    return lambda: calculate_irr(cash_flows)
+
+
+@benchmark("returns_batch", deals=[1, 1000, 100000], holding_period=[1, 7, 15], granularity=["annual", "quarterly"])
+def bench_returns_batch(deals, holding_period, granularity):
+    inputs = random_deals(deals)
+    if granularity == "annual":
+        return lambda: evaluate_batch(**inputs, holding_period_years=holding_period)
+    entry, exit_ = quarter_index(ENTRY_QUARTER), quarter_index(exit_quarter_for(holding_period))
+    return lambda: evaluate_quarterly_batch(**inputs, entry_index=entry, exit_index=exit_)
+
+
+# Capital calls in the early years, distributions later, and a fee every period
+@benchmark("interim_cash_flows", streams=[1000, 100000], periods=[8, 40])
+def bench_interim_cash_flows(streams, periods):
+    rng = np.random.default_rng(0)
+    flows = -rng.uniform(0.5, 2.0, (streams, periods + 1))
+    flows[:, 0] -= 100
+    flows[:, : periods // 3] -= rng.uniform(0, 20, (streams, periods // 3))
+    flows[:, periods // 2:] += rng.uniform(0, 40, (streams, periods - periods // 2 + 1))
+    flows[:, -1] += rng.uniform(50, 400, streams)
+    return lambda: returns_from_cash_flows(flows)
+
+
+# Gross deal flows to net LP returns: entry -> exit deals take the closed-form tiers,
+# refinancing proceeds in year 3 the period-by-period waterfall
+@benchmark("fund_waterfall", deals=[1000, 100000], flows=["entry_exit", "refinancing"], holding_period=[7, 15])
+def bench_fund_waterfall(deals, flows, holding_period):
+    inputs = random_deals(deals)
+    stake = inputs["ownership_stake"] / 100
+    entry = stake * (inputs["starting_enterprise_value"] - inputs["starting_debt"])
+    exit_ = stake * (inputs["starting_revenue"] * 1.08 ** holding_period * inputs["exit_multiple"] - inputs["ending_debt"])
+    if flows == "entry_exit":
+        return lambda: entry_exit_waterfall(entry, exit_, holding_period)
+    interim = np.zeros((deals, holding_period + 1))
+    interim[:, 3] = stake * 50.0
+    cash_flows = deal_cash_flows(entry, exit_, interim, np.full(deals, holding_period))
+    return lambda: distribution_waterfall(cash_flows)
+
+
+@benchmark("project_quarterly", holding_period=[1, 7, 15])
+def bench_project_quarterly(holding_period):
+    inputs = deal_inputs(holding_period)
+    exit_quarter = exit_quarter_for(holding_period)
+    return lambda: project_quarterly(inputs, ENTRY_QUARTER, exit_quarter)
+
+
+@benchmark("solve_for_revenue_growth", deals=[1, 1000, 100000], holding_period=[1, 7, 15])
+def bench_solve_for_revenue_growth(deals, holding_period):
+    if deals == 1:
+        return lambda: solve_for_revenue_growth(2.5, 5660.0, 390.0, 14.5, holding_period)
+    inputs = random_deals(deals)
+    return lambda: solve_for_revenue_growth_batch(
+        2.5, inputs["starting_enterprise_value"], inputs["starting_revenue"], inputs["exit_multiple"], holding_period
+    )
+
+
+# One deal, or every exit multiple slider position x target IRRs of 5-25%. Cash sweeps tie
+# exit debt to revenue, so solving for growth under one bisects instead of inverting.
+@benchmark(
+    "goal_seek",
+    solve_for=["starting_enterprise_value", "revenue_growth", "holding_period_years"],
+    debt=["straight_line", "cash_sweep"],
+    grid=["deal", "multiples_x_targets"],
+)
+def bench_goal_seek(solve_for, debt, grid):
+    debt_terms = DebtTerms() if debt == "straight_line" else DebtTerms(profile="cash_sweep", interest_rate=6.0, cash_margin=8.0)
+    deal = replace(deal_inputs(), debt_terms=debt_terms)
+    if grid == "deal":
+        return lambda: goal_seek(deal, solve_for, "irr", 20.0)
+    inputs = {name: getattr(deal, name) for name in (
+        "ownership_stake", "starting_enterprise_value", "starting_revenue", "revenue_growth", "holding_period_years",
+        "starting_debt", "ending_debt",
+    )}
+    targets = np.arange(5.0, 25.5, 1.0)[:, None]
+    return lambda: goal_seek_batch(
+        solve_for, "irr", targets, debt_terms=debt_terms, exit_multiple=EXIT_MULTIPLE_GRID, **inputs
+    )
+
+
+# HTML tables
+
+@benchmark("render_table", holding_period=[1, 7, 15], granularity=["annual", "quarterly"])
+def bench_render_table(holding_period, granularity):
+    if granularity == "annual":
+        deal = underwrite(deal_inputs(holding_period))
+        frame = pd.DataFrame({
+            "": ["Revenue", "Debt Level", "Cash Flow"],
+            **{
+                str(2025 + i): [deal.projected_revenue[i], deal.debt_levels[i], deal.cash_flows[i]]
+                for i in range(len(deal.projected_revenue))
+            }
+        })
+        return lambda: render_table(frame, "projections", first_column_class="label")
+
+    quarterly = project_quarterly(deal_inputs(holding_period), ENTRY_QUARTER, exit_quarter_for(holding_period))
+    frame = pd.DataFrame(
+        [quarterly.revenue, quarterly.cash_flows], columns=quarterly.labels, index=["Revenue", "Cash Flow"]
+    ).reset_index()
+    return lambda: render_table(frame, "quarters")
+
+
+# Excel exports
+
+@benchmark("export_pipeline_workbook", deals=[1, 10, 100])
+def bench_export_pipeline_workbook(deals):
+    pipeline = [PipelineDeal(name=f"Deal {i}", inputs=deal_inputs()) for i in range(deals)]
+    return lambda: export_pipeline_workbook(pipeline, BytesIO())
+
+
+# The apps build their workbooks in functions nested in the scripts, so they are reached
+# through the build function the Prepare button submits after a headless run
+def app_workbook_builder(app, view):
+    from underwriting.export_jobs import EXPORT_JOBS
+
+    builds, jobs = [], []
+    submit = EXPORT_JOBS.submit
+
+    def capture(key, build, *args, **kwargs):
+        builds.append(build)
+        jobs.append(submit(key, build, *args, **kwargs))
+        return jobs[-1]
+
+    EXPORT_JOBS.submit = capture
+    try:
+        at = app_test(app)
+        if view == "Quarters":
+            next(s for s in at.selectbox if s.label == "View By").select("Quarters").run()
+        next(b for b in at.button if b.label == "Prepare Excel File").click().run()
+    finally:
+        del EXPORT_JOBS.submit
+    # Let the submitted export finish so it does not compete with the timed builds
+    while not jobs[-1].finished:
+        time.sleep(0.01)
+    build = builds[-1]
+    return lambda: build(lambda progress, message: None)
+
+
+@benchmark("app_excel_export", app=["App.py", "AppV2.py"], view=["Years", "Quarters"])
+def bench_app_excel_export(app, view):
+    if app == "AppV2.py" and view == "Quarters":
+        return None  # AppV2 has no quarterly view
+    return app_workbook_builder(app, view)
+
+
+# Formula evaluation and engine comparison of one exported workbook
+@benchmark("check_workbook", app=["App.py", "AppV2.py"], view=["Years", "Quarters"])
+def bench_check_workbook(app, view):
+    if app == "AppV2.py" and view == "Quarters":
+        return None
+    data = app_workbook_builder(app, view)()
+    return lambda: check_workbook(data)
+
+
+# Result store
+
+# One read of a stored result from a SQLite file: the sensitivity surface of a deal, or
+# the summary of a seeded Monte Carlo run
+@benchmark("result_cache_get", kind=["surface", "monte_carlo"])
+def bench_result_cache_get(kind):
+    import tempfile
+    from underwriting import default_config, run_monte_carlo
+
+    cache = ResultCache(Path(tempfile.mkdtemp()) / "results.sqlite3")
+    inputs = deal_inputs()
+    value = get_surface(inputs) if kind == "surface" else run_monte_carlo(default_config(inputs), 10000, seed=0)
+    key = result_key(kind, inputs)
+    cache.put(key, value)
+    return lambda: cache.get(key)
+
+
+# Local JSON API
+
+SERVICE_REQUESTS = 256
+
+
+async def post_json(reader, writer, path, body):
+    writer.write(
+        f"POST {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode() + body
+    )
+    await reader.readline()
+    length = 0
+    while (line := await reader.readline()) not in (b"\r\n", b""):
+        if line.lower().startswith(b"content-length:"):
+            length = int(line.split(b":")[1])
+    return await reader.readexactly(length)
+
+
+# SERVICE_REQUESTS requests spread over `concurrency` keep-alive connections, client and
+# server on one event loop; requests per second = SERVICE_REQUESTS / time. With batching
+# off every request is evaluated on its own.
+@benchmark("service_requests", endpoint=["deal", "required-growth"], concurrency=[1, 64, 256], batching=["on", "off"])
+def bench_service_requests(endpoint, concurrency, batching):
+    from underwriting.service import MAX_BATCH, UnderwritingService
+
+    loop = asyncio.new_event_loop()
+    service = UnderwritingService(max_batch=MAX_BATCH if batching == "on" else 1)
+    server = loop.run_until_complete(service.start("127.0.0.1", 0))
+    port = server.sockets[0].getsockname()[1]
+
+    async def connect():
+        return await asyncio.gather(*(asyncio.open_connection("127.0.0.1", port) for _ in range(concurrency)))
+    connections = loop.run_until_complete(connect())
+
+    async def close():
+        for _, writer in connections:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for _, writer in connections))
+        server.close()
+        await server.wait_closed()
+        await asyncio.sleep(0.05)
+    atexit.register(lambda: (loop.run_until_complete(close()), loop.close()))
+
+    deals = random_deals(SERVICE_REQUESTS)
+    if endpoint == "deal":
+        bodies = [
+            {**{name: float(values[i]) for name, values in deals.items()}, "holding_period_years": 7}
+            for i in range(SERVICE_REQUESTS)
+        ]
+    else:
+        bodies = [
+            {
+                "desired_moic": 2.5,
+                "starting_enterprise_value": float(deals["starting_enterprise_value"][i]),
+                "starting_revenue": float(deals["starting_revenue"][i]),
+                "exit_multiple": float(deals["exit_multiple"][i]),
+                "holding_period_years": 7,
+            }
+            for i in range(SERVICE_REQUESTS)
+        ]
+    bodies = [json.dumps(body).encode() for body in bodies]
+    path = f"/v1/{endpoint}"
+
+    async def client(reader, writer, requests):
+        for body in requests:
+            await post_json(reader, writer, path, body)
+
+    async def send_all():
+        await asyncio.gather(*(
+            client(reader, writer, bodies[i::concurrency]) for i, (reader, writer) in enumerate(connections)
+        ))
+    return lambda: loop.run_until_complete(send_all())
+
+
+# Headless reruns
+
+def app_test(app, team_index=1):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(str(ROOT / app), default_timeout=120).run()
+    at.selectbox[0].select(at.selectbox[0].options[team_index]).run()
+    return at
+
+
+# One rerun per call, moving the exit multiple slider or switching team; cold runs clear
+# the stage caches first, warm runs cycle through positions the caches have already seen
+@benchmark("app_rerun", app=["App.py", "AppV2.py"], interaction=["slider", "team"], cache=["warm", "cold"])
+def bench_app_rerun(app, interaction, cache):
+    at = app_test(app)
+    positions = itertools.cycle([8.0, 11.9, 14.5, 17.0] if interaction == "slider" else [1, 2])
+
+    def run():
+        if cache == "cold":
+            clear_stages()
+        value = next(positions)
+        if interaction == "slider":
+            at.slider[0].set_value(value).run()
+        else:
+            at.selectbox[0].select(at.selectbox[0].options[value]).run()
+        if at.exception:
+            raise RuntimeError(at.exception[0].value)
+    return run
+
+
+# Best per-call time over several repeats, each long enough to be measured reliably
+def measure(func, repeat=5, min_time=0.2):
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    number = max(1, int(number * min_time / 0.2))
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def load_baseline(path):
+    if not Path(path).exists():
+        return {}
+    with open(path) as f:
+        return json.load(f).get("results", {})
+
+
+def save_baseline(path, results):
+    baseline = load_baseline(path)
+    baseline.update(results)
+    with open(path, "w") as f:
+        json.dump({"machine": machine_info(), "results": dict(sorted(baseline.items()))}, f, indent=2)
+        f.write("\n")
+
+
+def format_time(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:8.2f} {unit}"
+    return f"{seconds / 1e-9:8.0f} ns"
+
+
+def run(pattern=None, baseline=None, threshold=DEFAULT_THRESHOLD, repeat=5, min_time=0.2):
+    baseline = baseline or {}
+    results, regressions = {}, []
+    for case, setup, params in iter_cases(pattern):
+        func = setup(**params)
+        if func is None:
+            continue
+        seconds = measure(func, repeat=repeat, min_time=min_time)
+        results[case] = seconds
+
+        line = f"{case:<70} {format_time(seconds)}"
+        if case in baseline:
+            ratio = seconds / baseline[case]
+            line += f"  {ratio:5.2f}x baseline"
+            if ratio > threshold:
+                line += "  REGRESSION"
+                regressions.append((case, ratio))
+        print(line, flush=True)
+    return results, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time the underwriting engine, renderers, exports and app reruns.")
+    parser.add_argument("-k", "--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--baseline", default=str(BASELINE_PATH), help="Baseline JSON to compare against")
+    parser.add_argument("--save", action="store_true", help="Write these timings into the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Slowdown vs baseline that counts as a regression")
+    parser.add_argument("--repeat", type=int, default=5, help="Repeats per case; the best is kept")
+    parser.add_argument("--min-time", type=float, default=0.2, help="Seconds each repeat should run for")
+    parser.add_argument("--list", action="store_true", help="List the cases and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        for case, _, _ in iter_cases(args.filter):
+            print(case)
+        return 0
+
+    baseline = {} if args.save else load_baseline(args.baseline)
+    results, regressions = run(args.filter, baseline, args.threshold, args.repeat, args.min_time)
+
+    if args.save:
+        save_baseline(args.baseline, results)
+        print(f"Saved {len(results)} timings -> {args.baseline}")
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.2f}x baseline:")
+        for case, ratio in regressions:
+            print(f"  {case}: {ratio:.2f}x")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
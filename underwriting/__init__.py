@@ -0,0 +1,81 @@
+from underwriting.debt import LEAGUE_DEBT_CAP, DebtSchedule, DebtTerms, Refinancing, debt_schedule
+from underwriting.engine import (
+    DealInputs,
+    DealResult,
+    calculate_irr,
+    generate_quarters,
+    project_debt,
+    project_revenue,
+    quarter_to_year,
+    underwrite,
+)
+from underwriting.batch import (
+    BatchResult,
+    closed_form_irr,
+    deal_cash_flows,
+    debt_at_exit,
+    evaluate_batch,
+    evaluate_deals,
+    project_revenue_array,
+    returns_from_cash_flows,
+)
+from underwriting.irr import IRR_STATUSES, IRRSolution, solve_irr, solve_rate
+from underwriting.quarterly import (
+    QuarterlyProjection,
+    evaluate_quarterly_batch,
+    project_quarterly,
+    quarter_end_date,
+    quarter_end_dates,
+    quarter_index,
+    quarter_label,
+    revenue_run_rate,
+    xirr,
+)
+from underwriting.solve import (
+    GROWTH_BOUNDS,
+    GrowthSolution,
+    solve_for_revenue_growth,
+    solve_for_revenue_growth_batch,
+)
+from underwriting.surface import (
+    EXIT_MULTIPLE_GRID,
+    GROWTH_GRID,
+    HOLDING_PERIOD_GRID,
+    ExitMultipleSweep,
+    SensitivitySurface,
+    build_surface,
+    get_surface,
+    sweep_exit_multiples,
+)
+from underwriting.goalseek import (
+    SEARCH_BOUNDS,
+    GoalSeekSolution,
+    goal_seek,
+    goal_seek_batch,
+    goal_seek_curve,
+)
+from underwriting.waterfall import (
+    DEFAULT_FUND_TERMS,
+    FundTerms,
+    NetReturns,
+    Waterfall,
+    deal_waterfall,
+    distribution_waterfall,
+    entry_exit_waterfall,
+)
+from underwriting.montecarlo import (
+    DEFAULT_SIMULATED_PATHS,
+    MonteCarloConfig,
+    MonteCarloSummary,
+    default_config,
+    run_monte_carlo,
+    simulate_stream,
+)
+from underwriting.registry import Registry, Team, Transaction, load_registry
+from underwriting.comps import LEAGUE_AVERAGE_MULTIPLE, CompsIndex, comps_multiple
+from underwriting.formulas import FormulaError, evaluate_workbook, read_workbook
+from underwriting.parity import ParityCheck, check_workbook, check_workbooks
+from underwriting.result_cache import RESULT_CACHE, ResultCache, cached_result, result_key, source_version
+from underwriting.export_jobs import EXPORT_JOBS, ExportJob, ExportJobs, ExportQueueFull, deal_key
+from underwriting.service import MicroBatcher, UnderwritingService, serve
+from underwriting.tables import render_table, table_stylesheet
@@ -0,0 +1,202 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from underwriting.irr import solve_irr
+from underwriting.waterfall import distribution_waterfall, entry_exit_waterfall
+
+
+@dataclass(frozen=True)
+class BatchResult:
+    entry_cash_flow: np.ndarray
+    exit_enterprise_value: np.ndarray
+    exit_equity: np.ndarray
+    exit_cash_flow: np.ndarray
+    irr: np.ndarray  # %, NaN where the deal never returns capital or breaches the debt cap
+    moic: np.ndarray
+    within_debt_cap: Optional[np.ndarray] = None  # only evaluated when debt terms are given
+    # Returns to the fund's LPs after fees and carry; only evaluated when fund terms are given
+    net_irr: Optional[np.ndarray] = None  # %
+    net_moic: Optional[np.ndarray] = None
+
+
+# Revenue for years 0..years for every deal at once, shape (..., years + 1)
+def project_revenue_array(starting_revenue, revenue_growth, years):
+    starting_revenue = np.asarray(starting_revenue, dtype=float)[..., None]
+    growth = 1 + np.asarray(revenue_growth, dtype=float)[..., None] / 100
+    return starting_revenue * growth ** np.arange(years + 1)
+
+
+# IRR of [-entry] + [0] * (periods - 1) + [exit] is (exit / entry) ** (1 / periods) - 1,
+# so no root-finder is needed for the entry/exit-only cash flows the apps build
+def closed_form_irr(entry_cash_flow, exit_cash_flow, periods):
+    entry_cash_flow = np.asarray(entry_cash_flow, dtype=float)
+    exit_cash_flow = np.asarray(exit_cash_flow, dtype=float)
+    periods = np.maximum(np.asarray(periods), 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = exit_cash_flow / entry_cash_flow
+        irr = np.where((entry_cash_flow > 0) & (ratio > 0), ratio ** (1 / periods) - 1, np.nan)
+    return irr * 100
+
+
+# IRR (%), MOIC and solver status (see irr.IRR_STATUSES) of arbitrary cash-flow streams,
+# shape (..., P + 1): capital calls, fees and distributions in any period. times default
+# to the period index; MOIC is everything returned over everything invested.
+def returns_from_cash_flows(cash_flows, times=None):
+    flows = np.asarray(cash_flows, dtype=float)
+    solution = solve_irr(flows.reshape(-1, flows.shape[-1]), times)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        moic = np.where(flows > 0, flows, 0.0).sum(axis=-1) / -np.where(flows < 0, flows, 0.0).sum(axis=-1)
+    shape = flows.shape[:-1]
+    return solution.rate.reshape(shape) * 100, moic, solution.status.reshape(shape)
+
+
+# Cash flows of every deal when the owners also receive (+) or fund (-) interim flows, shape
+# (..., P + 1), e.g. refinancing proceeds; the exit lands on each deal's final period
+def deal_cash_flows(entry_cash_flow, exit_cash_flow, interim, periods):
+    periods = np.asarray(periods, dtype=np.int64)[..., None]
+    flows = np.array(interim, dtype=float)
+    flows[..., 0] -= entry_cash_flow
+    at_exit = np.take_along_axis(flows, periods, axis=-1) + np.asarray(exit_cash_flow)[..., None]
+    np.put_along_axis(flows, periods, at_exit, axis=-1)
+    return flows
+
+
+# IRR (%) and MOIC of deal_cash_flows
+def returns_with_interim_flows(entry_cash_flow, exit_cash_flow, interim, periods):
+    irr, moic, _ = returns_from_cash_flows(deal_cash_flows(entry_cash_flow, exit_cash_flow, interim, periods))
+    return np.where(np.asarray(periods) > 0, irr, np.nan), moic
+
+
+# Exit debt, refinancing flows (None when there are none) and debt cap check of every deal.
+# Without debt terms (or with straight-line ones) exit debt is the ending debt; other
+# profiles run the period-by-period schedule for every deal.
+def debt_at_exit(starting_revenue, revenue_growth, years, starting_debt, ending_debt, debt_terms):
+    if debt_terms is None:
+        return ending_debt, None, None
+    if debt_terms.straight_line:
+        return ending_debt, None, np.maximum(starting_debt, ending_debt) <= debt_terms.cap
+    max_years = int(np.max(years, initial=0))
+    revenue = project_revenue_array(starting_revenue, revenue_growth, max_years)
+    schedule = debt_terms.schedule(starting_debt, ending_debt, revenue, years)
+    refinancing = schedule.refinancing if schedule.refinancing.any() else None
+    return schedule.exit_balance, refinancing, schedule.within_cap
+
+
+def evaluate_batch(
+    ownership_stake,
+    starting_enterprise_value,
+    starting_revenue,
+    revenue_growth,
+    exit_multiple,
+    holding_period_years,
+    starting_debt=0.0,
+    ending_debt=0.0,
+    include_debt=True,
+    debt_terms=None,
+    fund_terms=None,
+):
+    (
+        ownership_stake,
+        starting_enterprise_value,
+        starting_revenue,
+        revenue_growth,
+        exit_multiple,
+        holding_period_years,
+        starting_debt,
+        ending_debt,
+        include_debt,
+    ) = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (
+            ownership_stake,
+            starting_enterprise_value,
+            starting_revenue,
+            revenue_growth,
+            exit_multiple,
+            holding_period_years,
+            starting_debt,
+            ending_debt,
+        )),
+        np.asarray(include_debt, dtype=bool),
+    )
+
+    # Whole projection years, matching DealInputs.projection_years
+    years = np.trunc(holding_period_years)
+    stake = ownership_stake / 100
+    exit_revenue = starting_revenue * (1 + revenue_growth / 100) ** years
+    exit_enterprise_value = exit_revenue * exit_multiple
+
+    exit_debt, refinancing, within_debt_cap = debt_at_exit(
+        starting_revenue, revenue_growth, years, starting_debt, ending_debt, debt_terms
+    )
+
+    entry_equity = np.where(include_debt, starting_enterprise_value - starting_debt, starting_enterprise_value)
+    exit_equity = np.where(include_debt, exit_enterprise_value - exit_debt, exit_enterprise_value)
+    entry_cash_flow = stake * entry_equity
+    exit_cash_flow = stake * exit_equity
+
+    net = None
+    if refinancing is None:
+        irr = closed_form_irr(entry_cash_flow, exit_cash_flow, years)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moic = exit_cash_flow / np.abs(entry_cash_flow)
+        if fund_terms is not None:
+            net = entry_exit_waterfall(entry_cash_flow, exit_cash_flow, years, fund_terms)
+    else:
+        interim = np.where(include_debt[..., None], stake[..., None] * refinancing, 0.0)
+        irr, moic = returns_with_interim_flows(entry_cash_flow, exit_cash_flow, interim, years)
+        if fund_terms is not None:
+            net = distribution_waterfall(deal_cash_flows(entry_cash_flow, exit_cash_flow, interim, years), fund_terms).net
+    net_irr = None if net is None else net.irr
+    net_moic = None if net is None else net.moic
+
+    # Deals whose debt breaches the league cap are not feasible
+    if within_debt_cap is not None:
+        within_debt_cap = within_debt_cap | ~include_debt
+        irr = np.where(within_debt_cap, irr, np.nan)
+        moic = np.where(within_debt_cap, moic, np.nan)
+        if net is not None:
+            net_irr = np.where(within_debt_cap, net_irr, np.nan)
+            net_moic = np.where(within_debt_cap, net_moic, np.nan)
+
+    return BatchResult(
+        entry_cash_flow=entry_cash_flow,
+        exit_enterprise_value=exit_enterprise_value,
+        exit_equity=exit_equity,
+        exit_cash_flow=exit_cash_flow,
+        irr=irr,
+        moic=moic,
+        within_debt_cap=within_debt_cap,
+        net_irr=net_irr,
+        net_moic=net_moic,
+    )
+
+
+# Evaluate a list of DealInputs in one vectorized pass per distinct set of debt terms
+def evaluate_deals(deals):
+    deals = list(deals)
+    groups = {}
+    for i, deal in enumerate(deals):
+        groups.setdefault(deal.debt_terms, []).append(i)
+    if len(groups) > 1:
+        results = {terms: evaluate_deals([deals[i] for i in rows]) for terms, rows in groups.items()}
+        order = np.argsort(np.concatenate([rows for rows in groups.values()]))
+        return BatchResult(**{
+            field: np.concatenate([getattr(results[terms], field) for terms in groups])[order]
+            for field in BatchResult.__dataclass_fields__
+            if getattr(next(iter(results.values())), field) is not None
+        })
+
+    return evaluate_batch(
+        ownership_stake=[d.ownership_stake for d in deals],
+        starting_enterprise_value=[d.starting_enterprise_value for d in deals],
+        starting_revenue=[d.starting_revenue for d in deals],
+        revenue_growth=[d.revenue_growth for d in deals],
+        exit_multiple=[d.exit_multiple for d in deals],
+        holding_period_years=[d.holding_period_years for d in deals],
+        starting_debt=[d.starting_debt for d in deals],
+        ending_debt=[d.ending_debt for d in deals],
+        include_debt=[d.include_debt for d in deals],
+        debt_terms=deals[0].debt_terms if deals else None,
+    )
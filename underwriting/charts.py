@@ -0,0 +1,212 @@
+import numpy as np
+import plotly.graph_objects as go
+
+
+# Heatmap of one metric over exit multiple x revenue growth for a holding period, in the
+# whole projection years the engine values the deal over
+def sensitivity_heatmap(surface, holding_period, metric="irr", marker=None):
+    holding_period = int(holding_period)
+    values = surface.slice_for_holding_period(holding_period, metric)
+    label = "IRR (%)" if metric == "irr" else "MOIC (x)"
+
+    fig = go.Figure()
+    fig.add_trace(go.Heatmap(
+        x=surface.exit_multiples,
+        y=surface.revenue_growths,
+        z=values.T,
+        colorscale="RdYlGn",
+        colorbar=dict(title=label),
+        hovertemplate="Exit Multiple: %{x:.1f}x<br>Revenue Growth: %{y:.1f}%<br>" + label + ": %{z:.1f}<extra></extra>",
+    ))
+    if marker is not None:
+        fig.add_trace(go.Scatter(
+            x=[marker[0]],
+            y=[marker[1]],
+            mode="markers",
+            marker=dict(color="black", size=10, symbol="x"),
+            showlegend=False,
+            hoverinfo="skip",
+        ))
+    fig.update_layout(
+        title=f"{label} Sensitivity ({holding_period}-Year Hold)",
+        xaxis_title="Exit EV/Revenue Multiple",
+        yaxis_title="Revenue Growth Rate (%)",
+        template="plotly_white",
+        height=500,
+        width=600
+    )
+    return fig
+
+
+# Goal-seek solution along another input's grid, e.g. the most that can be paid for a
+# target IRR at every exit multiple; points with no feasible solution are left as gaps
+def goal_seek_chart(solution, x, x_label, value_label, color, marker=None):
+    target = f"{solution.target_value.flat[0]:.1f}% IRR" if solution.target == "irr" else f"{solution.target_value.flat[0]:.1f}x MOIC"
+    fig = go.Figure()
+    fig.add_trace(go.Scatter(
+        x=x,
+        y=np.where(solution.feasible, solution.value, np.nan),
+        mode="lines",
+        line=dict(color=color, width=3),
+        hovertemplate=f"{x_label}: %{{x:.1f}}<br>{value_label}: %{{y:,.1f}}<extra></extra>",
+        showlegend=False,
+    ))
+    if marker is not None:
+        fig.add_trace(go.Scatter(
+            x=[marker[0]],
+            y=[marker[1]],
+            mode="markers",
+            marker=dict(color="black", size=10, symbol="x"),
+            showlegend=False,
+            hoverinfo="skip",
+        ))
+    fig.update_layout(
+        title=f"{value_label} for {target}",
+        xaxis_title=x_label,
+        yaxis_title=value_label,
+        template="plotly_white",
+        height=500,
+        width=600
+    )
+    return fig
+
+
+# Entry / league average / comps / exit multiple bars
+def multiple_comparison_chart(entry_multiple, average_multiple, comps_multiple, exit_multiple, color,
+                              comps_color="navy", label="TEV/Revenue"):
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=["Entry", "NBA Average", "Comps", "Exit"],
+        y=[entry_multiple, average_multiple, comps_multiple, exit_multiple],
+        marker_color=[color, "gray", comps_color, color],
+        text=[f"{entry_multiple:.1f}", f"{average_multiple:.1f}", f"{comps_multiple:.1f}", f"{exit_multiple:.1f}"],
+        textposition="outside"
+    ))
+    fig.update_layout(
+        title=f"{label} Comparison",
+        yaxis_title=f"{label} Multiple",
+        template="plotly_white",
+        barmode="group",
+        height=500,
+        width=600
+    )
+    return fig
+
+
+# Revenue growth of each comparable next to the deal's growth rate
+def growth_comparison_chart(comparables, revenue_growth, color, label="Required",
+                            title="Implied Revenue Growth Rate vs Comparables"):
+    growth_values = [c.revenue_growth for c in comparables] + [revenue_growth]
+    fig = go.Figure()
+    fig.add_trace(go.Bar(
+        x=[c.short_name for c in comparables] + [label],
+        y=growth_values,
+        marker_color=[c.color for c in comparables] + [color],
+        text=[f"{val:.1f}" for val in growth_values],
+        textposition="outside"
+    ))
+    fig.update_layout(
+        title=title,
+        yaxis_title="Revenue Growth Rate (%)",
+        template="plotly_white",
+        barmode="group",
+        height=500,
+        width=600
+    )
+    return fig
+
+
+# Multiple comparison and stake equity for every exit multiple in a sweep, embedded as
+# Plotly frames behind an in-figure slider so scrubbing the multiple never hits the server.
+# Built as a plain figure spec so position_scrubber can open it at any frame while sharing
+# the frames; it is validated into a Figure once per position, by scrubber_figure_stage.
+def exit_multiple_scrubber(sweep, entry_multiple, average_multiple, comps_multiple, color,
+                           comps_color="navy", label="TEV/Revenue"):
+    multiples = sweep.exit_multiples.tolist()
+    growth = sweep.revenue_growth.tolist()
+    irr = sweep.result.irr.tolist()
+    moic = sweep.result.moic.tolist()
+    exit_equity = sweep.result.exit_cash_flow.tolist()
+    entry_equity = float(np.ravel(sweep.result.entry_cash_flow)[0])
+    names = [f"{m:.1f}" for m in multiples]
+
+    fixed_bars = [entry_multiple, average_multiple, comps_multiple]
+    fixed_text = [f"{m:.1f}" for m in fixed_bars]
+    frames = [
+        {
+            "name": names[i],
+            "traces": [0, 1],
+            "data": [
+                {"y": fixed_bars + [multiples[i]], "text": fixed_text + [names[i]]},
+                {"y": [entry_equity, exit_equity[i]], "text": [f"${entry_equity:,.0f}", f"${exit_equity[i]:,.0f}"]},
+            ],
+            "layout": {"title": {"text": (
+                f"Exit {names[i]}x: IRR {f'{irr[i]:.1f}%' if np.isfinite(irr[i]) else 'n/a'} | "
+                f"MOIC {moic[i]:.1f}x | Revenue Growth {growth[i]:.1f}%"
+            )}},
+        }
+        for i in range(len(multiples))
+    ]
+    animate = {"mode": "immediate", "frame": {"duration": 0, "redraw": True}, "transition": {"duration": 0}}
+
+    equity_values = [entry_equity] + [v for v in exit_equity if np.isfinite(v)]
+    return {
+        "data": [
+            {
+                "type": "bar",
+                "x": ["Entry", "NBA Average", "Comps", "Exit"],
+                "marker": {"color": [color, "gray", comps_color, color]},
+                "textposition": "outside",
+                "showlegend": False,
+                "xaxis": "x",
+                "yaxis": "y",
+            },
+            {
+                "type": "bar",
+                "x": ["Entry", "Exit"],
+                "marker": {"color": ["gray", color]},
+                "textposition": "outside",
+                "showlegend": False,
+                "xaxis": "x2",
+                "yaxis": "y2",
+            },
+        ],
+        "frames": frames,
+        "layout": {
+            "template": "plotly_white",
+            "height": 500,
+            "xaxis": {"domain": [0.0, 0.45], "anchor": "y"},
+            "xaxis2": {"domain": [0.55, 1.0], "anchor": "y2"},
+            # Fixed axes so bars move against a stable scale while scrubbing
+            "yaxis": {
+                "anchor": "x",
+                "title": {"text": f"{label} Multiple"},
+                "range": [0, max(multiples + fixed_bars) * 1.15],
+            },
+            "yaxis2": {"anchor": "x2", "range": [min(0, *equity_values) * 1.15, max(equity_values) * 1.15]},
+            "annotations": [
+                {"text": f"{label} Comparison", "x": 0.225, "y": 1.0, "xref": "paper", "yref": "paper",
+                 "xanchor": "center", "yanchor": "bottom", "showarrow": False},
+                {"text": "Stake Equity ($M)", "x": 0.775, "y": 1.0, "xref": "paper", "yref": "paper",
+                 "xanchor": "center", "yanchor": "bottom", "showarrow": False},
+            ],
+            "sliders": [{
+                "currentvalue": {"prefix": "Exit Multiple: ", "suffix": "x"},
+                "steps": [{"label": name, "method": "animate", "args": [[name], animate]} for name in names],
+            }],
+        },
+    }
+
+
+# Scrubber figure opened at the frame nearest to exit_multiple; shares the frames with spec
+def position_scrubber(spec, exit_multiple):
+    steps = spec["layout"]["sliders"][0]["steps"]
+    active = min(range(len(steps)), key=lambda i: abs(float(steps[i]["label"]) - exit_multiple))
+    frame = spec["frames"][active]
+    data = [{**trace, **update} for trace, update in zip(spec["data"], frame["data"])]
+    layout = {
+        **spec["layout"],
+        "title": frame["layout"]["title"],
+        "sliders": [{**spec["layout"]["sliders"][0], "active": active}],
+    }
+    return {"data": data, "frames": spec["frames"], "layout": layout}
@@ -0,0 +1,148 @@
+import heapq
+from datetime import date
+
+import numpy as np
+
+
+# NBA average EV/Revenue multiple shown on the dashboards, and the comps multiple when
+# no other transaction qualifies
+LEAGUE_AVERAGE_MULTIPLE = 11.9
+
+MARKET_SIZE_SCORES = {"Small": 0.0, "Mid": 0.5, "Large": 1.0}
+
+# Relative importance of each similarity feature after standardization
+FEATURE_WEIGHTS = {
+    "revenue": 1.0,
+    "enterprise_value": 1.0,
+    "revenue_growth": 1.0,
+    "market_size": 1.0,
+    "recency": 0.5,
+}
+FEATURES = list(FEATURE_WEIGHTS)
+
+
+def market_size_score(market_size):
+    return MARKET_SIZE_SCORES.get(market_size, 0.5)
+
+
+LEAF_SIZE = 128
+
+
+class CompsIndex:
+    # KD-tree over the standardized, weighted transaction features, built once so a
+    # nearest-neighbour query only visits the few leaves near the target
+
+    def __init__(self, transactions, as_of=None, leaf_size=LEAF_SIZE):
+        transactions = list(transactions)
+        self.as_of = as_of or max((t.date for t in transactions), default=date.today())
+
+        raw = np.array([
+            [
+                np.log(t.transaction_value / t.ev_revenue),
+                np.log(t.transaction_value),
+                t.revenue_growth,
+                market_size_score(t.market_size),
+                (self.as_of - t.date).days / 365.25,
+            ]
+            for t in transactions
+        ], dtype=float).reshape(-1, len(FEATURES))
+
+        self.mean = raw.mean(axis=0) if len(raw) else np.zeros(len(FEATURES))
+        std = raw.std(axis=0) if len(raw) else np.ones(len(FEATURES))
+        self.scale = np.where(std > 0, std, 1.0) / np.array([FEATURE_WEIGHTS[f] for f in FEATURES])
+        points = (raw - self.mean) / self.scale
+
+        # Nodes: (start, end) into the reordered points, bounding box, children (-1 for leaves)
+        self.leaf_size = leaf_size
+        self.node_start, self.node_end, self.node_lo, self.node_hi, self.node_children = [], [], [], [], []
+        order = np.arange(len(points))
+        if len(points):
+            self._build(points, order, 0, len(points))
+
+        self.transactions = [transactions[i] for i in order]
+        self.points = points[order]
+        team_names = sorted({t.team for t in self.transactions})
+        self._team_codes = {name: i for i, name in enumerate(team_names)}
+        self.team_codes = np.array([self._team_codes[t.team] for t in self.transactions], dtype=np.int64)
+        self.node_lo = np.array(self.node_lo).reshape(-1, len(FEATURES))
+        self.node_hi = np.array(self.node_hi).reshape(-1, len(FEATURES))
+
+    def _build(self, points, order, start, end):
+        node = len(self.node_start)
+        block = points[order[start:end]]
+        self.node_start.append(start)
+        self.node_end.append(end)
+        self.node_lo.append(block.min(axis=0))
+        self.node_hi.append(block.max(axis=0))
+        self.node_children.append((-1, -1))
+        if end - start > self.leaf_size:
+            dim = int(np.argmax(self.node_hi[node] - self.node_lo[node]))
+            mid = (end - start) // 2
+            order[start:end] = order[start:end][np.argpartition(block[:, dim], mid)]
+            left = self._build(points, order, start, start + mid)
+            right = self._build(points, order, start + mid, end)
+            self.node_children[node] = (left, right)
+        return node
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def _query_point(self, revenue, enterprise_value, revenue_growth, market_size):
+        raw = np.array([
+            np.log(revenue),
+            np.log(enterprise_value),
+            revenue_growth if revenue_growth is not None else self.mean[2],
+            market_size_score(market_size),
+            0.0,  # the target is priced today
+        ])
+        # Without a growth view, growth contributes nothing to the distance
+        weights = np.ones(len(FEATURES))
+        weights[2] = revenue_growth is not None
+        return (raw - self.mean) / self.scale, weights
+
+    # Lower bound on the distance from point to anything inside each node, for all nodes at once
+    def _box_distances(self, point, weights):
+        gap = np.maximum(np.maximum(self.node_lo - point, point - self.node_hi), 0)
+        return ((gap * gap) @ weights).tolist()
+
+    # k most similar transactions (closest first) with their distances
+    def nearest(self, revenue, enterprise_value, market_size, revenue_growth=None, k=3, exclude_team=None):
+        if not len(self) or k <= 0:
+            return [], np.array([])
+        point, weights = self._query_point(revenue, enterprise_value, revenue_growth, market_size)
+        excluded = self._team_codes.get(exclude_team, -1)
+
+        box_distances = self._box_distances(point, weights)
+
+        best_distances = np.full(k, np.inf)
+        best_indices = np.full(k, -1)
+        heap = [(0.0, 0)]
+        while heap:
+            bound, node = heapq.heappop(heap)
+            if bound > best_distances[-1]:
+                break
+            left, right = self.node_children[node]
+            if left < 0:
+                start, end = self.node_start[node], self.node_end[node]
+                diff = self.points[start:end] - point
+                distances = (diff * diff) @ weights
+                if excluded >= 0:
+                    distances[self.team_codes[start:end] == excluded] = np.inf
+                if distances.min() >= best_distances[-1]:
+                    continue
+                distances = np.concatenate([best_distances, distances])
+                indices = np.concatenate([best_indices, np.arange(start, end)])
+                keep = np.argsort(distances, kind="stable")[:k]
+                best_distances, best_indices = distances[keep], indices[keep]
+            else:
+                heapq.heappush(heap, (box_distances[left], left))
+                heapq.heappush(heap, (box_distances[right], right))
+
+        found = np.isfinite(best_distances)
+        return [self.transactions[i] for i in best_indices[found]], np.sqrt(best_distances[found])
+
+
+# Comps multiple shown on the dashboards: average EV/Revenue of the closest comps, or the
+# default when there are none (a team with no other transactions in the registry)
+def comps_multiple(comparables, default=LEAGUE_AVERAGE_MULTIPLE):
+    return float(np.mean([c.ev_revenue for c in comparables])) if comparables else default
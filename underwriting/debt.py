@@ -0,0 +1,166 @@
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+import numpy as np
+
+
+# Most debt a team may carry under league rules ($M); the sidebar inputs are capped at it
+LEAGUE_DEBT_CAP = 475.0
+
+# amortizing: straight-line principal down to the ending debt by exit
+# bullet:     no principal until exit, when the balance is repaid from the sale
+# cash_sweep: cash left after interest repays principal as it is earned
+PROFILES = ("amortizing", "bullet", "cash_sweep")
+AMORTIZING, BULLET, CASH_SWEEP = range(len(PROFILES))
+
+
+@dataclass(frozen=True)
+class Refinancing:
+    year: float  # years after entry; applied to the balance at the end of that period
+    balance: Optional[float] = None  # new balance ($M); the change is paid to (or funded by) the owners
+    interest_rate: Optional[float] = None  # annual %, from then on
+    profile: Optional[str] = None
+
+
+@dataclass(frozen=True)
+class DebtTerms:
+    profile: str = "amortizing"
+    interest_rate: float = 0.0  # annual %, on the opening balance of each period
+    cash_margin: float = 0.0  # % of revenue available to service debt; unpaid interest is capitalized
+    sweep: float = 100.0  # % of cash left after interest that repays principal (cash_sweep)
+    refinancings: Tuple[Refinancing, ...] = ()
+    cap: float = LEAGUE_DEBT_CAP
+
+    def __post_init__(self):
+        for profile in (self.profile, *(r.profile for r in self.refinancings if r.profile)):
+            if profile not in PROFILES:
+                raise ValueError(f"Unknown debt profile {profile!r}; use one of {', '.join(PROFILES)}.")
+
+    # The schedule is starting -> ending debt in equal steps, as before debt terms existed
+    @property
+    def straight_line(self):
+        return self.profile == "amortizing" and self.interest_rate == 0 and not self.refinancings
+
+    def schedule(self, starting_debt, ending_debt, revenue, periods, periods_per_year=1):
+        return debt_schedule(
+            starting_debt,
+            ending_debt,
+            revenue,
+            periods,
+            profile=self.profile,
+            interest_rate=self.interest_rate,
+            cash_margin=self.cash_margin,
+            sweep=self.sweep,
+            refinancings=self.refinancings,
+            periods_per_year=periods_per_year,
+            cap=self.cap,
+        )
+
+    def to_dict(self):
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data):
+        data = dict(data)
+        data["refinancings"] = tuple(Refinancing(**r) for r in data.get("refinancings", ()))
+        return cls(**data)
+
+
+DEFAULT_DEBT_TERMS = DebtTerms()
+
+
+@dataclass(frozen=True)
+class DebtSchedule:
+    balances: np.ndarray  # (..., periods + 1) closing balance; [0] at entry, held flat after exit
+    interest: np.ndarray  # interest accrued in each period
+    principal: np.ndarray  # principal repaid in each period (negative when the loan grows)
+    refinancing: np.ndarray  # new borrowing (+) or paydown (-) at refinancing events before exit
+    exit_balance: np.ndarray  # (...) balance repaid at exit
+    peak_balance: np.ndarray
+    within_cap: np.ndarray  # peak balance <= cap
+
+
+# Period-by-period balances for every scenario at once. revenue is the annual revenue run
+# rate at the end of each period, shape (..., P + 1); periods (...) is how many of those
+# periods each scenario holds the deal. The recursion runs over periods; every step is
+# vectorized across scenarios.
+def debt_schedule(
+    starting_debt,
+    ending_debt,
+    revenue,
+    periods,
+    profile="amortizing",
+    interest_rate=0.0,
+    cash_margin=0.0,
+    sweep=100.0,
+    refinancings=(),
+    periods_per_year=1,
+    cap=LEAGUE_DEBT_CAP,
+):
+    revenue = np.asarray(revenue, dtype=float)
+    shape = np.broadcast_shapes(
+        revenue.shape[:-1], np.shape(starting_debt), np.shape(ending_debt), np.shape(periods),
+        np.shape(interest_rate), np.shape(cash_margin), np.shape(sweep),
+    )
+    total_periods = revenue.shape[-1] - 1
+    revenue = np.broadcast_to(revenue, shape + (total_periods + 1,))
+    periods = np.broadcast_to(np.asarray(periods, dtype=np.int64), shape)
+    ending_debt = np.broadcast_to(np.asarray(ending_debt, dtype=float), shape)
+    margin = np.broadcast_to(np.asarray(cash_margin, dtype=float) / 100 / periods_per_year, shape)
+    sweep = np.broadcast_to(np.asarray(sweep, dtype=float) / 100, shape)
+    rate = np.broadcast_to(np.asarray(interest_rate, dtype=float) / 100 / periods_per_year, shape).copy()
+    kind = np.full(shape, PROFILES.index(profile))
+
+    balances = np.empty(shape + (total_periods + 1,))
+    balances[..., 0] = starting_debt
+    interest = np.zeros_like(balances)
+    principal = np.zeros_like(balances)
+    refinancing = np.zeros_like(balances)
+    events = {}
+    for event in refinancings:
+        events.setdefault(int(round(event.year * periods_per_year)), []).append(event)
+
+    for t in range(1, total_periods + 1):
+        held = t <= periods
+        opening = balances[..., t - 1]
+
+        accrued = opening * rate
+        cash = revenue[..., t] * margin
+        paid = np.clip(cash, 0.0, np.maximum(accrued, 0.0))
+        owed = opening + accrued - paid
+        free = cash - paid
+
+        remaining = np.maximum(periods - t + 1, 1)
+        repaid = np.select(
+            [kind == AMORTIZING, kind == CASH_SWEEP],
+            [(owed - ending_debt) / remaining, np.clip(free * sweep, 0.0, np.maximum(owed, 0.0))],
+            0.0,
+        )
+        closing = owed - repaid
+
+        # Refinancing before exit resets the balance and, optionally, the rate and profile
+        before_exit = t < periods
+        for event in events.get(t, ()):
+            if event.balance is not None:
+                refinancing[..., t] += np.where(before_exit, event.balance - closing, 0.0)
+                closing = np.where(before_exit, event.balance, closing)
+            if event.interest_rate is not None:
+                rate = np.where(before_exit, event.interest_rate / 100 / periods_per_year, rate)
+            if event.profile is not None:
+                kind = np.where(before_exit, PROFILES.index(event.profile), kind)
+
+        balances[..., t] = np.where(held, closing, opening)
+        interest[..., t] = np.where(held, accrued, 0.0)
+        principal[..., t] = np.where(held, repaid, 0.0)
+
+    exit_balance = np.take_along_axis(balances, np.minimum(periods, total_periods)[..., None], axis=-1)[..., 0]
+    peak_balance = balances.max(axis=-1)
+    return DebtSchedule(
+        balances=balances,
+        interest=interest,
+        principal=principal,
+        refinancing=refinancing,
+        exit_balance=exit_balance,
+        peak_balance=peak_balance,
+        within_cap=peak_balance <= cap,
+    )
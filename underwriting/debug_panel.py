@@ -0,0 +1,54 @@
+import pandas as pd
+import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from underwriting import metrics
+
+
+def current_session_id():
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "bare"
+
+
+# Span over this script run (or fragment run) of the current session. A fragment nests
+# under the full run rendering it; a fragment rerun on its own starts afresh
+def start_rerun(name="rerun", fragment=False):
+    ctx = get_script_run_ctx()
+    nested = fragment and ctx is not None and not ctx.fragment_ids_this_run
+    return metrics.start_rerun(current_session_id(), name, nested)
+
+
+def summary_frame(stage_metrics):
+    rows = stage_metrics.summary()
+    return pd.DataFrame({
+        "Span": [name for name, *_ in rows],
+        "Calls": [count for _, count, *_ in rows],
+        "Mean (ms)": [mean * 1000 for _, _, mean, *_ in rows],
+        "P50 (ms)": [p50 * 1000 for *_, p50, _, _ in rows],
+        "P95 (ms)": [p95 * 1000 for *_, p95, _ in rows],
+        "Max (ms)": [longest * 1000 for *_, longest in rows],
+    })
+
+
+# Sidebar panel of this session's and the whole server's stage latencies and memory,
+# shown only when instrumentation is on (NBA_MODEL_METRICS)
+def render_metrics_panel():
+    if not metrics.enabled():
+        return
+    session = metrics.session_metrics(current_session_id())
+    with st.sidebar.expander("Performance"):
+        st.caption("This session")
+        st.dataframe(summary_frame(session), hide_index=True)
+        st.caption("All sessions")
+        st.dataframe(summary_frame(metrics.AGGREGATE), hide_index=True)
+        st.caption(
+            f"Peak traced memory per rerun: {session.peak_memory / 1024 ** 2:,.1f} MB (session), "
+            f"{metrics.AGGREGATE.peak_memory / 1024 ** 2:,.1f} MB (all) · "
+            f"Server max RSS: {metrics.max_rss() / 1024 ** 2:,.0f} MB"
+        )
+        st.download_button(
+            label="Download Metrics",
+            data=lambda: metrics.metrics_text(include_sessions=True),
+            file_name="nba_model_metrics.prom",
+            mime="text/plain",
+        )
@@ -0,0 +1,143 @@
+from dataclasses import dataclass
+from typing import List
+
+import numpy_financial as npf
+
+from underwriting.debt import DEFAULT_DEBT_TERMS, DebtTerms
+
+
+# Generate quarter labels ("1Q25", "2Q25", ...) for the entry/exit dropdowns
+def generate_quarters(start_year, end_year):
+    quarters = []
+    for year in range(start_year, end_year + 1):
+        for quarter in range(1, 5):
+            quarters.append(f"{quarter}Q{year % 100:02d}")
+    return quarters
+
+
+# Convert a quarter label such as "2Q25" to a fractional year (2025.25)
+def quarter_to_year(quarter):
+    try:
+        quarter_num = int(quarter[0])
+        year = int("20" + quarter[2:])
+    except (ValueError, IndexError, TypeError):
+        raise ValueError("Invalid quarter format. Use the format '1Q25'.")
+    if quarter_num not in [1, 2, 3, 4]:
+        raise ValueError("Quarter must be between 1 and 4.")
+    return year + (quarter_num - 1) / 4
+
+
+@dataclass(frozen=True)
+class DealInputs:
+    ownership_stake: float  # % of the team acquired
+    starting_enterprise_value: float  # $M
+    starting_revenue: float  # $M
+    revenue_growth: float  # annual revenue growth (%)
+    exit_multiple: float  # exit EV/Revenue multiple
+    holding_period_years: float
+    starting_debt: float = 0.0  # $M
+    ending_debt: float = 0.0  # $M
+    # When False, entry/exit cash flows are taken on enterprise value (App.py);
+    # when True, debt is netted out of entry and exit equity (AppV2.py)
+    include_debt: bool = True
+    # Amortization profile, interest and refinancing of the debt; the default steps
+    # straight from starting to ending debt
+    debt_terms: DebtTerms = DEFAULT_DEBT_TERMS
+
+    @property
+    def entry_multiple(self):
+        return self.starting_enterprise_value / self.starting_revenue
+
+    @property
+    def starting_equity(self):
+        return self.starting_enterprise_value - self.starting_debt
+
+    @property
+    def debt_paid(self):
+        return self.starting_debt - self.ending_debt
+
+    @property
+    def projection_years(self):
+        return int(self.holding_period_years)
+
+
+@dataclass(frozen=True)
+class DealResult:
+    inputs: DealInputs
+    projected_revenue: List[float]
+    debt_levels: List[float]
+    cash_flows: List[float]
+    entry_cash_flow: float
+    exit_enterprise_value: float
+    exit_equity: float
+    exit_cash_flow: float
+    irr: float  # %
+    moic: float
+    within_debt_cap: bool = True  # peak debt within the league cap; True when debt is not netted out
+
+
+def calculate_irr(cash_flows):
+    return npf.irr(cash_flows) * 100
+
+
+def project_revenue(starting_revenue, revenue_growth, years):
+    growth = revenue_growth / 100
+    return [starting_revenue * ((1 + growth) ** year) for year in range(years + 1)]
+
+
+# Straight-line paydown from starting to ending debt over the projection years
+def project_debt(starting_debt, ending_debt, years):
+    if years <= 0:
+        return [starting_debt]
+    debt_paid = starting_debt - ending_debt
+    return [starting_debt - (debt_paid * i / years) for i in range(years + 1)]
+
+
+def underwrite(inputs):
+    years = inputs.projection_years
+    projected_revenue = project_revenue(inputs.starting_revenue, inputs.revenue_growth, years)
+
+    terms = inputs.debt_terms
+    if terms.straight_line:
+        debt_levels = project_debt(inputs.starting_debt, inputs.ending_debt, years)
+        exit_debt = inputs.ending_debt
+        refinancing = [0] * (years + 1)
+        within_debt_cap = max(inputs.starting_debt, inputs.ending_debt) <= terms.cap
+    else:
+        schedule = terms.schedule(inputs.starting_debt, inputs.ending_debt, projected_revenue, years)
+        debt_levels = schedule.balances.tolist()
+        exit_debt = float(schedule.exit_balance)
+        refinancing = schedule.refinancing.tolist()
+        within_debt_cap = bool(schedule.within_cap)
+
+    stake = inputs.ownership_stake / 100
+    exit_enterprise_value = projected_revenue[-1] * inputs.exit_multiple
+    if inputs.include_debt:
+        entry_equity = inputs.starting_equity
+        exit_equity = exit_enterprise_value - exit_debt
+        # Refinancing proceeds are distributed to (or shortfalls funded by) the owners
+        interim = [stake * flow if flow else 0 for flow in refinancing[1:years]]
+    else:
+        entry_equity = inputs.starting_enterprise_value
+        exit_equity = exit_enterprise_value
+        interim = [0] * (years - 1)
+
+    entry_cash_flow = stake * entry_equity
+    exit_cash_flow = stake * exit_equity
+    cash_flows = [-entry_cash_flow] + interim + [exit_cash_flow]
+    invested = abs(entry_cash_flow) - sum(flow for flow in interim if flow < 0)
+    returned = exit_cash_flow + sum(flow for flow in interim if flow > 0)
+
+    return DealResult(
+        inputs=inputs,
+        projected_revenue=projected_revenue,
+        debt_levels=debt_levels,
+        cash_flows=cash_flows,
+        entry_cash_flow=entry_cash_flow,
+        exit_enterprise_value=exit_enterprise_value,
+        exit_equity=exit_equity,
+        exit_cash_flow=exit_cash_flow,
+        irr=calculate_irr(cash_flows),
+        moic=returned / invested,
+        within_debt_cap=within_debt_cap or not inputs.include_debt,
+    )
@@ -0,0 +1,252 @@
+import argparse
+import json
+import re
+from dataclasses import dataclass, fields
+
+import numpy as np
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.packaging.custom import BoolProperty, FloatProperty, StringProperty
+from openpyxl.styles import Alignment, Font, NamedStyle, PatternFill
+
+from underwriting.batch import evaluate_batch, evaluate_deals
+from underwriting.debt import DEFAULT_DEBT_TERMS, DebtTerms
+from underwriting.engine import DealInputs
+from underwriting.parity import DEAL_PROPERTY_PREFIX
+from underwriting.quarterly import project_quarterly, quarter_index, quarter_label, revenue_run_rate
+
+
+ACCOUNTING_FORMAT = "_($#,##0.0_);_($(#,##0.0);_($\"-\"??_);_(@_)"
+PROJECTION_END_YEAR = 2040
+SENSITIVITY_MULTIPLES = np.arange(5.0, 20.5, 1.0)
+
+
+@dataclass(frozen=True)
+class PipelineDeal:
+    name: str
+    inputs: DealInputs
+    entry_quarter: str = "2Q25"
+
+
+# Registered once per workbook and referenced by name from every cell
+def named_styles():
+    header_fill = PatternFill(start_color="0056b3", end_color="0056b3", fill_type="solid")
+    center = Alignment(horizontal="center", vertical="center")
+    right = Alignment(horizontal="right", vertical="center")
+    return [
+        NamedStyle(name="deal_header", font=Font(color="FFFFFF", bold=True, underline="single"), fill=header_fill, alignment=center),
+        NamedStyle(name="deal_label", font=Font(bold=True)),
+        NamedStyle(name="deal_currency", number_format=ACCOUNTING_FORMAT, alignment=center),
+        NamedStyle(name="deal_input", font=Font(color="0000FF"), number_format="#,##0.0", alignment=right),
+        NamedStyle(name="deal_multiple", number_format="0.0x", alignment=right),
+        NamedStyle(name="deal_percent", number_format="0.0%", alignment=right),
+    ]
+
+
+# Stores the export layout and the exact engine inputs (plus any context such as the
+# quarters shown) as custom document properties, for underwriting.parity to check against
+def record_deal(wb, layout, inputs, **context):
+    wb.custom_doc_props.append(StringProperty(name=f"{DEAL_PROPERTY_PREFIX}layout", value=layout))
+    for field in fields(inputs):
+        value = getattr(inputs, field.name)
+        name = f"{DEAL_PROPERTY_PREFIX}{field.name}"
+        if isinstance(value, bool):
+            wb.custom_doc_props.append(BoolProperty(name=name, value=value))
+        elif hasattr(value, "to_dict"):
+            wb.custom_doc_props.append(StringProperty(name=name, value=json.dumps(value.to_dict())))
+        else:
+            wb.custom_doc_props.append(FloatProperty(name=name, value=float(value)))
+    for key, value in context.items():
+        wb.custom_doc_props.append(StringProperty(name=f"{DEAL_PROPERTY_PREFIX}{key}", value=str(value)))
+
+
+def styled(ws, value, style):
+    cell = WriteOnlyCell(ws, value=value)
+    cell.style = style
+    return cell
+
+
+# Excel sheet names: at most 31 characters, no []:*?/\ and unique within the workbook
+def sheet_title(name, used):
+    base = re.sub(r"[\[\]:*?/\\]", "", name)[:31] or "Deal"
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title, n = base[:31 - len(suffix)] + suffix, n + 1
+    used.add(title.lower())
+    return title
+
+
+# Quarterly revenue, debt and cash flows from the entry quarter through the end of the
+# projection horizon (or the exit, if later). Through the exit they are project_quarterly's,
+# so debt follows the deal's debt terms and refinancing flows land in their quarters; after
+# it revenue keeps compounding and debt stays at its exit balance.
+def quarterly_projection(deal, end_year=PROJECTION_END_YEAR):
+    entry = quarter_index(deal.entry_quarter)
+    exit_ = entry + 4 * deal.inputs.projection_years
+    projection = project_quarterly(deal.inputs, deal.entry_quarter, quarter_label(exit_))
+    count = max(quarter_index(f"4Q{end_year % 100:02d}"), exit_) - entry + 1
+
+    revenue = revenue_run_rate(deal.inputs.starting_revenue, deal.inputs.revenue_growth, np.arange(count)) / 4
+    debt = np.full(count, projection.debt_levels[-1])
+    debt[:len(projection.debt_levels)] = projection.debt_levels
+    cash_flow = np.zeros(count)
+    cash_flow[:len(projection.cash_flows)] = projection.cash_flows
+    return [quarter_label(i) for i in range(entry, entry + count)], revenue, debt, cash_flow, projection
+
+
+def write_deal_sheet(wb, title, deal, result, index):
+    ws = wb.create_sheet(title=title)
+    ws.sheet_view.showGridLines = False
+    ws.column_dimensions["A"].width = 1
+    ws.column_dimensions["B"].width = 24
+
+    inputs = deal.inputs
+    entry_cash_flow = float(result.entry_cash_flow[index])
+    exit_cash_flow = float(result.exit_cash_flow[index])
+    labels, revenue, debt, cash_flow, projection = quarterly_projection(deal)
+
+    ws.append([None, styled(ws, deal.name, "deal_label")])
+    ws.append([])
+    for label, value, style in [
+        ("Ownership Stake (%)", inputs.ownership_stake, "deal_input"),
+        ("Starting Enterprise Value", inputs.starting_enterprise_value, "deal_input"),
+        ("Starting Revenue", inputs.starting_revenue, "deal_input"),
+        ("Starting Debt", inputs.starting_debt, "deal_input"),
+        ("Ending Debt", inputs.ending_debt, "deal_input"),
+        ("Revenue Growth (%)", inputs.revenue_growth, "deal_input"),
+        ("Exit Multiple", inputs.exit_multiple, "deal_multiple"),
+        ("Holding Period (yrs)", inputs.holding_period_years, "deal_input"),
+        ("Entry Quarter", deal.entry_quarter, "deal_input"),
+    ]:
+        ws.append([None, label, styled(ws, value, style)])
+    ws.append([])
+
+    ws.append([None] + [styled(ws, value, "deal_header") for value in [""] + labels])
+    for label, values in (("Revenue", revenue), ("Debt Level", debt), ("Cash Flow", cash_flow)):
+        ws.append([None, styled(ws, label, "deal_label")] + [styled(ws, v, "deal_currency") for v in values.tolist()])
+    ws.append([])
+
+    irr = float(result.irr[index])
+    for label, value, style in [
+        ("IRR (%)", irr / 100 if np.isfinite(irr) else None, "deal_percent"),
+        ("MOIC", float(result.moic[index]), "deal_multiple"),
+        ("Quarterly XIRR (%)", projection.irr / 100 if np.isfinite(projection.irr) else None, "deal_percent"),
+        ("Entry Equity", entry_cash_flow, "deal_currency"),
+        ("Exit Equity", exit_cash_flow, "deal_currency"),
+    ]:
+        ws.append([None, label, styled(ws, value, style)])
+    # Flush the sheet to its temp file now rather than holding its XML until save
+    ws.close()
+
+
+# One row per deal: IRR at each exit multiple, computed in one batch per distinct set of
+# debt terms (as evaluate_deals groups them)
+def write_sensitivity_sheet(wb, deals, multiples=SENSITIVITY_MULTIPLES):
+    ws = wb.create_sheet(title="Sensitivity")
+    ws.sheet_view.showGridLines = False
+    ws.column_dimensions["A"].width = 1
+    ws.column_dimensions["B"].width = 24
+
+    groups = {}
+    for i, deal in enumerate(deals):
+        groups.setdefault(deal.inputs.debt_terms, []).append(i)
+    irr = np.empty((len(deals), len(multiples)))
+    for terms, rows in groups.items():
+        columns = {
+            field: np.array([getattr(deals[i].inputs, field) for i in rows], dtype=float)[:, None]
+            for field in (
+                "ownership_stake", "starting_enterprise_value", "starting_revenue", "revenue_growth",
+                "holding_period_years", "starting_debt", "ending_debt",
+            )
+        }
+        include_debt = np.array([deals[i].inputs.include_debt for i in rows])[:, None]
+        irr[rows] = evaluate_batch(
+            exit_multiple=np.asarray(multiples)[None, :], include_debt=include_debt, debt_terms=terms, **columns
+        ).irr / 100
+
+    ws.append([None] + [styled(ws, v, "deal_header") for v in ["IRR by Exit Multiple"] + [f"{m:.1f}x" for m in multiples]])
+    for deal, row in zip(deals, irr.tolist()):
+        ws.append([None, styled(ws, deal.name, "deal_label")] + [
+            styled(ws, v if np.isfinite(v) else None, "deal_percent") for v in row
+        ])
+    ws.close()
+
+
+# Write-only workbook: rows are streamed to disk sheet by sheet, so memory stays flat
+# as the number of deals grows. progress(fraction, message), if given, is called as each
+# sheet is written, e.g. with an export job's report.
+def export_pipeline_workbook(deals, output, sensitivity_multiples=SENSITIVITY_MULTIPLES, progress=None):
+    deals = list(deals)
+    progress = progress or (lambda fraction, message: None)
+    wb = Workbook(write_only=True)
+    for style in named_styles():
+        wb.add_named_style(style)
+
+    results = evaluate_deals([d.inputs for d in deals])
+    if deals:
+        write_sensitivity_sheet(wb, deals, sensitivity_multiples)
+
+    used = {"sensitivity"}
+    for i, deal in enumerate(deals):
+        progress(0.1 + 0.8 * i / len(deals), f"Deal {i + 1:,} of {len(deals):,}")
+        write_deal_sheet(wb, sheet_title(deal.name, used), deal, results, i)
+
+    if not deals:
+        wb.create_sheet(title="Sensitivity")
+    progress(0.9, "Writing file")
+    wb.save(output)
+    return output
+
+
+# Debt terms from an optional debt_terms column, as DebtTerms.to_dict or its JSON; blank
+# cells take the default terms
+def debt_terms_from_cell(value):
+    if isinstance(value, str):
+        return DebtTerms.from_dict(json.loads(value)) if value.strip() else DEFAULT_DEBT_TERMS
+    if isinstance(value, dict):
+        return DebtTerms.from_dict(value)
+    return value if isinstance(value, DebtTerms) else DEFAULT_DEBT_TERMS
+
+
+def deals_from_table(deals):
+    return [
+        PipelineDeal(
+            name=f"{row['team']} - {row['scenario']}" if "scenario" in row else str(row["team"]),
+            inputs=DealInputs(
+                ownership_stake=row["ownership_stake"],
+                starting_enterprise_value=row["starting_enterprise_value"],
+                starting_revenue=row["starting_revenue"],
+                revenue_growth=row["revenue_growth"],
+                exit_multiple=row["exit_multiple"],
+                holding_period_years=row["holding_period_years"],
+                starting_debt=row["starting_debt"],
+                ending_debt=row["ending_debt"],
+                include_debt=bool(row["include_debt"]),
+                debt_terms=debt_terms_from_cell(row.get("debt_terms")),
+            ),
+            entry_quarter=row.get("entry_quarter", "2Q25") if isinstance(row.get("entry_quarter"), str) else "2Q25",
+        )
+        for row in deals.to_dict("records")
+    ]
+
+
+def main(argv=None):
+    from underwriting.runner import build_deals, read_table
+
+    parser = argparse.ArgumentParser(description="Export every team x scenario deal to one workbook.")
+    parser.add_argument("teams", help="CSV/Parquet of teams")
+    parser.add_argument("scenarios", help="CSV/Parquet of scenarios")
+    parser.add_argument("-o", "--output", default="pipeline.xlsx", help="Output workbook")
+    args = parser.parse_args(argv)
+
+    try:
+        deals = deals_from_table(build_deals(read_table(args.teams), read_table(args.scenarios)))
+    except ImportError as e:
+        parser.error(str(e))
+    export_pipeline_workbook(deals, args.output)
+    print(f"Exported {len(deals):,} deals -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
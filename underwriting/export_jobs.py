@@ -0,0 +1,187 @@
+import contextvars
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from underwriting.result_cache import result_key
+
+
+MAX_WORKERS = 2
+MAX_PENDING = 16
+EXPIRY_SECONDS = 15 * 60
+MAX_FILES = 128
+MAX_BYTES = 64 * 1024 ** 2
+
+# queued -> running -> done | failed; finished jobs are dropped once they expire
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class ExportQueueFull(RuntimeError):
+    pass
+
+
+# Stable hash of everything a workbook is built from (frozen dataclasses, numbers, labels)
+def deal_key(*parts):
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+class ExportJob:
+    # Handle to one background export; status, progress and message update as it runs
+
+    def __init__(self, key, file_name):
+        self.key = key
+        self.file_name = file_name
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = "Queued"
+        self.error = None
+        self.path = None
+        self.size = 0
+        self.submitted_at = time.time()
+        self.finished_at = None
+
+    @property
+    def finished(self):
+        return self.status in (DONE, FAILED)
+
+    # Passed to the build function, which calls it with (fraction done, what it is doing)
+    def report(self, progress, message):
+        self.progress = min(max(float(progress), 0.0), 1.0)
+        self.message = message
+
+    def read(self):
+        if self.status != DONE:
+            raise ValueError(f"Export {self.file_name} is {self.status}, not ready to download")
+        try:
+            with open(self.path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            raise ValueError(f"Export {self.file_name} has expired; prepare it again") from None
+
+
+class ExportJobs:
+    # Bounded thread pool that builds files off the script thread. Jobs are keyed by
+    # everything the file is built from (see deal_key), so submitting the same key again
+    # returns the queued, running or finished job instead of building twice. Finished
+    # files wait in a temporary directory until they expire or, least recently used
+    # first, until more than max_files of them or max_bytes in total are kept. They are
+    # also kept in the result cache (if given) so later sessions and restarted servers
+    # skip the build.
+
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING, expiry=EXPIRY_SECONDS, directory=None,
+                 results=None, max_files=MAX_FILES, max_bytes=MAX_BYTES):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.expiry = expiry
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._directory = directory
+        self.results = results
+        self._pool = None
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    # Created on first use, and removed with everything in it when the store goes away
+    @property
+    def directory(self):
+        if self._directory is None:
+            self._directory = tempfile.mkdtemp(prefix="nba_model_exports_")
+            weakref.finalize(self, shutil.rmtree, self._directory, True)
+        return self._directory
+
+    # build(report) returns the file's bytes, calling report(fraction, message) as it goes
+    def submit(self, key, build, file_name="export.xlsx"):
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(key)
+            if job is not None and job.status != FAILED:
+                self._jobs.move_to_end(key)
+                return job
+            if sum(not j.finished for j in self._jobs.values()) >= self.max_pending:
+                raise ExportQueueFull(f"{self.max_pending} exports are already in progress; try again shortly")
+            job = self._jobs[key] = ExportJob(key, file_name)
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="export")
+        # Carry the submitting session's metrics context into the worker
+        self._pool.submit(contextvars.copy_context().run, self._run, job, build)
+        return job
+
+    def get(self, key):
+        with self._lock:
+            self._expire()
+            job = self._jobs.get(key)
+            if job is not None:
+                self._jobs.move_to_end(key)
+            return job
+
+    def _run(self, job, build):
+        job.status = RUNNING
+        job.report(0.0, "Starting")
+        try:
+            if self.results is None:
+                data = build(job.report)
+            else:
+                data = self.results.get_or_compute(result_key("export", job.key, job.file_name), lambda: build(job.report))
+            path = os.path.join(self.directory, job.key + os.path.splitext(job.file_name)[1])
+            # Written beside the final name and renamed, so a download never sees half a file
+            with open(path + ".part", "wb") as f:
+                f.write(data)
+            os.replace(path + ".part", path)
+        except Exception as e:
+            job.error = f"{type(e).__name__}: {e}"
+            job.status = FAILED
+        else:
+            job.path = path
+            job.size = len(data)
+            job.report(1.0, "Ready")
+            job.status = DONE
+        finally:
+            job.finished_at = time.time()
+        with self._lock:
+            self._evict(job)
+
+    def _expire(self):
+        now = time.time()
+        for key, job in list(self._jobs.items()):
+            if job.finished and now - job.finished_at > self.expiry:
+                self._drop(key)
+
+    # Drops the least recently used files past the count or size limit; the file just
+    # built is kept even when it alone is over the size limit, until it expires
+    def _evict(self, newest):
+        ready = [job for job in self._jobs.values() if job.status == DONE]
+        count, total = len(ready), sum(job.size for job in ready)
+        for job in ready:
+            if count <= self.max_files and total <= self.max_bytes:
+                break
+            if job is not newest:
+                self._drop(job.key)
+                count -= 1
+                total -= job.size
+
+    def _drop(self, key):
+        job = self._jobs.pop(key)
+        if job.path is not None:
+            try:
+                os.remove(job.path)
+            except FileNotFoundError:
+                pass
+
+    def shutdown(self, wait=True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+
+
+# Shared by every session in the Streamlit server process. Built workbooks are not kept in
+# the result cache: they hold the whole deal and are cheap to rebuild next to their size.
+EXPORT_JOBS = ExportJobs()
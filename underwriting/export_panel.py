@@ -0,0 +1,54 @@
+import streamlit as st
+
+from underwriting.export_jobs import DONE, EXPORT_JOBS, FAILED, ExportQueueFull
+
+
+XLSX_MIME = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+POLL_SECONDS = 0.5
+
+
+# Progress bar of a running job, refreshed on a timer; once the job finishes one app rerun
+# replaces it with the download button and the timer stops
+@st.fragment(run_every=POLL_SECONDS)
+def job_progress(job):
+    if job.finished:
+        st.rerun()
+    st.progress(job.progress, text=job.message)
+
+
+# Prepare / progress / download controls for a workbook built in the background. The
+# script run only submits the job, so no widget waits for the file to be written.
+@st.fragment
+def export_controls(key, build, file_name, label="Download Excel File"):
+    render_export_controls(key, build, file_name, label)
+
+
+# export_controls for the (key, build, file_name, label) last stored in st.session_state
+# under state_key. A fragment reruns with the arguments of the last full script run, so
+# state set by another fragment (which reruns alone) is read here at every run instead.
+@st.fragment
+def session_export_controls(state_key):
+    request = st.session_state.get(state_key)
+    if request is not None:
+        render_export_controls(*request)
+
+
+def render_export_controls(key, build, file_name, label="Download Excel File"):
+    job = EXPORT_JOBS.get(key)
+    if job is None or job.status == FAILED:
+        if job is not None:
+            st.error(f"Export failed: {job.error}")
+        if not st.button("Prepare Excel File", key=f"prepare_{file_name}"):
+            return
+        try:
+            job = EXPORT_JOBS.submit(key, build, file_name)
+        except ExportQueueFull as e:
+            st.warning(str(e))
+            return
+
+    if not job.finished:
+        job_progress(job)
+    elif job.status == DONE:
+        st.download_button(label=label, data=job.read, file_name=file_name, mime=XLSX_MIME)
+    else:
+        st.error(f"Export failed: {job.error}")
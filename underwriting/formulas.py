@@ -0,0 +1,535 @@
+import operator
+import re
+import zipfile
+from dataclasses import dataclass, field
+from functools import lru_cache
+from io import BytesIO
+from statistics import median
+from typing import Dict, Tuple
+from xml.etree import ElementTree
+
+import numpy as np
+
+from underwriting.irr import solve_rate
+
+
+# Spreadsheet error values; they are returned as cell values and propagate like in Excel
+@dataclass(frozen=True)
+class FormulaError:
+    code: str
+
+    def __str__(self):
+        return self.code
+
+
+DIV0 = FormulaError("#DIV/0!")
+VALUE = FormulaError("#VALUE!")
+NUM = FormulaError("#NUM!")
+REF = FormulaError("#REF!")
+
+MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+REL_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+PACKAGE_REL_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+CUSTOM_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/custom-properties}"
+VT_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/docPropsVTypes}"
+
+
+# "AE12" -> (12, 31); rows and columns are 1-based like openpyxl
+def parse_coordinate(coordinate):
+    match = re.fullmatch(r"\$?([A-Za-z]{1,3})\$?(\d+)", coordinate)
+    if match is None:
+        raise ValueError(f"Invalid cell reference: {coordinate!r}")
+    column = 0
+    for letter in match.group(1).upper():
+        column = column * 26 + ord(letter) - 64
+    return int(match.group(2)), column
+
+
+def coordinate(row, column):
+    letters = ""
+    while column:
+        column, remainder = divmod(column - 1, 26)
+        letters = chr(65 + remainder) + letters
+    return f"{letters}{row}"
+
+
+@dataclass(frozen=True)
+class WorkbookCells:
+    # Constant cell values and formula text (without "=") by sheet and (row, column), plus
+    # the workbook's custom document properties
+    values: Dict[str, Dict[Tuple[int, int], object]]
+    formulas: Dict[str, Dict[Tuple[int, int], str]]
+    properties: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def sheet_names(self):
+        return list(self.values)
+
+
+def _text(element):
+    return "".join(t.text or "" for t in element.iter(f"{MAIN_NS}t"))
+
+
+def _read_sheet(xml, shared_strings):
+    values, formulas = {}, {}
+    for cell in ElementTree.fromstring(xml).iter(f"{MAIN_NS}c"):
+        key = parse_coordinate(cell.get("r"))
+        formula = cell.find(f"{MAIN_NS}f")
+        if formula is not None:
+            if not formula.text:
+                raise ValueError(f"Shared and array formulas are not supported ({cell.get('r')})")
+            formulas[key] = formula.text
+            continue
+
+        kind = cell.get("t", "n")
+        if kind == "inlineStr":
+            inline = cell.find(f"{MAIN_NS}is")
+            values[key] = _text(inline) if inline is not None else ""
+            continue
+        v = cell.find(f"{MAIN_NS}v")
+        if v is None or v.text is None:
+            continue
+        if kind == "n":
+            values[key] = float(v.text)
+        elif kind == "s":
+            values[key] = shared_strings[int(v.text)]
+        elif kind == "b":
+            values[key] = v.text == "1"
+        elif kind == "e":
+            values[key] = FormulaError(v.text)
+        else:
+            values[key] = v.text
+    return values, formulas
+
+
+def _read_properties(archive):
+    if "docProps/custom.xml" not in archive.namelist():
+        return {}
+    properties = {}
+    for prop in ElementTree.fromstring(archive.read("docProps/custom.xml")).iter(f"{CUSTOM_NS}property"):
+        value = next(iter(prop), None)
+        if value is None:
+            continue
+        kind = value.tag.removeprefix(VT_NS)
+        if kind in ("r4", "r8", "decimal"):
+            properties[prop.get("name")] = float(value.text)
+        elif kind.startswith(("i", "ui")) or kind == "int":
+            properties[prop.get("name")] = int(value.text)
+        elif kind == "bool":
+            properties[prop.get("name")] = value.text in ("1", "true")
+        else:
+            properties[prop.get("name")] = value.text or ""
+    return properties
+
+
+# Cells, formulas and custom properties of an .xlsx (path, file object or bytes), read
+# straight from the package XML: no styles, no openpyxl object model
+def read_workbook(source):
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    with zipfile.ZipFile(source) as archive:
+        names = set(archive.namelist())
+        shared_strings = []
+        if "xl/sharedStrings.xml" in names:
+            root = ElementTree.fromstring(archive.read("xl/sharedStrings.xml"))
+            shared_strings = [_text(si) for si in root.iter(f"{MAIN_NS}si")]
+
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.iter(f"{PACKAGE_REL_NS}Relationship")}
+
+        values, formulas = {}, {}
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        for sheet in workbook.iter(f"{MAIN_NS}sheet"):
+            target = targets[sheet.get(f"{REL_NS}id")]
+            path = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+            values[sheet.get("name")], formulas[sheet.get("name")] = _read_sheet(archive.read(path), shared_strings)
+        return WorkbookCells(values, formulas, _read_properties(archive))
+
+
+# Formula parsing. Precedence, loosest first: & ; + - ; * / ; ^ ; % ; unary -
+
+TOKEN = re.compile(r"""\s*(?:
+    (?P<string>"(?:[^"]|"")*")
+  | (?P<func>[A-Za-z_][A-Za-z0-9_.]*)(?=\()
+  | (?P<ref>(?:(?:'(?:[^']|'')+'|[A-Za-z_][A-Za-z0-9_.]*)!)?\$?[A-Za-z]{1,3}\$?\d+(?::\$?[A-Za-z]{1,3}\$?\d+)?)
+  | (?P<number>(?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?)
+  | (?P<bool>TRUE|FALSE)\b
+  | (?P<op>[-+*/^&%(),])
+)""", re.VERBOSE)
+
+
+def tokenize(formula):
+    tokens, pos = [], 0
+    formula = formula.rstrip()
+    while pos < len(formula):
+        match = TOKEN.match(formula, pos)
+        if match is None:
+            raise ValueError(f"Unsupported formula syntax at {formula[pos:]!r} in {formula!r}")
+        tokens.append((match.lastgroup, match.group(match.lastgroup)))
+        pos = match.end()
+    return tokens
+
+
+def _reference(text, sheet):
+    if "!" in text:
+        sheet, text = text.rsplit("!", 1)
+        if sheet.startswith("'"):
+            sheet = sheet[1:-1].replace("''", "'")
+    if ":" in text:
+        start, end = text.split(":")
+        (r1, c1), (r2, c2) = parse_coordinate(start), parse_coordinate(end)
+        return ("range", sheet, min(r1, r2), min(c1, c2), max(r1, r2), max(c1, c2))
+    return ("ref", sheet, *parse_coordinate(text))
+
+
+class _Parser:
+    # Recursive-descent parser producing nested tuples, e.g. ("bin", "*", left, right)
+
+    def __init__(self, formula, sheet):
+        self.formula = formula
+        self.sheet = sheet
+        self.tokens = tokenize(formula)
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def take(self, *ops):
+        kind, text = self.peek()
+        if kind == "op" and text in ops:
+            self.pos += 1
+            return text
+        return None
+
+    def expect(self, op):
+        if self.take(op) is None:
+            raise ValueError(f"Expected {op!r} in {self.formula!r}")
+
+    def parse(self):
+        node = self.binary(0)
+        if self.pos != len(self.tokens):
+            raise ValueError(f"Unexpected {self.peek()[1]!r} in {self.formula!r}")
+        return node
+
+    LEVELS = (("&",), ("+", "-"), ("*", "/"), ("^",))
+
+    def binary(self, level):
+        if level == len(self.LEVELS):
+            return self.unary()
+        node = self.binary(level + 1)
+        while (op := self.take(*self.LEVELS[level])) is not None:
+            node = ("bin", op, node, self.binary(level + 1))
+        return node
+
+    def unary(self):
+        op = self.take("-", "+")
+        if op is not None:
+            operand = self.unary()
+            return ("neg", operand) if op == "-" else ("pos", operand)
+        node = self.primary()
+        while self.take("%") is not None:
+            node = ("pct", node)
+        return node
+
+    def primary(self):
+        kind, text = self.peek()
+        if kind is None:
+            raise ValueError(f"Unexpected end of formula {self.formula!r}")
+        self.pos += 1
+        if kind == "number":
+            return ("const", float(text))
+        if kind == "string":
+            return ("const", text[1:-1].replace('""', '"'))
+        if kind == "bool":
+            return ("const", text == "TRUE")
+        if kind == "ref":
+            return _reference(text, self.sheet)
+        if kind == "func":
+            self.expect("(")
+            args = []
+            if self.take(")") is None:
+                args.append(self.binary(0))
+                while self.take(",") is not None:
+                    args.append(self.binary(0))
+                self.expect(")")
+            return ("call", text.upper(), args)
+        if text == "(":
+            node = self.binary(0)
+            self.expect(")")
+            return node
+        raise ValueError(f"Unexpected {text!r} in {self.formula!r}")
+
+
+# Value coercion, following Excel: blanks are 0 / "", numeric text converts in arithmetic
+
+NUMERIC_TEXT = re.compile(r"\s*([+-]?)\s*\$?\s*((?:\d{1,3}(?:,\d{3})+|\d*)(?:\.\d*)?(?:[eE][+-]?\d+)?)\s*(%?)\s*")
+
+
+def to_number(value):
+    if isinstance(value, FormulaError):
+        return value
+    if value is None:
+        return 0.0
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, Range):
+        return VALUE
+    match = NUMERIC_TEXT.fullmatch(value)
+    if match is None or not any(ch.isdigit() for ch in match.group(2)):
+        return VALUE
+    number = float(match.group(2).replace(",", ""))
+    if match.group(1) == "-":
+        number = -number
+    return number / 100 if match.group(3) else number
+
+
+def to_text(value):
+    if isinstance(value, FormulaError):
+        return value
+    if value is None:
+        return ""
+    if isinstance(value, bool):
+        return "TRUE" if value else "FALSE"
+    if isinstance(value, float):
+        return f"{value:.15g}"
+    if isinstance(value, Range):
+        return VALUE
+    return str(value)
+
+
+class Range(tuple):
+    # Values of a referenced block of cells, passed whole to aggregate functions
+    pass
+
+
+# Numbers from every argument: numeric cells of ranges (text and blanks skipped) and
+# directly given values coerced to numbers. Returns the first error met instead.
+def _collect_numbers(args):
+    numbers = []
+    for arg in args:
+        if isinstance(arg, Range):
+            for value in arg:
+                if isinstance(value, FormulaError):
+                    return value
+                if isinstance(value, float):
+                    numbers.append(value)
+        else:
+            value = to_number(arg)
+            if isinstance(value, FormulaError):
+                return value
+            numbers.append(value)
+    return numbers
+
+
+def _median(*args):
+    numbers = _collect_numbers(args)
+    if isinstance(numbers, FormulaError):
+        return numbers
+    return median(numbers) if numbers else NUM
+
+
+def _average(*args):
+    numbers = _collect_numbers(args)
+    if isinstance(numbers, FormulaError):
+        return numbers
+    return sum(numbers) / len(numbers) if numbers else DIV0
+
+
+# Periodic IRR as a fraction. The guess is accepted for compatibility but unused: the
+# bracketed solver finds the root wherever the flows change sign.
+def _irr(values, guess=None):
+    numbers = _collect_numbers([values if isinstance(values, Range) else Range([values])])
+    if isinstance(numbers, FormulaError):
+        return numbers
+    if not (any(n > 0 for n in numbers) and any(n < 0 for n in numbers)):
+        return NUM
+    rate = float(solve_rate(numbers, np.arange(len(numbers)))[0])
+    return rate if np.isfinite(rate) else NUM
+
+
+CRITERION = re.compile(r"\s*(<=|>=|<>|<|>|=)?(.*)")
+COMPARISONS = {
+    "<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "=": operator.eq, "<>": operator.ne,
+}
+
+
+# SUMIF over numeric cells with a numeric criterion such as ">0" or 5
+def _sumif(values, criterion):
+    if isinstance(criterion, Range):
+        criterion = criterion[0] if len(criterion) == 1 else VALUE
+    if isinstance(criterion, FormulaError):
+        return criterion
+    op, operand = CRITERION.fullmatch(to_text(criterion)).groups()
+    target = to_number(operand)
+    if isinstance(target, FormulaError):
+        return VALUE
+    compare = COMPARISONS[op or "="]
+    numbers = _collect_numbers([values if isinstance(values, Range) else Range([values])])
+    if isinstance(numbers, FormulaError):
+        return numbers
+    return float(sum(n for n in numbers if compare(n, target)))
+
+
+def _left(text, count=1.0):
+    text, count = to_text(text), to_number(count)
+    for value in (text, count):
+        if isinstance(value, FormulaError):
+            return value
+    return VALUE if count < 0 else text[:int(count)]
+
+
+def _len(text):
+    text = to_text(text)
+    return text if isinstance(text, FormulaError) else float(len(text))
+
+
+def _abs(value):
+    value = to_number(value)
+    return value if isinstance(value, FormulaError) else abs(value)
+
+
+# name -> (implementation, whether references are passed as whole ranges)
+FUNCTIONS = {
+    "ABS": (_abs, False),
+    "AVERAGE": (_average, True),
+    "IRR": (_irr, True),
+    "LEFT": (_left, False),
+    "LEN": (_len, False),
+    "MEDIAN": (_median, True),
+    "SUMIF": (_sumif, True),
+}
+
+
+def _arithmetic(op, a, b):
+    a, b = to_number(a), to_number(b)
+    for value in (a, b):
+        if isinstance(value, FormulaError):
+            return value
+    if op == "+":
+        return a + b
+    if op == "-":
+        return a - b
+    if op == "*":
+        return a * b
+    if op == "/":
+        return DIV0 if b == 0 else a / b
+    if a == 0 and b < 0:
+        return DIV0
+    try:
+        result = a ** b
+    except OverflowError:
+        return NUM
+    return NUM if isinstance(result, complex) else float(result)
+
+
+def _concatenate(a, b):
+    a, b = to_text(a), to_text(b)
+    for value in (a, b):
+        if isinstance(value, FormulaError):
+            return value
+    return a + b
+
+
+def _compile(node, as_range=False):
+    kind = node[0]
+    if kind == "const":
+        value = node[1]
+        return lambda ev: value
+    if kind == "ref":
+        _, sheet, row, column = node
+        if as_range:
+            return lambda ev: Range([ev.value(sheet, row, column)])
+        return lambda ev: ev.value(sheet, row, column)
+    if kind == "range":
+        _, sheet, r1, c1, r2, c2 = node
+        return lambda ev: ev.range(sheet, r1, c1, r2, c2)
+    if kind == "neg":
+        operand = _compile(node[1])
+        return lambda ev: _arithmetic("-", 0.0, operand(ev))
+    if kind == "pos":
+        return _compile(node[1], as_range)
+    if kind == "pct":
+        operand = _compile(node[1])
+        return lambda ev: _arithmetic("/", operand(ev), 100.0)
+    if kind == "bin":
+        _, op, left, right = node
+        left, right = _compile(left), _compile(right)
+        if op == "&":
+            return lambda ev: _concatenate(left(ev), right(ev))
+        return lambda ev: _arithmetic(op, left(ev), right(ev))
+
+    _, name, args = node
+    if name not in FUNCTIONS:
+        raise ValueError(f"Unsupported function {name}()")
+    func, takes_ranges = FUNCTIONS[name]
+    compiled = [_compile(arg, as_range=takes_ranges) for arg in args]
+
+    def call(ev):
+        values = [arg(ev) for arg in compiled]
+        # Scalar functions propagate an error argument before looking at the others
+        if not takes_ranges:
+            for value in values:
+                if isinstance(value, FormulaError):
+                    return value
+        try:
+            return func(*values)
+        except TypeError:
+            return VALUE
+    return call
+
+
+# Formula text (with or without "=") on a sheet -> function of an Evaluator returning the
+# cell value. Exports repeat the same few formulas, so compiled forms are shared.
+@lru_cache(maxsize=4096)
+def compile_formula(formula, sheet):
+    return _compile(_Parser(formula.removeprefix("="), sheet).parse())
+
+
+class Evaluator:
+    # Lazily evaluates formula cells of a WorkbookCells, each at most once
+
+    def __init__(self, workbook):
+        self.workbook = workbook
+        self._results = {}
+        self._pending = set()
+
+    def value(self, sheet, row, column):
+        key = (sheet, row, column)
+        if key in self._results:
+            return self._results[key]
+        formulas = self.workbook.formulas.get(sheet)
+        if formulas is None:
+            return REF
+        formula = formulas.get((row, column))
+        if formula is None:
+            return self.workbook.values[sheet].get((row, column))
+        if key in self._pending:
+            raise ValueError(f"Circular reference at '{sheet}'!{coordinate(row, column)}")
+        self._pending.add(key)
+        try:
+            result = compile_formula(formula, sheet)(self)
+        finally:
+            self._pending.discard(key)
+        self._results[key] = result
+        return result
+
+    def range(self, sheet, r1, c1, r2, c2):
+        if sheet not in self.workbook.values:
+            return REF
+        return Range(self.value(sheet, r, c) for r in range(r1, r2 + 1) for c in range(c1, c2 + 1))
+
+    def cell(self, sheet, reference):
+        return self.value(sheet, *parse_coordinate(reference))
+
+    # Every formula cell's value by (sheet, row, column), evaluated in reading order
+    def evaluate_all(self):
+        for sheet, formulas in self.workbook.formulas.items():
+            for row, column in sorted(formulas):
+                self.value(sheet, row, column)
+        return dict(self._results)
+
+
+def evaluate_workbook(source):
+    return Evaluator(read_workbook(source)).evaluate_all()
@@ -0,0 +1,217 @@
+import math
+from dataclasses import dataclass, replace
+
+import numpy as np
+
+from underwriting.batch import debt_at_exit, evaluate_batch
+from underwriting.debt import LEAGUE_DEBT_CAP
+from underwriting.surface import HOLDING_PERIOD_GRID, MAX_HOLDING_PERIOD
+
+
+TARGETS = ("irr", "moic")
+
+# Inputs a goal-seek can solve for, and the range (in each input's own units) a solution
+# must fall in to be feasible. Growth and ending debt are searched within it when the debt
+# terms rule out a closed form; holding periods are whole years.
+SEARCH_BOUNDS = {
+    "starting_enterprise_value": (0.0, np.inf),
+    "exit_multiple": (0.0, np.inf),
+    "revenue_growth": (-50.0, 100.0),
+    "holding_period_years": (1.0, float(MAX_HOLDING_PERIOD)),
+    "ending_debt": (0.0, LEAGUE_DEBT_CAP),
+}
+# Bisection stops once the bracket is this narrow, in the solved input's units
+TOLERANCE = 1e-9
+
+# evaluate_batch's per-deal inputs, and the defaults it gives the optional ones
+DEAL_INPUTS = (
+    "ownership_stake",
+    "starting_enterprise_value",
+    "starting_revenue",
+    "revenue_growth",
+    "exit_multiple",
+    "holding_period_years",
+    "starting_debt",
+    "ending_debt",
+    "include_debt",
+)
+DEAL_DEFAULTS = {"starting_debt": 0.0, "ending_debt": 0.0, "include_debt": True}
+
+
+@dataclass(frozen=True)
+class GoalSeekSolution:
+    solve_for: str
+    target: str  # "irr" (%) or "moic"
+    target_value: np.ndarray
+    value: np.ndarray  # solved input in its own units; NaN where no value reaches the target
+    irr: np.ndarray  # %, achieved at value
+    moic: np.ndarray
+    feasible: np.ndarray  # False where value is outside the bounds or the deal breaches the debt cap
+
+
+# Exit debt equals the ending debt, with no refinancing flows, whatever the revenue path
+def _ending_debt_at_exit(debt_terms):
+    return debt_terms is None or (debt_terms.profile == "amortizing" and not debt_terms.refinancings)
+
+
+# Every cash flow but the one being solved for is known, so the target pins it down: for an
+# IRR r, entry equity = PV(interim flows) + exit equity / (1 + r) ** years; for a MOIC m,
+# exit equity + interim returned = m * (entry equity + interim invested). Flows are taken
+# at a 100% stake, which scales every flow alike and so leaves IRR and MOIC unchanged.
+def _closed_form(solve_for, target, target_value, deal, debt_terms):
+    include_debt = deal["include_debt"]
+    years = np.trunc(deal["holding_period_years"])
+    entry_debt = np.where(include_debt, deal["starting_debt"], 0.0)
+    if solve_for in ("revenue_growth", "ending_debt"):
+        exit_debt, interim = deal["ending_debt"], np.zeros(years.shape + (1,))
+    else:
+        exit_debt, refinancing, _ = debt_at_exit(
+            deal["starting_revenue"], deal["revenue_growth"], years, deal["starting_debt"], deal["ending_debt"],
+            debt_terms,
+        )
+        if refinancing is None:
+            interim = np.zeros(years.shape + (1,))
+        else:
+            interim = np.where(include_debt[..., None], refinancing, 0.0)
+    exit_debt = np.where(include_debt, exit_debt, 0.0)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        if target == "irr":
+            rate = 1 + target_value / 100
+            compound = rate ** np.maximum(years, 1)
+            present_value = (interim * rate[..., None] ** -np.arange(interim.shape[-1])).sum(axis=-1)
+            exit_for = lambda entry: (entry - present_value) * compound
+            entry_for = lambda exit_equity: present_value + exit_equity / compound
+        else:
+            returned = np.clip(interim, 0.0, None).sum(axis=-1)
+            invested = np.clip(-interim, 0.0, None).sum(axis=-1)
+            exit_for = lambda entry: target_value * (entry + invested) - returned
+            entry_for = lambda exit_equity: (exit_equity + returned) / target_value - invested
+
+        exit_revenue = deal["starting_revenue"] * (1 + deal["revenue_growth"] / 100) ** years
+        if solve_for == "starting_enterprise_value":
+            return entry_for(exit_revenue * deal["exit_multiple"] - exit_debt) + entry_debt
+
+        exit_equity = exit_for(deal["starting_enterprise_value"] - entry_debt)
+        if solve_for == "exit_multiple":
+            return (exit_equity + exit_debt) / exit_revenue
+        if solve_for == "ending_debt":
+            # Without debt netted out, ending debt does not move the returns
+            return np.where(include_debt, exit_revenue * deal["exit_multiple"] - exit_equity, np.nan)
+        ratio = (exit_equity + exit_debt) / (deal["starting_revenue"] * deal["exit_multiple"])
+        return np.where((ratio > 0) & (years > 0), (ratio ** (1 / years) - 1) * 100, np.nan)
+
+
+# Vectorized bisection over the bounds for inputs that also move the debt schedule (cash
+# sweeps, refinancings). The debt cap is lifted while searching and checked on the result.
+def _bisect(solve_for, target, target_value, deal, debt_terms, lower, upper):
+    if not (np.isfinite(lower) and np.isfinite(upper)):
+        raise ValueError(f"Bounds must be finite to search for {solve_for}")
+    uncapped = replace(debt_terms, cap=np.inf)
+
+    # Below zero where the target is missed; an IRR that does not exist misses any target
+    def shortfall(value):
+        metric = getattr(evaluate_batch(**{**deal, solve_for: value}, debt_terms=uncapped), target)
+        return np.where(np.isnan(metric), -np.inf, metric - target_value)
+
+    low = np.full(target_value.shape, float(lower))
+    high = np.full(target_value.shape, float(upper))
+    low_misses = shortfall(low) < 0
+    bracketed = low_misses != (shortfall(high) < 0)
+    for _ in range(max(math.ceil(math.log2((upper - lower) / TOLERANCE)), 0)):
+        middle = (low + high) / 2
+        same_side = (shortfall(middle) < 0) == low_misses
+        low = np.where(same_side, middle, low)
+        high = np.where(same_side, high, middle)
+    return np.where(bracketed, (low + high) / 2, np.nan)
+
+
+# Returns only change at whole projection years, so the shortest whole-year hold within
+# the bounds that reaches the target is read off one evaluation of every candidate hold
+def _shortest_hold(target, target_value, deal, debt_terms, lower, upper):
+    holds = HOLDING_PERIOD_GRID[(HOLDING_PERIOD_GRID >= lower) & (HOLDING_PERIOD_GRID <= upper)]
+    if not len(holds):
+        return np.full(target_value.shape, np.nan)
+    inputs = {name: values[..., None] for name, values in deal.items()}
+    result = evaluate_batch(**{**inputs, "holding_period_years": holds}, debt_terms=debt_terms)
+    with np.errstate(invalid="ignore"):
+        reached = getattr(result, target) >= target_value[..., None]
+    return np.where(reached.any(axis=-1), holds[reached.argmax(axis=-1)], np.nan)
+
+
+# The value of one input (solve_for) that makes each deal hit a target IRR (%) or MOIC,
+# e.g. the most that can be paid for a 20% IRR. Inputs are evaluate_batch's and broadcast
+# together with target_value, so whole grids (a max-price curve over exit multiples, say)
+# are solved in one call; the solve_for input itself is not needed.
+def goal_seek_batch(solve_for, target, target_value, debt_terms=None, bounds=None, **inputs):
+    if solve_for == "ownership_stake":
+        raise ValueError("The ownership stake scales every cash flow alike, so no stake changes IRR or MOIC.")
+    if solve_for not in SEARCH_BOUNDS:
+        raise ValueError(f"Cannot solve for {solve_for!r}; use one of {', '.join(SEARCH_BOUNDS)}.")
+    if target not in TARGETS:
+        raise ValueError(f"Unknown target {target!r}; use one of {', '.join(TARGETS)}.")
+    unknown = set(inputs) - set(DEAL_INPUTS)
+    if unknown:
+        raise TypeError(f"Unknown deal inputs: {', '.join(sorted(unknown))}")
+    inputs = {**DEAL_DEFAULTS, **inputs, solve_for: np.nan}
+    missing = [name for name in DEAL_INPUTS if name not in inputs]
+    if missing:
+        raise TypeError(f"Missing deal inputs: {', '.join(missing)}")
+
+    target_value, *values = np.broadcast_arrays(
+        np.asarray(target_value, dtype=float),
+        *(np.asarray(inputs[name], dtype=bool if name == "include_debt" else float) for name in DEAL_INPUTS),
+    )
+    deal = dict(zip(DEAL_INPUTS, values))
+    lower, upper = SEARCH_BOUNDS[solve_for] if bounds is None else bounds
+
+    if solve_for == "holding_period_years":
+        value = _shortest_hold(target, target_value, deal, debt_terms, lower, upper)
+    elif solve_for in ("starting_enterprise_value", "exit_multiple") or _ending_debt_at_exit(debt_terms):
+        value = _closed_form(solve_for, target, target_value, deal, debt_terms)
+    else:
+        value = _bisect(solve_for, target, target_value, deal, debt_terms, lower, upper)
+
+    # Returns at the solution, where there is one
+    solved = ~np.isnan(value)
+    result = evaluate_batch(**{**deal, solve_for: np.where(solved, value, 0.0)}, debt_terms=debt_terms)
+    irr = np.where(solved, result.irr, np.nan)
+    moic = np.where(solved, result.moic, np.nan)
+    with np.errstate(invalid="ignore"):
+        feasible = (value >= lower) & (value <= upper) & np.isfinite(irr if target == "irr" else moic)
+    return GoalSeekSolution(
+        solve_for=solve_for,
+        target=target,
+        target_value=target_value,
+        value=value,
+        irr=irr,
+        moic=moic,
+        feasible=feasible,
+    )
+
+
+def goal_seek(deal, solve_for, target, target_value, bounds=None):
+    solution = goal_seek_batch(
+        solve_for,
+        target,
+        target_value,
+        debt_terms=deal.debt_terms,
+        bounds=bounds,
+        **{name: getattr(deal, name) for name in DEAL_INPUTS},
+    )
+    return replace(
+        solution,
+        target_value=float(solution.target_value),
+        value=float(solution.value),
+        irr=float(solution.irr),
+        moic=float(solution.moic),
+        feasible=bool(solution.feasible),
+    )
+
+
+# The solved input at every value of another input of the deal in one vectorized pass,
+# e.g. the maximum entry price for a 20% IRR across the exit multiple grid
+def goal_seek_curve(deal, solve_for, target, target_value, vary, values, bounds=None):
+    inputs = {name: getattr(deal, name) for name in DEAL_INPUTS}
+    inputs[vary] = np.asarray(values, dtype=float)
+    return goal_seek_batch(solve_for, target, target_value, debt_terms=deal.debt_terms, bounds=bounds, **inputs)
@@ -0,0 +1,188 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# Bracket searched for a rate of return (as a fraction): -99.99% to +10,000%
+RATE_LOWER = -0.9999
+RATE_UPPER = 100.0
+
+# Rates at which solve_irr samples NPV to find every root of streams whose cash flows
+# change sign more than once: 1% apart from -50% to +100%, where roots of real deals sit
+# close together, and evenly spaced in log(1 + r) across the rest of the bracket
+ROOT_SCAN_GRID = np.unique(np.concatenate([
+    np.expm1(np.linspace(np.log1p(RATE_LOWER), np.log1p(RATE_UPPER), 64)),
+    np.linspace(-0.5, 1.0, 151),
+]))
+
+# converged:      the only root in the bracket
+# no_root:        NPV never crosses zero in the bracket (e.g. no inflow, or no outflow)
+# multiple_roots: NPV crosses zero more than once; the root nearest 0% is reported
+# not_converged:  max_iter ran out; the last iterate is reported
+IRR_STATUSES = ("converged", "no_root", "multiple_roots", "not_converged")
+CONVERGED, NO_ROOT, MULTIPLE_ROOTS, NOT_CONVERGED = range(len(IRR_STATUSES))
+
+
+@dataclass(frozen=True)
+class IRRSolution:
+    rate: np.ndarray  # fraction per unit of time; NaN where there is no root
+    status: np.ndarray  # index into IRR_STATUSES
+    roots: np.ndarray  # NPV zero crossings found in the bracket
+    sign_changes: np.ndarray  # of the cash flows in time order; at most this many roots
+
+    @property
+    def converged(self):
+        return (self.status == CONVERGED) | (self.status == MULTIPLE_ROOTS)
+
+    @property
+    def status_names(self):
+        return np.asarray(IRR_STATUSES)[self.status]
+
+
+# Net present value of each row of cash flows at times (in periods) for each row's rate
+def npv_at(rate, cash_flows, times):
+    discount = (1 + rate[..., None]) ** -times
+    return (cash_flows * discount).sum(axis=-1)
+
+
+def npv_derivative_at(rate, cash_flows, times):
+    discount = (1 + rate[..., None]) ** (-times - 1)
+    return (-times * cash_flows * discount).sum(axis=-1)
+
+
+# Starting point from collapsing the flows into one outflow and one inflow at their
+# value-weighted times; exact for entry/exit-only deals, so those converge immediately
+def initial_guess(cash_flows, times):
+    inflows = np.where(cash_flows > 0, cash_flows, 0.0)
+    outflows = np.where(cash_flows < 0, -cash_flows, 0.0)
+    inflow, outflow = inflows.sum(axis=-1), outflows.sum(axis=-1)
+    inflow_time = (inflows * times).sum(axis=-1) / inflow
+    outflow_time = (outflows * times).sum(axis=-1) / outflow
+    span = inflow_time - outflow_time
+    guess = np.where(span > 0, inflow / outflow, outflow / inflow) ** (1 / np.abs(span)) - 1
+    return np.where(np.isfinite(guess), guess, 0.1)
+
+
+# Newton steps kept inside each row's [lo, hi] bracket, which shrinks every iteration,
+# falling back to bisection when a step leaves it. Only rows still converging are
+# evaluated on each iteration. Updates rate in place and returns which rows converged.
+def _refine(rate, lo, hi, f_lo, cash_flows, times, rows, tol, max_iter):
+    converged_rows = np.zeros(rate.shape, dtype=bool)
+    active = rows
+    for _ in range(max_iter):
+        if active.size == 0:
+            break
+        flows, at = cash_flows[active], times[active]
+        r, a, b, f_a = rate[active], lo[active], hi[active], f_lo[active]
+        f = npv_at(r, flows, at)
+        df = npv_derivative_at(r, flows, at)
+
+        # Shrink the bracket around the root
+        same_as_lo = np.sign(f) == np.sign(f_a)
+        a = np.where(same_as_lo, r, a)
+        f_a = np.where(same_as_lo, f, f_a)
+        b = np.where(same_as_lo, b, r)
+
+        newton = r - f / df
+        inside = np.isfinite(newton) & (newton >= a) & (newton <= b)
+        new_rate = np.where(inside, newton, (a + b) / 2)
+        new_rate = np.where(f == 0, r, new_rate)
+
+        scale = tol * (1 + np.abs(r))
+        converged = (np.abs(new_rate - r) <= scale) | (b - a <= scale) | (f == 0)
+        rate[active], lo[active], hi[active], f_lo[active] = new_rate, a, b, f_a
+        converged_rows[active[converged]] = True
+        active = active[~converged]
+    return converged_rows
+
+
+# Rate solving sum(cash_flows * (1 + r) ** -times) = 0 for every row at once, searched
+# over the whole bracket, so every row with a sign change between its ends converges.
+# Rows without one are NaN. See solve_irr for streams that may have several roots.
+def solve_rate(cash_flows, times, tol=1e-12, max_iter=100):
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    times = np.broadcast_to(np.asarray(times, dtype=float), cash_flows.shape)
+
+    lo = np.full(cash_flows.shape[0], RATE_LOWER)
+    hi = np.full(cash_flows.shape[0], RATE_UPPER)
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        f_lo = npv_at(lo, cash_flows, times)
+        f_hi = npv_at(hi, cash_flows, times)
+        bracketed = np.sign(f_lo) * np.sign(f_hi) < 0
+
+        rate = np.where(bracketed, np.clip(initial_guess(cash_flows, times), lo, hi), np.nan)
+        _refine(rate, lo, hi, f_lo, cash_flows, times, np.flatnonzero(bracketed), tol, max_iter)
+    return rate
+
+
+# Sign changes of each row's cash flows in time order, skipping zero flows. By Descartes'
+# rule of signs a stream has at most that many rates of return; with one it has exactly one.
+def sign_changes(cash_flows, times):
+    order = np.argsort(times, axis=-1, kind="stable")
+    signs = np.sign(np.take_along_axis(cash_flows, order, axis=-1))
+    # Carry the last nonzero sign forward over zero flows
+    last = np.maximum.accumulate(np.where(signs != 0, np.arange(signs.shape[-1]), 0), axis=-1)
+    signs = np.take_along_axis(signs, last, axis=-1)
+    return ((signs[..., 1:] * signs[..., :-1]) < 0).sum(axis=-1)
+
+
+# IRR of every row of a (streams x periods) array of cash flows with capital calls, fees
+# and distributions at any times (in periods, or years for XIRR), with a status per row.
+# Streams whose flows change sign once have a single root and are bracketed by the whole
+# search range, as in solve_rate. Streams that change sign more than once are scanned on
+# a grid of rates to count the roots, and the root nearest 0% (numpy-financial's choice)
+# is refined within its grid interval.
+def solve_irr(cash_flows, times=None, tol=1e-12, max_iter=100, grid=ROOT_SCAN_GRID):
+    cash_flows = np.atleast_2d(np.asarray(cash_flows, dtype=float))
+    if times is None:
+        times = np.arange(cash_flows.shape[-1])
+    times = np.asarray(times, dtype=float)
+    shared_times = times.ndim == 1
+    times = np.broadcast_to(times, cash_flows.shape)
+    rows = cash_flows.shape[0]
+    changes = sign_changes(cash_flows, times)
+
+    lo = np.full(rows, RATE_LOWER)
+    hi = np.full(rows, RATE_UPPER)
+    roots = np.zeros(rows, dtype=np.int64)
+    with np.errstate(over="ignore", invalid="ignore", divide="ignore"):
+        single = np.flatnonzero(changes == 1)
+        f_ends = np.sign(npv_at(lo[single], cash_flows[single], times[single])) * np.sign(
+            npv_at(hi[single], cash_flows[single], times[single])
+        )
+        roots[single] = f_ends < 0
+
+        several = np.flatnonzero(changes > 1)
+        if several.size:
+            flows, at = cash_flows[several], times[several]
+            if shared_times:
+                # One matrix product against the discount factors of every grid rate
+                npv = flows @ ((1 + grid[:, None]) ** -times[0]).T
+            else:
+                npv = np.stack([npv_at(np.full(several.size, g), flows, at) for g in grid], axis=-1)
+            # Roots lie between grid rates where NPV changes sign; a zero counts as positive,
+            # so a root on a grid rate brackets with the interval above or below it
+            crossing = (npv[:, 1:] >= 0) != (npv[:, :-1] >= 0)
+            roots[several] = np.count_nonzero(crossing, axis=-1)
+
+            # The interval nearest 0% is the first root interval ending above 0% or the
+            # last one below it
+            split = np.searchsorted(grid, 0, side="right") - 1
+            above, below = crossing[:, split:], crossing[:, :split][:, ::-1]
+            k_above = split + np.argmax(above, axis=-1)
+            k_below = split - 1 - np.argmax(below, axis=-1)
+            use_above = above.any(axis=-1) & (
+                ~below.any(axis=-1) | (np.maximum(grid[k_above], 0) <= -grid[np.maximum(k_below, 0) + 1])
+            )
+            nearest = np.where(use_above, k_above, k_below)
+            lo[several], hi[several] = grid[nearest], grid[nearest + 1]
+
+        f_lo = npv_at(lo, cash_flows, times)
+        bracketed = roots > 0
+        rate = np.where(bracketed, np.clip(initial_guess(cash_flows, times), lo, hi), np.nan)
+        converged = _refine(rate, lo, hi, f_lo, cash_flows, times, np.flatnonzero(bracketed), tol, max_iter)
+
+    status = np.select(
+        [~bracketed, ~converged, roots > 1], [NO_ROOT, NOT_CONVERGED, MULTIPLE_ROOTS], CONVERGED
+    )
+    return IRRSolution(rate=rate, status=status, roots=roots, sign_changes=changes)
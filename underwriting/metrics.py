@@ -0,0 +1,334 @@
+import bisect
+import os
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+from contextvars import ContextVar
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+# NBA_MODEL_METRICS=1 records timings, =memory also traces Python allocations per rerun
+ENV_VAR = "NBA_MODEL_METRICS"
+# Latency bucket upper bounds in seconds: 0.1ms to ~100s, four per decade
+BUCKETS = tuple(10 ** (e / 4) for e in range(-16, 9))
+MAX_SESSIONS = 256
+
+
+class LatencyHistogram:
+    # Fixed-bucket histogram of span durations; quantiles are bucket upper bounds
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return min(BUCKETS[i], self.max) if i < len(BUCKETS) else self.max
+        return self.max
+
+    @property
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+
+class Metrics:
+    # Latency histograms by span name plus the peak traced memory of any rerun
+
+    def __init__(self):
+        self.spans = {}
+        self.peak_memory = 0
+        self._lock = threading.Lock()
+
+    def observe(self, name, seconds):
+        with self._lock:
+            histogram = self.spans.get(name)
+            if histogram is None:
+                histogram = self.spans[name] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    def observe_memory(self, peak_bytes):
+        with self._lock:
+            self.peak_memory = max(self.peak_memory, peak_bytes)
+
+    # One row per span: name, count, mean, p50, p95, max (seconds)
+    def summary(self):
+        with self._lock:
+            return [
+                (name, h.count, h.mean, h.quantile(0.5), h.quantile(0.95), h.max)
+                for name, h in sorted(self.spans.items())
+            ]
+
+
+AGGREGATE = Metrics()
+SESSIONS = OrderedDict()
+_sessions_lock = threading.Lock()
+_current_session = ContextVar("metrics_session", default=None)
+_enabled = False
+_trace_memory = False
+
+
+def enable(memory=False):
+    global _enabled, _trace_memory
+    _enabled = True
+    _trace_memory = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable():
+    global _enabled, _trace_memory
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _trace_memory = False
+
+
+def enabled():
+    return _enabled
+
+
+def session_metrics(session_id):
+    with _sessions_lock:
+        metrics = SESSIONS.get(session_id)
+        if metrics is None:
+            metrics = SESSIONS[session_id] = Metrics()
+            while len(SESSIONS) > MAX_SESSIONS:
+                SESSIONS.popitem(last=False)
+        else:
+            SESSIONS.move_to_end(session_id)
+        return metrics
+
+
+class _Span:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NO_SPAN = _NoSpan()
+
+
+def record(name, seconds):
+    AGGREGATE.observe(name, seconds)
+    session = _current_session.get()
+    if session is not None:
+        session.observe(name, seconds)
+
+
+# Times the enclosed block under name; a shared no-op when instrumentation is off
+def span(name):
+    return _Span(name) if _enabled else _NO_SPAN
+
+
+def timed(name):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class Rerun:
+    # Span over one script run of a session; stages timed while it is open are also
+    # recorded against that session
+
+    def __init__(self, session_id, name, nested=False):
+        self.name = name
+        self.metrics = session_metrics(session_id)
+        # Only a fragment rendered by a live full run nests; anything else still set here
+        # was left by an earlier run cut short by st.stop(), st.rerun() or an exception
+        if not nested:
+            _current_session.set(None)
+        # A fragment running inside a full rerun leaves the memory peak to the outer run
+        self.outermost = _current_session.get() is None
+        self._token = _current_session.set(self.metrics)
+        if _trace_memory and self.outermost:
+            tracemalloc.reset_peak()
+        self.start = time.perf_counter()
+
+    def __enter__(self):
+        return self
+
+    # A run cut short by st.stop(), st.rerun() or an exception is closed but not recorded
+    def __exit__(self, exc_type, *exc):
+        if exc_type is None:
+            self.finish()
+        else:
+            self.discard()
+
+    def finish(self):
+        if self._token is None:
+            return
+        record(self.name, time.perf_counter() - self.start)
+        if _trace_memory and self.outermost:
+            peak = tracemalloc.get_traced_memory()[1]
+            self.metrics.observe_memory(peak)
+            AGGREGATE.observe_memory(peak)
+        self.discard()
+
+    def discard(self):
+        if self._token is None:
+            return
+        _current_session.reset(self._token)
+        self._token = None
+
+
+class _NoRerun:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def finish(self):
+        pass
+
+    def discard(self):
+        pass
+
+
+_NO_RERUN = _NoRerun()
+
+
+# Use as a context manager around a script or fragment run, or call .finish() at its
+# bottom. A run that never finishes is dropped by the next run that is not nested.
+def start_rerun(session_id, name="rerun", nested=False):
+    return Rerun(session_id, name, nested) if _enabled else _NO_RERUN
+
+
+# Process peak resident set size in bytes (Linux reports kilobytes); 0 where unavailable
+def max_rss():
+    if resource is None:
+        return 0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _histogram_lines(metric, labels, histogram):
+    lines = []
+    cumulative = 0
+    for bound, count in zip(BUCKETS, histogram.counts):
+        cumulative += count
+        lines.append(f'{metric}_bucket{{{labels},le="{bound:.6g}"}} {cumulative}')
+    lines.append(f'{metric}_bucket{{{labels},le="+Inf"}} {histogram.count}')
+    lines.append(f"{metric}_sum{{{labels}}} {histogram.total:.6f}")
+    lines.append(f"{metric}_count{{{labels}}} {histogram.count}")
+    return lines
+
+
+# Prometheus text exposition of the aggregate (and optionally per-session) histograms
+def metrics_text(include_sessions=False):
+    lines = [
+        "# HELP nba_model_span_seconds Duration of instrumented dashboard stages.",
+        "# TYPE nba_model_span_seconds histogram",
+    ]
+    sources = [("", AGGREGATE)]
+    if include_sessions:
+        with _sessions_lock:
+            sources += [(f'session="{sid}",', m) for sid, m in SESSIONS.items()]
+    peaks = []
+    for session_label, metrics in sources:
+        with metrics._lock:
+            for name, histogram in sorted(metrics.spans.items()):
+                lines += _histogram_lines("nba_model_span_seconds", f'{session_label}span="{name}"', histogram)
+            peaks.append((session_label.rstrip(","), metrics.peak_memory))
+
+    lines += [
+        "# HELP nba_model_rerun_peak_traced_bytes Peak traced Python memory of any rerun.",
+        "# TYPE nba_model_rerun_peak_traced_bytes gauge",
+    ]
+    lines += [f"nba_model_rerun_peak_traced_bytes{{{label}}} {peak}" for label, peak in peaks]
+    lines += [
+        "# HELP nba_model_max_rss_bytes Peak resident set size of the server process.",
+        "# TYPE nba_model_max_rss_bytes gauge",
+        f"nba_model_max_rss_bytes {max_rss()}",
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path, include_sessions=False):
+    with open(path, "w") as f:
+        f.write(metrics_text(include_sessions))
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") != "/metrics":
+            self.send_error(404)
+            return
+        body = metrics_text().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_server = None
+
+
+# Serve /metrics on localhost from a daemon thread; repeated calls reuse the first server
+def serve_metrics(port, host="127.0.0.1"):
+    global _server
+    if _server is None:
+        _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        threading.Thread(target=_server.serve_forever, daemon=True).start()
+    return _server
+
+
+# Instrumentation is opt-in from the environment so the default build pays nothing
+def configure_from_env(environ=os.environ):
+    mode = environ.get(ENV_VAR, "").strip().lower()
+    if mode in ("", "0", "false", "off"):
+        return
+    enable(memory=mode == "memory")
+    port = environ.get(f"{ENV_VAR}_PORT")
+    if port:
+        serve_metrics(int(port))
+
+
+configure_from_env()
@@ -0,0 +1,280 @@
+from dataclasses import dataclass
+from typing import Optional
+
+import numpy as np
+
+from underwriting.batch import closed_form_irr, deal_cash_flows, returns_with_interim_flows
+from underwriting.comps import LEAGUE_AVERAGE_MULTIPLE
+from underwriting.engine import DealInputs
+from underwriting.result_cache import RESULT_CACHE, result_key
+from underwriting.waterfall import FundTerms, distribution_waterfall, entry_exit_waterfall
+
+
+# Hardcoded closest comps multiples shown on the dashboards
+COMPS_MULTIPLES = (10.4, 13.1)
+
+# IRR histogram used for streaming percentiles: -100% to 300% in 0.01% bins
+IRR_HISTOGRAM_MIN = -100.0
+IRR_HISTOGRAM_MAX = 300.0
+IRR_HISTOGRAM_BIN = 0.01
+
+DEFAULT_MEMORY_BUDGET = 64 * 1024 ** 2  # bytes of working arrays per chunk
+# Paths the dashboards simulate by default: AppV2 reruns the simulation with every exit
+# multiple change, so the default has to stay a few tens of milliseconds
+DEFAULT_SIMULATED_PATHS = 25000
+
+
+@dataclass(frozen=True)
+class Distribution:
+    kind: str  # "constant", "normal", "uniform", "triangular" or "discrete"
+    params: tuple
+
+    def sample(self, rng, size):
+        if self.kind == "constant":
+            return np.full(size, float(self.params[0]))
+        if self.kind == "normal":
+            mean, std = self.params
+            return mean + std * rng.standard_normal(size)
+        if self.kind == "uniform":
+            return rng.uniform(*self.params, size=size)
+        if self.kind == "triangular":
+            return rng.triangular(*self.params, size=size)
+        if self.kind == "discrete":
+            values, probabilities = self.params
+            return rng.choice(np.asarray(values, dtype=float), size=size, p=probabilities)
+        raise ValueError(f"Unknown distribution: {self.kind}")
+
+    @property
+    def upper_bound(self):
+        if self.kind in ("constant", "uniform", "triangular"):
+            return float(self.params[-1])
+        if self.kind == "discrete":
+            return float(max(self.params[0]))
+        return np.inf
+
+
+def constant(value):
+    return Distribution("constant", (value,))
+
+
+def normal(mean, std):
+    return Distribution("normal", (mean, std))
+
+
+def uniform(low, high):
+    return Distribution("uniform", (low, high))
+
+
+def triangular(low, mode, high):
+    return Distribution("triangular", (low, mode, high))
+
+
+def discrete(values, probabilities=None):
+    if probabilities is None:
+        probabilities = [1 / len(values)] * len(values)
+    return Distribution("discrete", (tuple(values), tuple(probabilities)))
+
+
+@dataclass(frozen=True)
+class MonteCarloConfig:
+    base: DealInputs
+    revenue_growth: Distribution  # annual growth (%), drawn per path and per year
+    exit_multiple: Distribution
+    holding_period: Distribution  # whole years to exit
+    # When given, returns are summarized net to the fund's LPs after fees and carry
+    fund_terms: Optional[FundTerms] = None
+
+
+# Growth around the base case, exit multiples spanning the comps with the league
+# average as the mode, and exit one year either side of the planned hold
+def default_config(
+    base,
+    growth_volatility=3.0,
+    league_average=LEAGUE_AVERAGE_MULTIPLE,
+    comps=COMPS_MULTIPLES,
+    fund_terms=None,
+):
+    years = max(base.projection_years, 1)
+    low, high = min(*comps, league_average), max(*comps, league_average)
+    return MonteCarloConfig(
+        base=base,
+        revenue_growth=normal(base.revenue_growth, growth_volatility),
+        exit_multiple=triangular(low, league_average, high),
+        holding_period=discrete([max(years - 1, 1), years, years + 1], [0.25, 0.5, 0.25]),
+        fund_terms=fund_terms,
+    )
+
+
+# Returns are summarized over the paths whose debt stays within the league cap, as the
+# engine treats a deal that breaches it as infeasible
+@dataclass(frozen=True)
+class MonteCarloSummary:
+    paths: int
+    irr_p5: float
+    irr_p50: float
+    irr_p95: float
+    mean_irr: float  # excludes paths with no return of capital
+    mean_moic: float
+    prob_moic_below_1: float
+    prob_total_loss: float  # exit equity <= 0
+    prob_over_debt_cap: float = 0.0  # share of all paths whose debt breaches the cap
+
+
+class StreamingReturnStats:
+    # Fixed-size IRR histogram plus running sums, so memory does not grow with paths
+
+    def __init__(self):
+        bins = int(round((IRR_HISTOGRAM_MAX - IRR_HISTOGRAM_MIN) / IRR_HISTOGRAM_BIN))
+        self.counts = np.zeros(bins, dtype=np.int64)
+        self.paths = 0
+        self.feasible_paths = 0
+        self.over_debt_cap = 0
+        self.irr_sum = 0.0
+        self.irr_paths = 0
+        self.moic_sum = 0.0
+        self.moic_below_1 = 0
+        self.total_losses = 0
+
+    def update(self, irr, moic, exit_equity, within_debt_cap=True):
+        feasible = np.broadcast_to(within_debt_cap, np.shape(irr))
+        self.paths += len(irr)
+        self.over_debt_cap += int((~feasible).sum())
+        irr, moic, exit_equity = irr[feasible], moic[feasible], np.broadcast_to(exit_equity, np.shape(feasible))[feasible]
+
+        lost = np.isnan(irr)
+        # Paths that never return capital count as a -100% IRR in the percentiles
+        bins = np.floor((np.where(lost, IRR_HISTOGRAM_MIN, irr) - IRR_HISTOGRAM_MIN) / IRR_HISTOGRAM_BIN)
+        bins = np.clip(bins, 0, len(self.counts) - 1).astype(np.int64)
+        self.counts += np.bincount(bins, minlength=len(self.counts))
+
+        self.feasible_paths += len(irr)
+        self.irr_sum += float(irr[~lost].sum())
+        self.irr_paths += int((~lost).sum())
+        self.moic_sum += float(moic.sum())
+        self.moic_below_1 += int((moic < 1).sum())
+        self.total_losses += int((exit_equity <= 0).sum())
+
+    def percentile(self, q):
+        cumulative = np.cumsum(self.counts)
+        if not self.feasible_paths:
+            return np.nan
+        index = int(np.searchsorted(cumulative, q / 100 * self.feasible_paths))
+        index = min(index, len(self.counts) - 1)
+        # Interpolate within the bin
+        below = cumulative[index - 1] if index > 0 else 0
+        fraction = (q / 100 * self.feasible_paths - below) / max(self.counts[index], 1)
+        return float(IRR_HISTOGRAM_MIN + (index + fraction) * IRR_HISTOGRAM_BIN)
+
+    def summary(self):
+        return MonteCarloSummary(
+            paths=self.paths,
+            irr_p5=self.percentile(5),
+            irr_p50=self.percentile(50),
+            irr_p95=self.percentile(95),
+            mean_irr=self.irr_sum / self.irr_paths if self.irr_paths else np.nan,
+            mean_moic=self.moic_sum / self.feasible_paths if self.feasible_paths else np.nan,
+            prob_moic_below_1=self.moic_below_1 / self.feasible_paths if self.feasible_paths else np.nan,
+            prob_total_loss=self.total_losses / self.feasible_paths if self.feasible_paths else np.nan,
+            prob_over_debt_cap=self.over_debt_cap / self.paths if self.paths else np.nan,
+        )
+
+
+def max_holding_period(config):
+    upper = config.holding_period.upper_bound
+    if not np.isfinite(upper):
+        raise ValueError("Holding period distribution must be bounded")
+    return max(int(upper), 1)
+
+
+# Paths per chunk so the (paths x years) growth matrix and per-path vectors fit the budget;
+# a debt schedule adds a revenue path and four (paths x years) schedule arrays, and a fund
+# waterfall over refinancing flows about eight more
+def chunk_size_for_budget(memory_budget, max_years, debt_schedule=False, interim_waterfall=False):
+    bytes_per_path = 8 * (2 * max_years + 12)
+    if debt_schedule:
+        bytes_per_path += 8 * 6 * (max_years + 1)
+    if interim_waterfall:
+        bytes_per_path += 8 * 8 * (max_years + 1)
+    return max(int(memory_budget // bytes_per_path), 1)
+
+
+# IRR (%), MOIC, exit equity and debt cap check of size sampled paths
+def simulate_chunk(config, rng, size, max_years):
+    base = config.base
+    holding_period = np.clip(np.rint(config.holding_period.sample(rng, size)), 1, max_years).astype(np.int64)
+    exit_multiple = config.exit_multiple.sample(rng, size)
+
+    growth = config.revenue_growth.sample(rng, (size, max_years))
+    revenue_index = np.cumprod(1 + growth / 100, axis=1)
+    exit_revenue = base.starting_revenue * np.take_along_axis(revenue_index, holding_period[:, None] - 1, axis=1)[:, 0]
+
+    stake = base.ownership_stake / 100
+    exit_enterprise_value = exit_revenue * exit_multiple
+    # The league debt cap applies as in engine.underwrite: only when debt is netted out
+    within_debt_cap = True
+    if not base.include_debt:
+        entry_cash_flow = stake * base.starting_enterprise_value
+        exit_cash_flow = stake * exit_enterprise_value
+    elif base.debt_terms.straight_line:
+        entry_cash_flow = stake * base.starting_equity
+        exit_cash_flow = stake * (exit_enterprise_value - base.ending_debt)
+        within_debt_cap = max(base.starting_debt, base.ending_debt) <= base.debt_terms.cap
+    else:
+        # Each path's debt follows its own revenue path (cash sweeps, capitalized interest)
+        revenue = base.starting_revenue * np.concatenate([np.ones((size, 1)), revenue_index], axis=1)
+        schedule = base.debt_terms.schedule(base.starting_debt, base.ending_debt, revenue, holding_period)
+        entry_cash_flow = stake * base.starting_equity
+        exit_cash_flow = stake * (exit_enterprise_value - schedule.exit_balance)
+        within_debt_cap = schedule.within_cap
+        if schedule.refinancing.any():
+            entry_cash_flow = np.full(size, entry_cash_flow)
+            interim = stake * schedule.refinancing
+            if config.fund_terms is not None:
+                flows = deal_cash_flows(entry_cash_flow, exit_cash_flow, interim, holding_period)
+                net = distribution_waterfall(flows, config.fund_terms).net
+                return net.irr, net.moic, exit_cash_flow, within_debt_cap
+            irr, moic = returns_with_interim_flows(entry_cash_flow, exit_cash_flow, interim, holding_period)
+            return irr, moic, exit_cash_flow, within_debt_cap
+
+    if config.fund_terms is not None:
+        net = entry_exit_waterfall(entry_cash_flow, exit_cash_flow, holding_period, config.fund_terms)
+        return net.irr, net.moic, exit_cash_flow, within_debt_cap
+    irr = closed_form_irr(entry_cash_flow, exit_cash_flow, holding_period)
+    moic = exit_cash_flow / abs(entry_cash_flow)
+    return irr, moic, exit_cash_flow, within_debt_cap
+
+
+# Yields a running MonteCarloSummary after every chunk of paths. Seeded runs are
+# reproducible, so their final summary is stored and a repeat run yields it at once.
+def simulate_stream(config, paths, seed=None, memory_budget=DEFAULT_MEMORY_BUDGET, chunk_size=None):
+    rng = np.random.default_rng(seed)
+    max_years = max_holding_period(config)
+    if chunk_size is None:
+        debt_schedule = config.base.include_debt and not config.base.debt_terms.straight_line
+        interim_waterfall = debt_schedule and config.fund_terms is not None and bool(config.base.debt_terms.refinancings)
+        chunk_size = chunk_size_for_budget(memory_budget, max_years, debt_schedule, interim_waterfall)
+
+    # Chunking decides the order paths are drawn in, so it is part of the key
+    key = result_key("monte_carlo", config, paths, seed, chunk_size) if seed is not None else None
+    summary = RESULT_CACHE.get(key) if key is not None else None
+    if summary is not None:
+        yield summary
+        return
+
+    stats = StreamingReturnStats()
+    remaining = paths
+    while remaining > 0:
+        size = min(chunk_size, remaining)
+        stats.update(*simulate_chunk(config, rng, size, max_years))
+        remaining -= size
+        summary = stats.summary()
+        yield summary
+    if key is not None and summary is not None:
+        RESULT_CACHE.put(key, summary)
+
+
+def run_monte_carlo(config, paths, seed=None, memory_budget=DEFAULT_MEMORY_BUDGET, chunk_size=None):
+    summary = None
+    for summary in simulate_stream(config, paths, seed, memory_budget, chunk_size):
+        pass
+    return summary
@@ -0,0 +1,216 @@
+import argparse
+import json
+import math
+import os
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import MISSING, dataclass, fields
+from functools import partial
+from pathlib import Path
+from typing import Tuple
+
+from underwriting.debt import DebtTerms
+from underwriting.engine import DealInputs, underwrite
+from underwriting.formulas import NUM, Evaluator, FormulaError, coordinate, read_workbook
+from underwriting.quarterly import project_quarterly
+
+
+# App exports record their layout and exact engine inputs as custom document properties
+# named with this prefix (see excel_export.record_deal)
+DEAL_PROPERTY_PREFIX = "nba_model."
+SUMMARY_SHEET = "Investment Summary"
+RTOL = 1e-6
+ATOL = 1e-9
+
+
+@dataclass(frozen=True)
+class Mismatch:
+    sheet: str
+    cell: str
+    label: str
+    workbook_value: object  # float, text, FormulaError or None for a blank cell
+    engine_value: float  # NaN for formulas that evaluate to an error with no engine counterpart
+
+
+@dataclass(frozen=True)
+class ParityCheck:
+    source: str
+    layout: str = ""
+    cells_checked: int = 0
+    formulas_evaluated: int = 0
+    mismatches: Tuple[Mismatch, ...] = ()
+    error: str = ""  # set when the workbook could not be read or checked at all
+
+    @property
+    def passed(self):
+        return not self.mismatches and not self.error
+
+
+# (layout, DealInputs, remaining recorded properties) of an app export
+def deal_from_properties(properties):
+    recorded = {
+        name.removeprefix(DEAL_PROPERTY_PREFIX): value
+        for name, value in properties.items()
+        if name.startswith(DEAL_PROPERTY_PREFIX)
+    }
+    missing = [f.name for f in fields(DealInputs) if f.name not in recorded and f.default is MISSING]
+    if "layout" not in recorded or missing:
+        raise ValueError("Workbook does not record the deal inputs it was exported from")
+    inputs = {f.name: recorded.pop(f.name) for f in fields(DealInputs) if f.name in recorded}
+    if "debt_terms" in inputs:
+        inputs["debt_terms"] = DebtTerms.from_dict(json.loads(inputs["debt_terms"]))
+    inputs = DealInputs(**inputs)
+    return recorded.pop("layout"), inputs, recorded
+
+
+def _row(label, row, values, first_column=3):
+    return [(label, SUMMARY_SHEET, row, first_column + i, float(v)) for i, v in enumerate(values)]
+
+
+# Cells of an App.py export as (label, sheet, row, column, engine value). Rows follow its
+# summary layout after delete_rows: multiples in C10:C11, IRR in C12, MOIC in C13.
+def app_expectations(inputs, context):
+    deal = underwrite(inputs)
+    if context.get("view") == "Quarters":
+        quarterly = project_quarterly(inputs, context["entry_quarter"], context["exit_quarter"])
+        cells = _row("Revenue", 3, quarterly.revenue) + _row("Cash Flow", 4, quarterly.cash_flows)
+    else:
+        exit_column = 3 + len(deal.projected_revenue) - 1
+        cells = _row("Revenue", 3, deal.projected_revenue) + _row("Cash Flow", 4, deal.cash_flows)
+        cells.append(("Exit Enterprise Value", SUMMARY_SHEET, 5, exit_column, deal.exit_enterprise_value))
+    return cells + [
+        ("Entry Enterprise Value", SUMMARY_SHEET, 5, 3, inputs.starting_enterprise_value),
+        ("IRR", SUMMARY_SHEET, 12, 3, deal.irr / 100),
+        ("MOIC", SUMMARY_SHEET, 13, 3, deal.moic),
+    ]
+
+
+# Cells of an AppV2.py export; its summary table is fixed at C10:C19
+def app_v2_expectations(inputs, context):
+    deal = underwrite(inputs)
+    exit_column = 3 + len(deal.projected_revenue) - 1
+    return (
+        _row("Revenue", 3, deal.projected_revenue)
+        + _row("Debt Level", 4, deal.debt_levels)
+        + _row("Cash Flow", 5, deal.cash_flows)
+        + [
+            ("Entry Enterprise Value", SUMMARY_SHEET, 6, 3, inputs.starting_enterprise_value),
+            ("Exit Enterprise Value", SUMMARY_SHEET, 6, exit_column, deal.exit_enterprise_value),
+            ("IRR", SUMMARY_SHEET, 11, 3, deal.irr / 100),
+            ("MOIC", SUMMARY_SHEET, 12, 3, deal.moic),
+            ("Entry Equity", SUMMARY_SHEET, 13, 3, deal.entry_cash_flow),
+            ("Exit Equity", SUMMARY_SHEET, 14, 3, deal.exit_cash_flow),
+        ]
+    )
+
+
+LAYOUTS = {
+    "app": app_expectations,
+    "app_v2": app_v2_expectations,
+}
+
+
+def _matches(actual, expected, rtol, atol):
+    if math.isnan(expected):
+        return actual == NUM  # no IRR: Excel reports #NUM!
+    return isinstance(actual, float) and math.isclose(actual, expected, rel_tol=rtol, abs_tol=atol)
+
+
+# Recompute every formula of an exported workbook (path or bytes) and compare the cells
+# the dashboard shows against the engine run on the inputs the export recorded. Formula
+# cells evaluating to an error are reported as well.
+def check_workbook(source, rtol=RTOL, atol=ATOL):
+    name = str(source) if isinstance(source, (str, os.PathLike)) else "<workbook>"
+    try:
+        workbook = read_workbook(source)
+        layout, inputs, context = deal_from_properties(workbook.properties)
+        if layout not in LAYOUTS:
+            raise ValueError(f"Unknown export layout {layout!r}")
+        expected = LAYOUTS[layout](inputs, context)
+
+        evaluator = Evaluator(workbook)
+        results = evaluator.evaluate_all()
+        mismatches, checked = [], set()
+        for label, sheet, row, column, value in expected:
+            actual = evaluator.value(sheet, row, column)
+            checked.add((sheet, row, column))
+            if not _matches(actual, value, rtol, atol):
+                mismatches.append(Mismatch(sheet, coordinate(row, column), label, actual, value))
+        for (sheet, row, column), actual in results.items():
+            if isinstance(actual, FormulaError) and (sheet, row, column) not in checked:
+                mismatches.append(Mismatch(sheet, coordinate(row, column), "Formula error", actual, math.nan))
+    except (ValueError, KeyError, zipfile.BadZipFile) as e:
+        return ParityCheck(name, error=str(e))
+    return ParityCheck(name, layout, len(expected), len(results), tuple(mismatches))
+
+
+def check_workbooks(sources, workers=None, rtol=RTOL, atol=ATOL):
+    sources = list(sources)
+    workers = workers or os.cpu_count() or 1
+    check = partial(check_workbook, rtol=rtol, atol=atol)
+    if workers == 1 or len(sources) < 2 * workers:
+        return [check(source) for source in sources]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(check, sources, chunksize=max(1, len(sources) // (workers * 4))))
+
+
+# .xlsx files given directly or found anywhere under given directories
+def find_workbooks(paths):
+    for path in map(Path, paths):
+        if path.is_dir():
+            yield from sorted(p for p in path.rglob("*.xlsx") if not p.name.startswith("~$"))
+        else:
+            yield path
+
+
+def mismatch_table(checks):
+    import pandas as pd
+
+    return pd.DataFrame([
+        {
+            "workbook": check.source,
+            "sheet": m.sheet,
+            "cell": m.cell,
+            "label": m.label,
+            "workbook_value": str(m.workbook_value),
+            "engine_value": m.engine_value,
+        }
+        for check in checks
+        for m in check.mismatches
+    ] + [
+        {"workbook": check.source, "label": "Unreadable", "workbook_value": check.error}
+        for check in checks
+        if check.error
+    ])
+
+
+def main(argv=None):
+    from underwriting.runner import write_table
+
+    parser = argparse.ArgumentParser(description="Recompute exported workbooks and compare them with the engine.")
+    parser.add_argument("paths", nargs="+", help="Workbooks or directories of workbooks")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--rtol", type=float, default=RTOL, help="Relative tolerance per cell")
+    parser.add_argument("--atol", type=float, default=ATOL, help="Absolute tolerance per cell")
+    parser.add_argument("-o", "--output", help="Write every mismatch to this .csv or .parquet")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    checks = check_workbooks(find_workbooks(args.paths), args.workers, args.rtol, args.atol)
+    elapsed = time.perf_counter() - start
+
+    failed = [check for check in checks if not check.passed]
+    for check in failed:
+        print(f"FAIL {check.source}" + (f": {check.error}" if check.error else ""))
+        for m in check.mismatches:
+            print(f"  '{m.sheet}'!{m.cell} {m.label}: workbook {m.workbook_value}, engine {m.engine_value:.6g}")
+    if args.output:
+        write_table(mismatch_table(checks), args.output)
+    print(f"Checked {len(checks):,} workbooks in {elapsed:.1f}s: {len(checks) - len(failed):,} match, {len(failed):,} differ")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,224 @@
+from dataclasses import dataclass
+from datetime import date
+from typing import List
+
+import numpy as np
+
+from underwriting.batch import BatchResult
+from underwriting.irr import solve_rate
+
+
+QUARTER_END_MONTH_DAY = {1: (3, 31), 2: (6, 30), 3: (9, 30), 4: (12, 31)}
+DAYS_PER_YEAR = 365  # Excel XIRR convention
+
+
+# Integer period index for a quarter label: "2Q25" -> 2025 * 4 + 1
+def quarter_index(quarter):
+    try:
+        quarter_num = int(quarter[0])
+        year = int("20" + quarter[2:])
+    except (ValueError, IndexError, TypeError):
+        raise ValueError("Invalid quarter format. Use the format '1Q25'.")
+    if quarter_num not in [1, 2, 3, 4]:
+        raise ValueError("Quarter must be between 1 and 4.")
+    return year * 4 + quarter_num - 1
+
+
+def quarter_label(index):
+    return f"{index % 4 + 1}Q{(index // 4) % 100:02d}"
+
+
+def quarter_end_date(index):
+    month, day = QUARTER_END_MONTH_DAY[index % 4 + 1]
+    return date(index // 4, month, day)
+
+
+# Quarter-end dates for an array of period indices, as datetime64[D]
+def quarter_end_dates(indices):
+    indices = np.asarray(indices, dtype=np.int64)
+    # First day of the following quarter, minus one day
+    next_quarter = indices + 1
+    months = (next_quarter // 4 - 1970) * 12 + (next_quarter % 4) * 3
+    return months.astype("datetime64[M]").astype("datetime64[D]") - np.timedelta64(1, "D")
+
+
+# XIRR (%) for each row of cash flows on the given dates (365-day years from the first date)
+def xirr(cash_flows, dates):
+    dates = np.asarray(dates, dtype="datetime64[D]")
+    days = (dates - dates[..., :1]).astype(float)
+    return solve_rate(cash_flows, days / DAYS_PER_YEAR) * 100
+
+
+# Annual revenue run rate after each number of quarters, compounding at the annual growth rate
+def revenue_run_rate(starting_revenue, revenue_growth, quarters):
+    return starting_revenue * (1 + revenue_growth / 100) ** (np.asarray(quarters) / 4)
+
+
+@dataclass(frozen=True)
+class QuarterlyProjection:
+    labels: List[str]
+    dates: np.ndarray  # quarter-end dates
+    revenue: np.ndarray  # revenue earned in each quarter
+    debt_levels: np.ndarray
+    cash_flows: np.ndarray
+    entry_cash_flow: float
+    exit_cash_flow: float
+    irr: float  # XIRR on quarter-end dates (%)
+    moic: float
+
+
+# Quarterly revenue compounding at the annual growth rate, debt scheduled on the deal's
+# debt terms and entry/exit cash flows from the entry quarter to the exit quarter
+def project_quarterly(inputs, entry_quarter, exit_quarter):
+    entry, exit_ = quarter_index(entry_quarter), quarter_index(exit_quarter)
+    if exit_ < entry:
+        raise ValueError("Exit quarter must not be before the entry quarter.")
+    quarters = np.arange(exit_ - entry + 1)
+    periods = max(exit_ - entry, 1)
+
+    annual_run_rate = revenue_run_rate(inputs.starting_revenue, inputs.revenue_growth, quarters)
+    terms = inputs.debt_terms
+    if terms.straight_line:
+        debt_levels = inputs.starting_debt - inputs.debt_paid * quarters / periods
+        refinancing = np.zeros(len(quarters))
+    else:
+        schedule = terms.schedule(
+            inputs.starting_debt, inputs.ending_debt, annual_run_rate, len(quarters) - 1, periods_per_year=4
+        )
+        debt_levels = schedule.balances
+        refinancing = schedule.refinancing if inputs.include_debt else np.zeros(len(quarters))
+
+    batch = evaluate_quarterly_batch(
+        ownership_stake=inputs.ownership_stake,
+        starting_enterprise_value=inputs.starting_enterprise_value,
+        starting_revenue=inputs.starting_revenue,
+        revenue_growth=inputs.revenue_growth,
+        exit_multiple=inputs.exit_multiple,
+        entry_index=entry,
+        exit_index=exit_,
+        starting_debt=inputs.starting_debt,
+        ending_debt=inputs.ending_debt,
+        include_debt=inputs.include_debt,
+        debt_terms=terms,
+    )
+    entry_cash_flow = float(batch.entry_cash_flow)
+    exit_cash_flow = float(batch.exit_cash_flow)
+    cash_flows = inputs.ownership_stake / 100 * refinancing
+    cash_flows[0] = -entry_cash_flow
+    cash_flows[-1] += exit_cash_flow
+
+    return QuarterlyProjection(
+        labels=[quarter_label(i) for i in range(entry, exit_ + 1)],
+        dates=quarter_end_dates(entry + quarters),
+        revenue=annual_run_rate / 4,
+        debt_levels=debt_levels,
+        cash_flows=cash_flows,
+        entry_cash_flow=entry_cash_flow,
+        exit_cash_flow=exit_cash_flow,
+        irr=float(batch.irr),
+        moic=float(batch.moic),
+    )
+
+
+# Quarter-precise returns for many deals: exit revenue compounds over the exact number of
+# quarters held and IRR is solved on the entry and exit quarter-end dates
+def evaluate_quarterly_batch(
+    ownership_stake,
+    starting_enterprise_value,
+    starting_revenue,
+    revenue_growth,
+    exit_multiple,
+    entry_index,
+    exit_index,
+    starting_debt=0.0,
+    ending_debt=0.0,
+    include_debt=True,
+    debt_terms=None,
+):
+    (
+        ownership_stake,
+        starting_enterprise_value,
+        starting_revenue,
+        revenue_growth,
+        exit_multiple,
+        starting_debt,
+        ending_debt,
+        entry_index,
+        exit_index,
+        include_debt,
+    ) = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (
+            ownership_stake,
+            starting_enterprise_value,
+            starting_revenue,
+            revenue_growth,
+            exit_multiple,
+            starting_debt,
+            ending_debt,
+        )),
+        np.asarray(entry_index, dtype=np.int64),
+        np.asarray(exit_index, dtype=np.int64),
+        np.asarray(include_debt, dtype=bool),
+    )
+
+    stake = ownership_stake / 100
+    quarters = exit_index - entry_index
+    exit_revenue = starting_revenue * (1 + revenue_growth / 100) ** (quarters / 4)
+    exit_enterprise_value = exit_revenue * exit_multiple
+    # Debt terms other than straight-line are scheduled quarter by quarter on the revenue
+    # run rate; a cap breach makes the deal infeasible
+    refinancing = None
+    within_debt_cap = None
+    exit_debt = ending_debt
+    if debt_terms is not None and debt_terms.straight_line:
+        within_debt_cap = np.maximum(starting_debt, ending_debt) <= debt_terms.cap
+    elif debt_terms is not None:
+        steps = np.arange(int(quarters.max(initial=0)) + 1)
+        run_rate = starting_revenue[..., None] * (1 + revenue_growth[..., None] / 100) ** (steps / 4)
+        schedule = debt_terms.schedule(starting_debt, ending_debt, run_rate, quarters, periods_per_year=4)
+        exit_debt = schedule.exit_balance
+        within_debt_cap = schedule.within_cap
+        if schedule.refinancing.any():
+            refinancing = schedule.refinancing
+
+    entry_equity = np.where(include_debt, starting_enterprise_value - starting_debt, starting_enterprise_value)
+    exit_equity = np.where(include_debt, exit_enterprise_value - exit_debt, exit_enterprise_value)
+    entry_cash_flow = stake * entry_equity
+    exit_cash_flow = stake * exit_equity
+
+    shape = entry_cash_flow.shape
+    if refinancing is None:
+        cash_flows = np.stack([-entry_cash_flow.ravel(), exit_cash_flow.ravel()], axis=-1)
+        dates = np.stack([quarter_end_dates(entry_index.ravel()), quarter_end_dates(exit_index.ravel())], axis=-1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moic = exit_cash_flow / np.abs(entry_cash_flow)
+    else:
+        # Every quarter from entry carries the stake's refinancing flows; the exit lands on
+        # each deal's own exit quarter
+        cash_flows = np.where(include_debt[..., None], stake[..., None] * refinancing, 0.0)
+        cash_flows[..., 0] -= entry_cash_flow
+        exit_at = quarters[..., None]
+        np.put_along_axis(
+            cash_flows, exit_at, np.take_along_axis(cash_flows, exit_at, axis=-1) + exit_cash_flow[..., None], axis=-1
+        )
+        with np.errstate(divide="ignore", invalid="ignore"):
+            moic = np.where(cash_flows > 0, cash_flows, 0.0).sum(axis=-1) / -np.where(cash_flows < 0, cash_flows, 0.0).sum(axis=-1)
+        dates = quarter_end_dates(entry_index[..., None] + np.arange(cash_flows.shape[-1]))
+        cash_flows = cash_flows.reshape(-1, cash_flows.shape[-1])
+        dates = dates.reshape(-1, dates.shape[-1])
+    irr = np.where(quarters.ravel() > 0, xirr(cash_flows, dates), np.nan).reshape(shape)
+
+    if within_debt_cap is not None:
+        within_debt_cap = within_debt_cap | ~include_debt
+        irr = np.where(within_debt_cap, irr, np.nan)
+        moic = np.where(within_debt_cap, moic, np.nan)
+
+    return BatchResult(
+        entry_cash_flow=entry_cash_flow,
+        exit_enterprise_value=exit_enterprise_value,
+        exit_equity=exit_equity,
+        exit_cash_flow=exit_cash_flow,
+        irr=irr,
+        moic=moic,
+        within_debt_cap=within_debt_cap,
+    )
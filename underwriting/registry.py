@@ -0,0 +1,161 @@
+import csv
+import os
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date
+from functools import cached_property, lru_cache
+
+from underwriting.comps import CompsIndex
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+@dataclass(frozen=True)
+class Team:
+    name: str
+    short_name: str
+    conference: str
+    market_size: str
+    color: str
+    starting_revenue: float  # $M
+    starting_debt: float  # $M
+    ending_debt: float  # $M
+    starting_enterprise_value: float  # $M
+
+
+@dataclass(frozen=True)
+class Transaction:
+    date: date
+    team: str
+    short_name: str
+    conference: str
+    market_size: str
+    color: str
+    transaction_value: float  # $M
+    ev_revenue: float  # EV/Revenue multiple paid
+    revenue_growth: float  # 5-year revenue growth (%)
+
+    # Date as shown on the Comparable Transactions sheet, e.g. "7/3/2024"
+    @property
+    def display_date(self):
+        return f"{self.date.month}/{self.date.day}/{self.date.year}"
+
+
+class Registry:
+    # In-memory teams and transactions, indexed once when the registry is built
+
+    def __init__(self, teams, transactions):
+        self.teams = list(teams)
+        # Most recent transaction first
+        self.transactions = sorted(transactions, key=lambda t: t.date, reverse=True)
+
+        self._teams_by_name = {t.name: t for t in self.teams}
+        self._teams_by_conference = defaultdict(list)
+        self._teams_by_market_size = defaultdict(list)
+        for t in self.teams:
+            self._teams_by_conference[t.conference].append(t)
+            self._teams_by_market_size[t.market_size].append(t)
+
+        self._transactions_by_team = defaultdict(list)
+        self._transactions_by_conference = defaultdict(list)
+        self._transactions_by_market_size = defaultdict(list)
+        for t in self.transactions:
+            self._transactions_by_team[t.team].append(t)
+            self._transactions_by_conference[t.conference].append(t)
+            self._transactions_by_market_size[t.market_size].append(t)
+
+        # Ascending dates for range queries
+        self._by_date = self.transactions[::-1]
+        self._dates = [t.date for t in self._by_date]
+
+    def team_names(self):
+        return [t.name for t in self.teams]
+
+    def team(self, name):
+        return self._teams_by_name[name]
+
+    def teams_in_conference(self, conference):
+        return list(self._teams_by_conference.get(conference, []))
+
+    def teams_by_market_size(self, market_size):
+        return list(self._teams_by_market_size.get(market_size, []))
+
+    def transactions_for_team(self, name):
+        return list(self._transactions_by_team.get(name, []))
+
+    def transactions_in_conference(self, conference):
+        return list(self._transactions_by_conference.get(conference, []))
+
+    def transactions_by_market_size(self, market_size):
+        return list(self._transactions_by_market_size.get(market_size, []))
+
+    # Transactions dated start..end inclusive, most recent first
+    def transactions_between(self, start=None, end=None):
+        lo = bisect_left(self._dates, start) if start is not None else 0
+        hi = bisect_right(self._dates, end) if end is not None else len(self._dates)
+        return self._by_date[lo:hi][::-1]
+
+    @cached_property
+    def comps_index(self):
+        return CompsIndex(self.transactions)
+
+    # Nearest comparable transactions for a team, most recent first. Revenue and EV
+    # default to the team's registry values; growth is only used when given.
+    def comparables_for(self, name, revenue=None, enterprise_value=None, revenue_growth=None, limit=3):
+        target = self.team(name)
+        comps, _ = self.comps_index.nearest(
+            revenue=revenue if revenue is not None else target.starting_revenue,
+            enterprise_value=enterprise_value if enterprise_value is not None else target.starting_enterprise_value,
+            market_size=target.market_size,
+            revenue_growth=revenue_growth,
+            k=limit,
+            exclude_team=name,
+        )
+        return sorted(comps, key=lambda t: t.date, reverse=True)
+
+
+def read_teams(path):
+    with open(path, newline="") as f:
+        return [
+            Team(
+                name=row["team"],
+                short_name=row["short_name"],
+                conference=row["conference"],
+                market_size=row["market_size"],
+                color=row["color"],
+                starting_revenue=float(row["starting_revenue"]),
+                starting_debt=float(row["starting_debt"]),
+                ending_debt=float(row["ending_debt"]),
+                starting_enterprise_value=float(row["starting_enterprise_value"]),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+def read_transactions(path):
+    with open(path, newline="") as f:
+        return [
+            Transaction(
+                date=date.fromisoformat(row["date"]),
+                team=row["team"],
+                short_name=row["short_name"],
+                conference=row["conference"],
+                market_size=row["market_size"],
+                color=row["color"],
+                transaction_value=float(row["transaction_value"]),
+                ev_revenue=float(row["ev_revenue"]),
+                revenue_growth=float(row["revenue_growth"]),
+            )
+            for row in csv.DictReader(f)
+        ]
+
+
+# Parsed once per process; every session and rerun shares the same registry
+@lru_cache(maxsize=None)
+def load_registry(data_dir=DATA_DIR):
+    return Registry(
+        read_teams(os.path.join(data_dir, "teams.csv")),
+        read_transactions(os.path.join(data_dir, "transactions.csv")),
+    )
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from dataclasses import fields, is_dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+
+
+ENV_VAR = "NBA_MODEL_RESULT_CACHE"
+DEFAULT_PATH = Path.home() / ".cache" / "nba_model" / "results.sqlite3"
+MAX_BYTES = 512 * 1024 ** 2
+# Eviction trims the store to this share of max_bytes, so it does not run on every write
+EVICT_TO = 0.9
+# Hits refresh a result's access time at most this often, to keep reads from writing
+TOUCH_SECONDS = 60.0
+BUSY_TIMEOUT_SECONDS = 30.0
+
+# Modules whose source decides engine results; editing any of them invalidates the store
+ENGINE_MODULES = ("batch", "debt", "engine", "irr", "montecarlo", "quarterly", "solve", "surface", "waterfall")
+
+
+# Hash of the given files' contents, e.g. an app script whose layout a workbook follows
+@lru_cache(maxsize=None)
+def source_version(*paths):
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(Path(path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+ENGINE_VERSION = source_version(*(Path(__file__).with_name(f"{name}.py") for name in ENGINE_MODULES))
+
+
+# Equal inputs give equal keys however they were spelled: numbers as floats (10 == 10.0),
+# sequences as tuples, dataclasses and arrays by content
+def canonical(value):
+    if is_dataclass(value) and not isinstance(value, type):
+        return (type(value).__name__,) + tuple((f.name, canonical(getattr(value, f.name))) for f in fields(value))
+    if isinstance(value, (bool, str, bytes)) or value is None:
+        return value
+    if isinstance(value, (int, float, np.number)):
+        return float(value)
+    if isinstance(value, np.ndarray):
+        return ("ndarray", value.dtype.str, value.shape, hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest())
+    if isinstance(value, dict):
+        return ("dict",) + tuple(sorted((str(k), canonical(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical(v) for v in value)
+    raise TypeError(f"Cannot build a result key from {type(value).__name__}")
+
+
+# Content address of a result: what was computed (kind), from what, by which engine
+def result_key(kind, *parts):
+    return hashlib.sha256(repr((ENGINE_VERSION, kind, canonical(parts))).encode()).hexdigest()
+
+
+class ResultCache:
+    # Pickled results in one SQLite file, shared by every session, thread and Streamlit
+    # server process on the machine and kept across restarts. WAL mode lets readers run
+    # alongside the single writer; writers wait for each other up to the busy timeout.
+    # When the total size passes max_bytes the least recently used results are evicted.
+    # A store that cannot be opened, read or written, or a result that cannot be pickled,
+    # only costs recomputation. Reading unpickles whatever is in the file, so only point it
+    # at a file that no one untrusted can write.
+
+    def __init__(self, path=DEFAULT_PATH, max_bytes=MAX_BYTES):
+        self.path = Path(path) if path is not None else None
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._local = threading.local()
+
+    # Opt-in: NBA_MODEL_RESULT_CACHE unset (or "off") keeps results in memory only, "on"
+    # uses DEFAULT_PATH and anything else is the SQLite file to use
+    @classmethod
+    def from_env(cls, environ=os.environ):
+        value = environ.get(ENV_VAR, "").strip()
+        if value.lower() in ("", "0", "false", "off"):
+            return cls(path=None)
+        if value.lower() in ("1", "true", "on"):
+            return cls(path=DEFAULT_PATH)
+        return cls(path=value)
+
+    @property
+    def enabled(self):
+        return self.path is not None
+
+    # One connection per thread and process; a forked process opens its own
+    def _connection(self):
+        local = self._local
+        if getattr(local, "pid", None) != os.getpid():
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL, accessed REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed)")
+            local.connection, local.pid = connection, os.getpid()
+        return local.connection
+
+    def __len__(self):
+        if not self.enabled:
+            return 0
+        return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+
+    @property
+    def total_bytes(self):
+        if not self.enabled:
+            return 0
+        return self._connection().execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        try:
+            connection = self._connection()
+            row = connection.execute("SELECT value, accessed FROM results WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value = pickle.loads(row[0])
+            now = time.time()
+            if now - row[1] > TOUCH_SECONDS:
+                connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+        except (sqlite3.Error, OSError, pickle.UnpicklingError, AttributeError, EOFError, ImportError, TypeError, ValueError):
+            # Unreadable entries (e.g. pickled by code that has since changed) count as misses
+            self.errors += 1
+            self.misses += 1
+            return None
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if not self.enabled:
+            return
+        try:
+            data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            # Results larger than the whole budget are returned but never stored
+            if len(data) > self.max_bytes:
+                return
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO results (key, value, size, accessed) VALUES (?, ?, ?, ?)",
+                    (key, data, len(data), time.time()),
+                )
+                self._evict(connection)
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, OSError, pickle.PicklingError, AttributeError, TypeError, RecursionError):
+            # Unpicklable results (e.g. holding a lock or a local function) are not stored
+            self.errors += 1
+
+    def _evict(self, connection):
+        total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM results").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        excess = total - self.max_bytes * EVICT_TO
+        evicted = []
+        for key, size in connection.execute("SELECT key, size FROM results ORDER BY accessed"):
+            if excess <= 0:
+                break
+            evicted.append((key,))
+            excess -= size
+        connection.executemany("DELETE FROM results WHERE key = ?", evicted)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        if not self.enabled:
+            return
+        try:
+            self._connection().execute("DELETE FROM results")
+        except (sqlite3.Error, OSError):
+            self.errors += 1
+
+
+# Shared by everything in the process; off unless NBA_MODEL_RESULT_CACHE turns it on
+RESULT_CACHE = ResultCache.from_env()
+
+
+# value of compute(), served from the store when the same kind of result was already
+# computed from the same parts by the same engine
+def cached_result(kind, compute, *parts):
+    return RESULT_CACHE.get_or_compute(result_key(kind, *parts), compute)
@@ -0,0 +1,112 @@
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from underwriting.batch import evaluate_batch
+
+
+DEAL_COLUMNS = [
+    "ownership_stake",
+    "starting_enterprise_value",
+    "starting_revenue",
+    "revenue_growth",
+    "exit_multiple",
+    "holding_period_years",
+    "starting_debt",
+    "ending_debt",
+    "include_debt",
+]
+RESULT_COLUMNS = ["entry_cash_flow", "exit_enterprise_value", "exit_equity", "exit_cash_flow", "irr", "moic"]
+DEFAULTS = {"starting_debt": 0.0, "ending_debt": 0.0, "include_debt": True}
+DEFAULT_CHUNK_SIZE = 50000
+# Parquet needs an engine pandas does not install (pyarrow); CSV needs nothing extra
+PARQUET_MISSING = "Reading or writing .parquet files needs pyarrow (pip install pyarrow); use .csv files otherwise."
+
+
+def read_table(path):
+    if str(path).endswith(".parquet"):
+        try:
+            return pd.read_parquet(path)
+        except ImportError as e:
+            raise ImportError(PARQUET_MISSING) from e
+    return pd.read_csv(path)
+
+
+def write_table(df, path):
+    if str(path).endswith(".parquet"):
+        try:
+            df.to_parquet(path, index=False)
+        except ImportError as e:
+            raise ImportError(PARQUET_MISSING) from e
+    else:
+        df.to_csv(path, index=False)
+
+
+# Every team x every scenario; scenario values override the team's where both are given
+def build_deals(teams, scenarios):
+    deals = teams.merge(scenarios, how="cross", suffixes=("_team", ""))
+    for column in DEAL_COLUMNS:
+        team_column = f"{column}_team"
+        if team_column in deals:
+            deals[column] = deals[column].fillna(deals.pop(team_column)) if column in deals else deals.pop(team_column)
+        if column not in deals:
+            deals[column] = DEFAULTS.get(column, np.nan)
+        elif column in DEFAULTS:
+            deals[column] = deals[column].fillna(DEFAULTS[column])
+    missing = [c for c in DEAL_COLUMNS if deals[c].isna().any()]
+    if missing:
+        raise ValueError(f"Missing deal inputs: {', '.join(missing)}")
+    deals["include_debt"] = deals["include_debt"].astype(bool)
+    return deals.reset_index(drop=True)
+
+
+def evaluate_chunk(chunk):
+    result = evaluate_batch(**chunk)
+    return {column: getattr(result, column) for column in RESULT_COLUMNS}
+
+
+# Contiguous chunks of deal arrays; results are concatenated back in the same order
+def iter_chunks(deals, chunk_size):
+    arrays = {column: deals[column].to_numpy() for column in DEAL_COLUMNS}
+    for start in range(0, len(deals), chunk_size):
+        yield {column: values[start:start + chunk_size] for column, values in arrays.items()}
+
+
+def run_scenarios(deals, workers=None, chunk_size=DEFAULT_CHUNK_SIZE):
+    workers = workers or os.cpu_count() or 1
+    chunks = iter_chunks(deals, chunk_size)
+    if workers == 1 or len(deals) <= chunk_size:
+        results = [evaluate_chunk(chunk) for chunk in chunks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(evaluate_chunk, chunks))
+
+    output = deals.copy()
+    for column in RESULT_COLUMNS:
+        output[column] = np.concatenate([r[column] for r in results]) if results else np.array([])
+    return output
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Underwrite every team across a book of deal scenarios.")
+    parser.add_argument("teams", help="CSV/Parquet of teams (team, starting_revenue, starting_debt, ...)")
+    parser.add_argument("scenarios", help="CSV/Parquet of scenarios (scenario, ownership_stake, revenue_growth, ...)")
+    parser.add_argument("-o", "--output", default="results.csv", help="Output file (.csv, or .parquet with pyarrow)")
+    parser.add_argument("-w", "--workers", type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Deals per worker task")
+    args = parser.parse_args(argv)
+
+    try:
+        deals = build_deals(read_table(args.teams), read_table(args.scenarios))
+        results = run_scenarios(deals, workers=args.workers, chunk_size=args.chunk_size)
+        write_table(results, args.output)
+    except ImportError as e:
+        parser.error(str(e))
+    print(f"Underwrote {len(results):,} deals -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,400 @@
+import argparse
+import asyncio
+import json
+import math
+from dataclasses import MISSING, fields
+from http import HTTPStatus
+
+import numpy as np
+
+from underwriting.batch import evaluate_batch, evaluate_deals
+from underwriting.debt import DebtTerms
+from underwriting.engine import DealInputs
+from underwriting.result_cache import ENGINE_VERSION
+from underwriting.solve import GROWTH_BOUNDS, solve_for_revenue_growth_batch
+
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# Requests arriving within this window of the first waiting one are evaluated together
+BATCH_WINDOW = 0.002
+MAX_BATCH = 4096
+MAX_BODY_BYTES = 8 * 1024 ** 2
+MAX_GRID_CELLS = 1_000_000
+
+DEAL_FIELDS = {f.name: f for f in fields(DealInputs)}
+# Deal inputs a grid may vary; include_debt and debt_terms stay those of the base deal
+GRID_FIELDS = tuple(name for name in DEAL_FIELDS if name not in ("include_debt", "debt_terms"))
+RESULT_FIELDS = ("entry_cash_flow", "exit_enterprise_value", "exit_equity", "exit_cash_flow", "irr", "moic")
+GROWTH_FIELDS = ("desired_moic", "starting_enterprise_value", "starting_revenue", "exit_multiple", "holding_period_years")
+
+# Accepted range of every numeric input, inclusive. Holding periods size the per-year
+# arrays of a whole batch, so they are kept to what a deal could plausibly run.
+MAX_HOLDING_YEARS = 50
+MAX_DOLLARS = 1e6  # $M
+FIELD_RANGES = {
+    "ownership_stake": (0.0, 100.0),
+    "starting_enterprise_value": (0.0, MAX_DOLLARS),
+    "starting_revenue": (0.0, MAX_DOLLARS),
+    "revenue_growth": (-100.0, 1000.0),
+    "exit_multiple": (0.0, 1000.0),
+    "holding_period_years": (0.0, MAX_HOLDING_YEARS),
+    "starting_debt": (0.0, MAX_DOLLARS),
+    "ending_debt": (0.0, MAX_DOLLARS),
+    "desired_moic": (0.0, 1000.0),
+}
+# Numeric debt_terms fields, and those of each refinancing (None where optional)
+DEBT_TERM_RANGES = {
+    "interest_rate": (-100.0, 1000.0),
+    "cash_margin": (-1000.0, 1000.0),
+    "sweep": (0.0, 100.0),
+    "cap": (0.0, MAX_DOLLARS),
+}
+REFINANCING_RANGES = {
+    "year": (0.0, MAX_HOLDING_YEARS),
+    "balance": (0.0, MAX_DOLLARS),
+    "interest_rate": (-100.0, 1000.0),
+}
+
+
+class RequestError(ValueError):
+    def __init__(self, message, status=HTTPStatus.BAD_REQUEST):
+        super().__init__(message)
+        self.status = status
+
+
+# A finite number within its range (FIELD_RANGES[name] by default); json.loads also
+# parses NaN and Infinity
+def _checked(value, name, bounds=None):
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise RequestError(f"{name} must be a finite number")
+    lower, upper = FIELD_RANGES[name] if bounds is None else bounds
+    if not lower <= value <= upper:
+        raise RequestError(f"{name} must be between {lower:g} and {upper:g}")
+    return float(value)
+
+
+def _number(body, name):
+    return _checked(body[name], name)
+
+
+def _debt_terms(value):
+    try:
+        terms = DebtTerms.from_dict(value)
+    except (TypeError, ValueError) as e:
+        raise RequestError(f"Invalid debt_terms: {e}")
+    for name, bounds in DEBT_TERM_RANGES.items():
+        _checked(getattr(terms, name), f"debt_terms.{name}", bounds)
+    for i, refinancing in enumerate(terms.refinancings):
+        for name, bounds in REFINANCING_RANGES.items():
+            if name == "year" or getattr(refinancing, name) is not None:
+                _checked(getattr(refinancing, name), f"debt_terms.refinancings[{i}].{name}", bounds)
+    return terms
+
+
+# Growth bounds (%) as [lower, upper]: two finite numbers, lower no greater than upper
+def _bounds(bounds):
+    if not (isinstance(bounds, (list, tuple)) and len(bounds) == 2):
+        raise RequestError("bounds must be [lower, upper] in %")
+    if any(isinstance(b, bool) or not isinstance(b, (int, float)) or not math.isfinite(b) for b in bounds):
+        raise RequestError("bounds must be two finite numbers, [lower, upper] in %")
+    lower, upper = float(bounds[0]), float(bounds[1])
+    if lower > upper:
+        raise RequestError("bounds must be [lower, upper] with lower <= upper")
+    return lower, upper
+
+
+# DealInputs from a JSON object with the same field names; debt_terms as DebtTerms.to_dict
+def deal_from_json(body):
+    if not isinstance(body, dict):
+        raise RequestError("A deal must be a JSON object")
+    unknown = sorted(set(body) - set(DEAL_FIELDS))
+    if unknown:
+        raise RequestError(f"Unknown deal inputs: {', '.join(unknown)}")
+    missing = [name for name, f in DEAL_FIELDS.items() if name not in body and f.default is MISSING]
+    if missing:
+        raise RequestError(f"Missing deal inputs: {', '.join(missing)}")
+    values = {}
+    for name in body:
+        if name == "include_debt":
+            if not isinstance(body[name], bool):
+                raise RequestError("include_debt must be true or false")
+            values[name] = body[name]
+        elif name == "debt_terms":
+            values[name] = _debt_terms(body[name])
+        else:
+            values[name] = _number(body, name)
+    return DealInputs(**values)
+
+
+def growth_request_from_json(body):
+    if not isinstance(body, dict):
+        raise RequestError("A required-growth request must be a JSON object")
+    missing = [name for name in GROWTH_FIELDS if name not in body]
+    if missing:
+        raise RequestError(f"Missing inputs: {', '.join(missing)}")
+    return tuple(_number(body, name) for name in GROWTH_FIELDS) + (_bounds(body.get("bounds", GROWTH_BOUNDS)),)
+
+
+# NaN and infinities (no IRR, breached debt cap) are not JSON; they are sent as null
+def json_value(value):
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    if isinstance(value, list):
+        return [json_value(v) for v in value]
+    return value
+
+
+def evaluate_deal_batch(deals):
+    result = evaluate_deals(deals)
+    columns = {name: getattr(result, name).tolist() for name in RESULT_FIELDS}
+    columns["within_debt_cap"] = result.within_debt_cap.tolist()
+    return [{name: json_value(values[i]) for name, values in columns.items()} for i in range(len(deals))]
+
+
+# One vectorized solve per distinct set of growth bounds
+def solve_growth_batch(requests):
+    results = [None] * len(requests)
+    groups = {}
+    for i, request in enumerate(requests):
+        groups.setdefault(request[-1], []).append(i)
+    for bounds, rows in groups.items():
+        columns = np.array([requests[i][:-1] for i in rows]).T
+        solution = solve_for_revenue_growth_batch(*columns, bounds=bounds)
+        for i, growth, unconstrained, feasible in zip(
+            rows, solution.revenue_growth.tolist(), solution.unconstrained_growth.tolist(), solution.feasible.tolist()
+        ):
+            results[i] = {
+                "revenue_growth": json_value(growth),
+                "unconstrained_growth": json_value(unconstrained),
+                "feasible": feasible,
+            }
+    return results
+
+
+# Every combination of the axis values around a base deal, in one evaluate_batch call
+def evaluate_grid(body):
+    if not isinstance(body, dict) or "deal" not in body or not isinstance(body.get("axes"), dict) or not body["axes"]:
+        raise RequestError('A grid request needs "deal" and "axes" ({input: [values, ...]})')
+    base = deal_from_json(body["deal"])
+    axes = body["axes"]
+    unknown = sorted(set(axes) - set(GRID_FIELDS))
+    if unknown:
+        raise RequestError(f"Inputs that cannot be varied: {', '.join(unknown)}")
+    values = {}
+    for name, axis in axes.items():
+        if not isinstance(axis, list) or not axis:
+            raise RequestError(f"Axis {name} must be a non-empty list of numbers")
+        values[name] = np.asarray([_checked(v, name) for v in axis], dtype=float)
+    if math.prod(len(v) for v in values.values()) > MAX_GRID_CELLS:
+        raise RequestError(f"Grids are limited to {MAX_GRID_CELLS:,} cells", HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+    # Axis k varies along dimension k of the result
+    inputs = {name: getattr(base, name) for name in GRID_FIELDS}
+    for k, (name, axis) in enumerate(values.items()):
+        shape = [1] * len(values)
+        shape[k] = -1
+        inputs[name] = axis.reshape(shape)
+    result = evaluate_batch(**inputs, include_debt=base.include_debt, debt_terms=base.debt_terms)
+    shape = tuple(len(v) for v in values.values())
+    return {
+        "axes": {name: axis.tolist() for name, axis in values.items()},
+        "irr": json_value(np.broadcast_to(result.irr, shape).tolist()),
+        "moic": json_value(np.broadcast_to(result.moic, shape).tolist()),
+    }
+
+
+class MicroBatcher:
+    # Collects items submitted by concurrent requests and evaluates them in one call. A
+    # lone item runs as soon as the event loop comes round; a second item arriving first
+    # opens a window, and the batch runs when the window closes or max_batch items are
+    # waiting. evaluate maps a list of items to a list of results.
+
+    def __init__(self, evaluate, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.evaluate = evaluate
+        self.window = window
+        self.max_batch = max_batch
+        self.batches = 0
+        self.items = 0
+        self._pending = []
+        self._timer = None
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif len(self._pending) == 1:
+            self._timer = loop.call_soon(self._flush)
+        elif len(self._pending) == 2:
+            self._timer.cancel()
+            self._timer = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _evaluate_one(self, item):
+        try:
+            return self.evaluate([item])[0]
+        except Exception as e:
+            return e
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        if not pending:
+            return
+        self.batches += 1
+        self.items += len(pending)
+        try:
+            results = self.evaluate([item for item, _ in pending])
+        except Exception as e:
+            # One bad item fails the whole call; retried alone, only its own request fails
+            results = [e] if len(pending) == 1 else [self._evaluate_one(item) for item, _ in pending]
+        for (_, future), result in zip(pending, results):
+            if future.done():
+                continue  # the client went away
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+class UnderwritingService:
+    # JSON endpoints (POST unless noted):
+    #   /v1/deal            one deal          -> returns, batched with concurrent requests
+    #   /v1/deals           {"deals": [...]}  -> {"results": [...]} in one call
+    #   /v1/grid            {"deal", "axes"}  -> IRR/MOIC over every combination of the axes
+    #   /v1/required-growth desired MOIC, EV, revenue, exit multiple, holding period
+    #                                         -> growth needed, batched like /v1/deal
+    #   GET /v1/health                        -> status, engine version and batching counts
+
+    def __init__(self, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+        self.deals = MicroBatcher(evaluate_deal_batch, window, max_batch)
+        self.growth = MicroBatcher(solve_growth_batch, window, max_batch)
+        self.routes = {
+            ("POST", "/v1/deal"): self.deal,
+            ("POST", "/v1/deals"): self.deal_list,
+            ("POST", "/v1/grid"): self.grid,
+            ("POST", "/v1/required-growth"): self.required_growth,
+            ("GET", "/v1/health"): self.health,
+        }
+
+    async def deal(self, body):
+        return await self.deals.submit(deal_from_json(body))
+
+    async def deal_list(self, body):
+        if not isinstance(body, dict) or not isinstance(body.get("deals"), list):
+            raise RequestError('Expected {"deals": [deal, ...]}')
+        deals = [deal_from_json(deal) for deal in body["deals"]]
+        return {"results": evaluate_deal_batch(deals) if deals else []}
+
+    async def grid(self, body):
+        return evaluate_grid(body)
+
+    async def required_growth(self, body):
+        return await self.growth.submit(growth_request_from_json(body))
+
+    async def health(self, body):
+        return {
+            "status": "ok",
+            "engine_version": ENGINE_VERSION,
+            "batches": {"deal": self.deals.batches, "required_growth": self.growth.batches},
+            "batched_requests": {"deal": self.deals.items, "required_growth": self.growth.items},
+        }
+
+    async def dispatch(self, method, path, body):
+        handler = self.routes.get((method, path))
+        if handler is None:
+            if any(route_path == path for _, route_path in self.routes):
+                return HTTPStatus.METHOD_NOT_ALLOWED, {"error": f"{method} is not supported on {path}"}
+            return HTTPStatus.NOT_FOUND, {"error": f"No endpoint {path}"}
+        try:
+            payload = json.loads(body) if body else None
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            return HTTPStatus.BAD_REQUEST, {"error": "Body is not valid JSON"}
+        try:
+            return HTTPStatus.OK, await handler(payload)
+        except RequestError as e:
+            return e.status, {"error": str(e)}
+        except ValueError as e:
+            return HTTPStatus.BAD_REQUEST, {"error": str(e)}
+        except Exception as e:
+            # Anything else is a bug; the client gets an answer and the connection stays up
+            return HTTPStatus.INTERNAL_SERVER_ERROR, {"error": f"{type(e).__name__}: {e}"}
+
+    # HTTP/1.1 with keep-alive, enough for local clients; one request at a time per connection
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    await self._respond(writer, HTTPStatus.BAD_REQUEST, {"error": "Malformed request line"}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY_BYTES:
+                    await self._respond(writer, HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"error": "Body too large"}, False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method, target.split("?", 1)[0], body)
+                await self._respond(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _respond(writer, status, payload, keep_alive):
+        body = json.dumps(payload, allow_nan=False).encode()
+        writer.write(
+            f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+            f"Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + body
+        )
+        await writer.drain()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+async def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, window=BATCH_WINDOW, max_batch=MAX_BATCH):
+    server = await UnderwritingService(window, max_batch).start(host, port)
+    address = server.sockets[0].getsockname()
+    print(f"Underwriting API on http://{address[0]}:{address[1]}/v1/ (batch window {window * 1000:g} ms)")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the underwriting engine as a local JSON API.")
+    parser.add_argument("--host", default=DEFAULT_HOST, help="Interface to listen on (default: localhost only)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--window-ms", type=float, default=BATCH_WINDOW * 1000,
+                        help="How long a request waits for others to batch with")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="Requests evaluated per batch at most")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.window_ms / 1000, args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
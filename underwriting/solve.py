@@ -0,0 +1,64 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+
+# Bounds (in %) the dashboard has always searched for a required growth rate
+GROWTH_BOUNDS = (0.0, 30.0)
+
+
+@dataclass(frozen=True)
+class GrowthSolution:
+    revenue_growth: np.ndarray  # %, clipped to the bounds
+    unconstrained_growth: np.ndarray  # %, NaN when no growth rate reaches the target
+    feasible: np.ndarray  # False where the target MOIC needs growth outside the bounds
+
+
+# Exit MOIC on EV is revenue * (1 + g) ** years * multiple / EV, so the growth
+# that hits a desired MOIC is (desired_moic * EV / (revenue * multiple)) ** (1 / years) - 1
+def solve_for_revenue_growth_batch(
+    desired_moic,
+    starting_enterprise_value,
+    starting_revenue,
+    exit_multiple,
+    holding_period_years,
+    bounds=GROWTH_BOUNDS,
+):
+    desired_moic, starting_enterprise_value, starting_revenue, exit_multiple, holding_period_years = np.broadcast_arrays(
+        *(np.asarray(a, dtype=float) for a in (
+            desired_moic, starting_enterprise_value, starting_revenue, exit_multiple, holding_period_years
+        ))
+    )
+    lower, upper = bounds
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ratio = desired_moic * starting_enterprise_value / (starting_revenue * exit_multiple)
+        valid = (holding_period_years > 0) & (ratio > 0) & np.isfinite(ratio)
+        unconstrained = np.where(valid, (ratio ** (1 / holding_period_years) - 1) * 100, np.nan)
+
+    feasible = valid & (unconstrained >= lower) & (unconstrained <= upper)
+    revenue_growth = np.where(valid, np.clip(unconstrained, lower, upper), lower)
+
+    return GrowthSolution(
+        revenue_growth=revenue_growth,
+        unconstrained_growth=unconstrained,
+        feasible=feasible,
+    )
+
+
+def solve_for_revenue_growth(
+    desired_moic,
+    starting_enterprise_value,
+    starting_revenue,
+    exit_multiple,
+    holding_period_years,
+    bounds=GROWTH_BOUNDS,
+):
+    solution = solve_for_revenue_growth_batch(
+        desired_moic, starting_enterprise_value, starting_revenue, exit_multiple, holding_period_years, bounds
+    )
+    return GrowthSolution(
+        revenue_growth=float(solution.revenue_growth),
+        unconstrained_growth=float(solution.unconstrained_growth),
+        feasible=bool(solution.feasible),
+    )
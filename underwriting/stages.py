@@ -0,0 +1,172 @@
+from dataclasses import replace
+from functools import lru_cache, wraps
+
+import pandas as pd
+import plotly.graph_objects as go
+
+from underwriting.charts import (
+    exit_multiple_scrubber,
+    growth_comparison_chart,
+    multiple_comparison_chart,
+    position_scrubber,
+)
+from underwriting import metrics
+from underwriting.engine import underwrite
+from underwriting.quarterly import project_quarterly
+from underwriting.registry import load_registry
+from underwriting.solve import solve_for_revenue_growth
+from underwriting.surface import sweep_exit_multiples
+from underwriting.tables import render_table
+
+
+# Dashboard stages and the inputs each one is keyed on:
+#   comparables        <- team, revenue, enterprise value, revenue growth
+#   multiple chart     <- entry / league average / comps / exit multiple, team color
+#   growth solution    <- desired MOIC, enterprise value, revenue, exit multiple, holding period
+#   growth chart       <- comparables, revenue growth, team color
+#   scrubber frames    <- DealInputs without the exit multiple, desired MOIC, chart labels
+#   scrubber figure    <- scrubber frames, exit multiple it opens on
+#   deal               <- DealInputs
+#   projections table  <- DealInputs, first year, row layout
+#   quarterly deal     <- DealInputs, entry / exit quarter
+#   quarters table     <- quarterly deal
+#   summary table      <- formatted metric rows
+# Each stage is memoized on exactly those arguments and shared by every session in the
+# server process, so a rerun only recomputes the stages downstream of the input that
+# changed. Cached results are shared: callers must not mutate them.
+STAGES = {}
+
+
+# Memoizes func and, when instrumentation is on, times every call (hit or miss) as a span
+def stage(maxsize=256):
+    def decorator(func):
+        cached = lru_cache(maxsize=maxsize)(func)
+        STAGES[func.__name__] = cached
+
+        @wraps(func)
+        def timed(*args, **kwargs):
+            if not metrics.enabled():
+                return cached(*args, **kwargs)
+            with metrics.span(func.__name__):
+                return cached(*args, **kwargs)
+        return timed
+    return decorator
+
+
+# Hits, misses and size of every stage cache
+def stage_info():
+    return {name: cached.cache_info() for name, cached in STAGES.items()}
+
+
+def clear_stages():
+    for cached in STAGES.values():
+        cached.cache_clear()
+
+
+@stage()
+def comparables_stage(team, revenue, enterprise_value, revenue_growth=None):
+    return tuple(load_registry().comparables_for(
+        team, revenue=revenue, enterprise_value=enterprise_value, revenue_growth=revenue_growth
+    ))
+
+
+@stage()
+def multiple_chart_stage(entry_multiple, average_multiple, comps_multiple, exit_multiple, color,
+                         comps_color="navy", label="TEV/Revenue"):
+    return multiple_comparison_chart(
+        entry_multiple, average_multiple, comps_multiple, exit_multiple, color, comps_color, label
+    )
+
+
+@stage()
+def growth_solution_stage(desired_moic, starting_enterprise_value, starting_revenue, exit_multiple,
+                          holding_period_years):
+    return solve_for_revenue_growth(
+        desired_moic, starting_enterprise_value, starting_revenue, exit_multiple, holding_period_years
+    )
+
+
+@stage()
+def growth_chart_stage(comparables, revenue_growth, color, label="Required",
+                       title="Implied Revenue Growth Rate vs Comparables"):
+    return growth_comparison_chart(comparables, revenue_growth, color, label, title)
+
+
+@stage()
+def scrubber_frames_stage(base, desired_moic, entry_multiple, average_multiple, comps_multiple, color,
+                          comps_color, label):
+    sweep = sweep_exit_multiples(base, desired_moic)
+    return exit_multiple_scrubber(sweep, entry_multiple, average_multiple, comps_multiple, color, comps_color, label)
+
+
+# Validated once here and cached: st.plotly_chart re-validates a plain dict on every
+# rerun, but only serializes a Figure
+@stage()
+def scrubber_figure_stage(base, desired_moic, entry_multiple, average_multiple, comps_multiple, color,
+                          comps_color, label, exit_multiple):
+    frames = scrubber_frames_stage(
+        base, desired_moic, entry_multiple, average_multiple, comps_multiple, color, comps_color, label
+    )
+    return go.Figure(position_scrubber(frames, exit_multiple))
+
+
+# Figure with every exit multiple precomputed as a client-side frame. The exit multiple
+# (and, with a desired MOIC, the growth solved from it) is dropped from the frames key,
+# so every slider position of the same deal shares one sweep.
+def scrubber_stage(inputs, entry_multiple, average_multiple, comps_multiple, color, desired_moic=None,
+                   comps_color="navy", label="TEV/Revenue"):
+    base = replace(inputs, exit_multiple=0.0)
+    if desired_moic is not None:
+        base = replace(base, revenue_growth=0.0)
+    return scrubber_figure_stage(
+        base, desired_moic, entry_multiple, average_multiple, comps_multiple, color, comps_color, label,
+        inputs.exit_multiple,
+    )
+
+
+@stage()
+def deal_stage(inputs):
+    return underwrite(inputs)
+
+
+# Annual projections as (DataFrame, HTML). rows pairs each row label with a DealResult
+# series, e.g. (("Revenue", "projected_revenue"), ("Cash Flow", "cash_flows")).
+@stage()
+def projections_stage(inputs, first_year, rows, corner="", first_column_class=""):
+    deal = deal_stage(inputs)
+    frame = pd.DataFrame({
+        corner: [label for label, _ in rows],
+        **{
+            str(first_year + i): [getattr(deal, series)[i] for _, series in rows]
+            for i in range(len(deal.projected_revenue))
+        }
+    })
+    return frame, render_table(frame, "projections", first_column_class=first_column_class)
+
+
+@stage()
+def quarterly_stage(inputs, entry_quarter, exit_quarter):
+    return project_quarterly(inputs, entry_quarter, exit_quarter)
+
+
+# Quarterly projection from the entry to the exit quarter as (QuarterlyProjection, HTML)
+@stage()
+def quarters_stage(inputs, entry_quarter, exit_quarter):
+    quarterly = quarterly_stage(inputs, entry_quarter, exit_quarter)
+    frame = pd.DataFrame(
+        [quarterly.revenue, quarterly.cash_flows],
+        columns=quarterly.labels,
+        index=["Revenue", "Cash Flow"]
+    ).reset_index()
+    frame.rename(columns={"index": ""}, inplace=True)
+    return quarterly, render_table(frame, "quarters")
+
+
+# Metric / value summary as (DataFrame, HTML); rows are (metric, formatted value) pairs
+@stage()
+def summary_stage(rows):
+    frame = pd.DataFrame({
+        "Metric": [metric for metric, _ in rows],
+        "Value": [value for _, value in rows],
+    })
+    return frame, render_table(frame, "summary", value_column_class="value")
@@ -0,0 +1,146 @@
+from dataclasses import dataclass, replace
+from functools import lru_cache
+
+import numpy as np
+
+from underwriting.batch import BatchResult, evaluate_batch
+from underwriting.engine import DealInputs
+from underwriting.result_cache import cached_result
+from underwriting.solve import GROWTH_BOUNDS, solve_for_revenue_growth_batch
+
+
+# Exit multiple slider in both apps: 5.0-20.0 in 0.1 steps (151 positions)
+EXIT_MULTIPLE_MIN = 5.0
+EXIT_MULTIPLE_MAX = 20.0
+EXIT_MULTIPLE_STEP = 0.1
+GROWTH_STEP = 0.1
+# Whole-year holds available between the 2025 and 2040 entry/exit quarters
+MAX_HOLDING_PERIOD = 15
+
+
+def uniform_grid(start, stop, step):
+    count = int(round((stop - start) / step)) + 1
+    return np.round(start + step * np.arange(count), 10)
+
+
+EXIT_MULTIPLE_GRID = uniform_grid(EXIT_MULTIPLE_MIN, EXIT_MULTIPLE_MAX, EXIT_MULTIPLE_STEP)
+GROWTH_GRID = uniform_grid(GROWTH_BOUNDS[0], GROWTH_BOUNDS[1], GROWTH_STEP)
+HOLDING_PERIOD_GRID = np.arange(1, MAX_HOLDING_PERIOD + 1, dtype=float)
+
+
+# Index of the grid point nearest to value on a uniformly spaced axis
+def nearest_index(grid, value):
+    step = grid[1] - grid[0] if len(grid) > 1 else 1.0
+    index = int(round((value - grid[0]) / step))
+    if not 0 <= index < len(grid):
+        raise ValueError(f"{value} is outside the grid [{grid[0]}, {grid[-1]}]")
+    return index
+
+
+@dataclass(frozen=True)
+class SensitivitySurface:
+    base: DealInputs
+    exit_multiples: np.ndarray
+    revenue_growths: np.ndarray
+    holding_periods: np.ndarray
+    irr: np.ndarray  # %, shape (multiples, growths, holding periods)
+    moic: np.ndarray
+
+    # Holds are cut to whole projection years, as DealInputs.projection_years does
+    def index(self, exit_multiple, revenue_growth, holding_period):
+        return (
+            nearest_index(self.exit_multiples, exit_multiple),
+            nearest_index(self.revenue_growths, revenue_growth),
+            nearest_index(self.holding_periods, int(holding_period)),
+        )
+
+    # O(1) IRR/MOIC for a slider position, snapped to the nearest grid point
+    def lookup(self, exit_multiple, revenue_growth, holding_period):
+        i = self.index(exit_multiple, revenue_growth, holding_period)
+        return float(self.irr[i]), float(self.moic[i])
+
+    # Exit multiple x growth slice for one holding period, as used by the heatmaps
+    def slice_for_holding_period(self, holding_period, metric="irr"):
+        values = getattr(self, metric)
+        return values[:, :, nearest_index(self.holding_periods, int(holding_period))]
+
+
+def build_surface(
+    base,
+    exit_multiples=EXIT_MULTIPLE_GRID,
+    revenue_growths=GROWTH_GRID,
+    holding_periods=HOLDING_PERIOD_GRID,
+):
+    exit_multiples = np.asarray(exit_multiples, dtype=float)
+    revenue_growths = np.asarray(revenue_growths, dtype=float)
+    holding_periods = np.asarray(holding_periods, dtype=float)
+
+    result = evaluate_batch(
+        ownership_stake=base.ownership_stake,
+        starting_enterprise_value=base.starting_enterprise_value,
+        starting_revenue=base.starting_revenue,
+        revenue_growth=revenue_growths[None, :, None],
+        exit_multiple=exit_multiples[:, None, None],
+        holding_period_years=holding_periods[None, None, :],
+        starting_debt=base.starting_debt,
+        ending_debt=base.ending_debt,
+        include_debt=base.include_debt,
+        debt_terms=base.debt_terms,
+    )
+    return SensitivitySurface(
+        base=base,
+        exit_multiples=exit_multiples,
+        revenue_growths=revenue_growths,
+        holding_periods=holding_periods,
+        irr=result.irr,
+        moic=result.moic,
+    )
+
+
+@lru_cache(maxsize=8)
+def _cached_surface(base):
+    return cached_result("surface", lambda: build_surface(base), base)
+
+
+# One surface per base deal; slider inputs are dropped from the cache key so every
+# slider position of the same deal is served from the same precomputed tensor
+def get_surface(deal):
+    return _cached_surface(replace(deal, revenue_growth=0.0, exit_multiple=0.0, holding_period_years=0.0))
+
+
+@dataclass(frozen=True)
+class ExitMultipleSweep:
+    base: DealInputs
+    exit_multiples: np.ndarray
+    revenue_growth: np.ndarray  # %, at each exit multiple
+    result: BatchResult
+
+
+# Returns at every exit multiple slider position in one vectorized pass. With a desired
+# MOIC the growth needed to reach it is re-solved at each multiple, as App.py does.
+def sweep_exit_multiples(deal, desired_moic=None, exit_multiples=EXIT_MULTIPLE_GRID):
+    exit_multiples = np.asarray(exit_multiples, dtype=float)
+    if desired_moic is None:
+        revenue_growth = np.full(exit_multiples.shape, float(deal.revenue_growth))
+    else:
+        revenue_growth = solve_for_revenue_growth_batch(
+            desired_moic,
+            deal.starting_enterprise_value,
+            deal.starting_revenue,
+            exit_multiples,
+            deal.holding_period_years,
+        ).revenue_growth
+
+    result = evaluate_batch(
+        ownership_stake=deal.ownership_stake,
+        starting_enterprise_value=deal.starting_enterprise_value,
+        starting_revenue=deal.starting_revenue,
+        revenue_growth=revenue_growth,
+        exit_multiple=exit_multiples,
+        holding_period_years=deal.holding_period_years,
+        starting_debt=deal.starting_debt,
+        ending_debt=deal.ending_debt,
+        include_debt=deal.include_debt,
+        debt_terms=deal.debt_terms,
+    )
+    return ExitMultipleSweep(base=deal, exit_multiples=exit_multiples, revenue_growth=revenue_growth, result=result)
@@ -0,0 +1,67 @@
+import html
+
+import numpy as np
+
+
+# One stylesheet per page; tables only carry class names
+TABLE_CSS = """
+.nba-table {border-collapse: collapse; width: 100%; font-family: Arial, sans-serif;}
+.nba-table th {background-color: #0056b3; color: white; font-weight: bold; text-align: center; padding: 8px; border: 1px solid #ddd;}
+.nba-table td {background-color: white; text-align: center; padding: 8px; border: 1px solid #ddd;}
+.nba-table.projections th, .nba-table.projections td {padding: 10px;}
+.nba-table.summary th, .nba-table.summary td {text-align: left;}
+.nba-table td.label {font-weight: bold;}
+.nba-table td.value {text-align: right;}
+"""
+
+
+def table_stylesheet():
+    return f"<style>{TABLE_CSS}</style>"
+
+
+NUMBER_TYPES = (int, float, np.number)
+
+
+# Numbers to 1 decimal with thousands separators, negatives in parentheses. Cells are
+# formatted one by one: numpy has no thousands separator, and np.char.mod or Series.map
+# still format element by element and measured slower than this loop
+def format_accounting(values):
+    values = np.asarray(values, dtype=float)
+    formatted = np.array([f"{v:,.1f}" for v in np.abs(values).ravel().tolist()], dtype=object).reshape(values.shape)
+    negative = values < 0
+    formatted[negative] = "(" + formatted[negative] + ")"
+    return formatted
+
+
+# Render a DataFrame as an HTML table: every numeric cell is formatted in one pass,
+# tags are added with array broadcasting and the markup is built with a single join
+def render_table(df, variant="", first_column_class="", value_column_class=""):
+    values = df.to_numpy()
+    n_rows, n_cols = values.shape
+
+    if values.dtype.kind in "fiu":
+        cells = format_accounting(values)
+    else:
+        flat = values.ravel()
+        items = flat.tolist()
+        numeric = np.array([isinstance(v, NUMBER_TYPES) and not isinstance(v, bool) for v in items], dtype=bool)
+        cells = np.empty(len(items), dtype=object)
+        if numeric.any():
+            cells[numeric] = format_accounting(flat[numeric].astype(float))
+        text = np.flatnonzero(~numeric)
+        cells[text] = [html.escape(str(items[i])) for i in text.tolist()]
+        cells = cells.reshape(n_rows, n_cols)
+
+    classes = [first_column_class] + [value_column_class] * (n_cols - 1)
+    open_tags = np.array([f'<td class="{c}">' if c else "<td>" for c in classes[:n_cols]], dtype=object)
+    cells = open_tags + cells + "</td>"
+
+    header = "".join(f"<th>{html.escape(str(col))}</th>" for col in df.columns.tolist())
+    rows = ["<tr>" + "".join(row) + "</tr>" for row in cells.tolist()]
+    return "".join([
+        f'<table class="nba-table {variant}"><thead><tr>',
+        header,
+        "</tr></thead><tbody>",
+        *rows,
+        "</tbody></table>",
+    ])
@@ -0,0 +1,214 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from underwriting.irr import solve_irr
+
+
+@dataclass(frozen=True)
+class FundTerms:
+    management_fee: float = 2.0  # annual % of capital invested, paid by the LPs each period the deal is held
+    preferred_return: float = 8.0  # annual % hurdle, compounded on unreturned contributions
+    catch_up: float = 100.0  # % of distributions past the hurdle paid to the GP until it has its carry
+    carried_interest: float = 20.0  # % of profits paid to the GP
+
+    def __post_init__(self):
+        if not 0 <= self.carried_interest < 100:
+            raise ValueError("Carried interest must be at least 0% and below 100%.")
+        if not 0 <= self.catch_up <= 100:
+            raise ValueError("Catch-up must be between 0% and 100%.")
+
+
+DEFAULT_FUND_TERMS = FundTerms()
+
+
+@dataclass(frozen=True)
+class NetReturns:
+    management_fees: np.ndarray  # total paid by the LPs
+    carried_interest: np.ndarray  # total paid to the GP
+    irr: np.ndarray  # annual %, to the LPs; NaN where they get nothing back
+    moic: np.ndarray  # LP distributions over LP contributions, fees included
+
+
+@dataclass(frozen=True)
+class Waterfall:
+    lp_cash_flows: np.ndarray  # (..., P + 1) contributions (-), fees included, and distributions (+)
+    gp_cash_flows: np.ndarray  # (..., P + 1) management fees and carried interest received
+    net: NetReturns
+
+
+# Splits one distribution per scenario between the LPs and the GP. hurdle is what the LPs
+# are still owed (unreturned contributions, capital, plus unpaid preferred return); profits
+# are what each side has been paid beyond contributions so far. Returns the LP and GP
+# shares and the updated hurdle, capital and profits.
+def _distribute(amount, hurdle, capital, lp_profit, gp_profit, terms):
+    carry = terms.carried_interest / 100
+    catch_up = terms.catch_up / 100
+
+    # Contributions and preferred return back to the LPs
+    to_lp = np.minimum(amount, hurdle)
+    returned = np.minimum(to_lp, capital)
+    hurdle = hurdle - to_lp
+    capital = capital - returned
+    lp_profit = lp_profit + to_lp - returned
+    remaining = amount - to_lp
+
+    # Catch-up: the GP takes catch_up of the next y distributed, where
+    # gp + catch_up * y = carry * (profits so far + y), after which it holds carry of all profits
+    to_gp = np.zeros(np.shape(remaining))
+    if catch_up > carry:
+        owed = np.maximum(carry * (lp_profit + gp_profit) - gp_profit, 0.0) / (catch_up - carry)
+        caught_up = np.minimum(remaining, owed)
+        to_gp = catch_up * caught_up
+        to_lp = to_lp + caught_up - to_gp
+        lp_profit = lp_profit + caught_up - to_gp
+        remaining = remaining - caught_up
+
+    # Carried interest split
+    to_gp = to_gp + carry * remaining
+    to_lp = to_lp + (1 - carry) * remaining
+    lp_profit = lp_profit + (1 - carry) * remaining
+    return to_lp, to_gp, hurdle, capital, lp_profit, gp_profit + to_gp
+
+
+# European (whole-deal) waterfall for every scenario at once. gross_cash_flows (..., P + 1)
+# are the fund's flows with the deal at the end of each period: capital calls (-) and
+# distributions (+). The LPs fund the calls plus management fees; each distribution goes
+# to the LPs until their contributions and the compounded preferred return are repaid,
+# then catch_up % of it to the GP until the GP holds carried_interest % of the profits,
+# and the rest is split carried_interest % to the GP. The recursion runs over periods;
+# every step is vectorized across scenarios. See entry_exit_waterfall for deals with no
+# flows between entry and exit.
+def distribution_waterfall(gross_cash_flows, terms=DEFAULT_FUND_TERMS, periods_per_year=1):
+    flows = np.asarray(gross_cash_flows, dtype=float)
+    shape, count = flows.shape[:-1], flows.shape[-1]
+    calls = np.clip(-flows, 0.0, None)
+
+    # Fees accrue on the capital invested so far, in advance, for every period before the
+    # last flow (the exit)
+    last = count - 1 - np.argmax(flows[..., ::-1] != 0, axis=-1)
+    held = np.arange(count) < last[..., None]
+    fees = np.where(held, np.cumsum(calls, axis=-1) * terms.management_fee / 100 / periods_per_year, 0.0)
+    contributions = calls + fees
+
+    # Period-major copies, so each step reads and writes contiguous rows
+    period_contributions = np.ascontiguousarray(np.moveaxis(contributions, -1, 0))
+    period_distributions = np.ascontiguousarray(np.moveaxis(np.clip(flows, 0.0, None), -1, 0))
+    lp_distributions = np.zeros((count,) + shape)
+    gp_distributions = np.zeros((count,) + shape)
+
+    growth = 1 + terms.preferred_return / 100 / periods_per_year
+    hurdle = np.zeros(shape)
+    capital = np.zeros(shape)
+    lp_profit = np.zeros(shape)
+    gp_profit = np.zeros(shape)
+    for t in range(count):
+        hurdle = hurdle * growth + period_contributions[t]
+        capital = capital + period_contributions[t]
+        # Most periods of a buyout distribute nothing
+        if period_distributions[t].any():
+            lp_distributions[t], gp_distributions[t], hurdle, capital, lp_profit, gp_profit = _distribute(
+                period_distributions[t], hurdle, capital, lp_profit, gp_profit, terms
+            )
+
+    lp_distributions = np.moveaxis(lp_distributions, 0, -1)
+    gp_distributions = np.moveaxis(gp_distributions, 0, -1)
+    lp_cash_flows = lp_distributions - contributions
+    solution = solve_irr(lp_cash_flows.reshape(-1, count), np.arange(count) / periods_per_year)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        moic = lp_distributions.sum(axis=-1) / contributions.sum(axis=-1)
+
+    return Waterfall(
+        lp_cash_flows=lp_cash_flows,
+        gp_cash_flows=fees + gp_distributions,
+        net=NetReturns(
+            management_fees=fees.sum(axis=-1),
+            carried_interest=gp_distributions.sum(axis=-1),
+            irr=solution.rate.reshape(shape) * 100,
+            moic=moic,
+        ),
+    )
+
+
+# (1 + rate) + (1 + rate) ** 2 + ... + (1 + rate) ** periods, accurate near a zero rate
+def _growth_sum(rate, periods):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total = (1 + rate) * np.expm1(periods * np.log1p(rate)) / rate
+    return np.where(rate == 0, periods, total)
+
+
+# Net returns of entry -> exit deals, as distribution_waterfall gives for
+# [-entry, 0, ..., 0, exit] but with no per-period arrays: the hurdle and fees at exit are
+# geometric sums, and the LP IRR solves
+#     exit_to_lp = (1 + r) ** periods * entry + fee * growth_sum(r, periods)
+# by Newton's method. The right-hand side is convex and increasing in r, so from any start
+# the first step lands above the root and the rest close in on it from above.
+def entry_exit_waterfall(entry_cash_flow, exit_cash_flow, periods, terms=DEFAULT_FUND_TERMS, periods_per_year=1,
+                         tol=1e-12, max_iter=50):
+    entry_cash_flow, exit_cash_flow, periods = np.broadcast_arrays(
+        np.asarray(entry_cash_flow, dtype=float),
+        np.asarray(exit_cash_flow, dtype=float),
+        np.maximum(np.asarray(periods, dtype=float), 1),
+    )
+    fee = entry_cash_flow * terms.management_fee / 100 / periods_per_year
+    management_fees = fee * periods
+    contributions = entry_cash_flow + management_fees
+    hurdle_rate = terms.preferred_return / 100 / periods_per_year
+    hurdle = entry_cash_flow * (1 + hurdle_rate) ** periods + fee * _growth_sum(hurdle_rate, periods)
+
+    zero = np.zeros(entry_cash_flow.shape)
+    to_lp, to_gp, _, _, _, _ = _distribute(np.maximum(exit_cash_flow, 0.0), hurdle, contributions, zero, zero, terms)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        valid = (entry_cash_flow > 0) & (to_lp > 0)
+        # Starting from every contribution collapsed to its value-weighted time, which is
+        # within a rounding of the root for fees this small against the entry cheque
+        contribution_time = fee * periods * (periods - 1) / 2 / contributions
+        rate = np.where(valid, (to_lp / contributions) ** (1 / (periods - contribution_time)) - 1, np.nan)
+        # Whole-array steps: rows already at their root stay put, and gathering the rows
+        # still moving costs more than stepping them all
+        for _ in range(max_iter if terms.management_fee else 0):
+            compounded, fee_growth, fee_slope = _compounding(rate, periods)
+            residual = compounded * entry_cash_flow + fee * fee_growth - to_lp
+            slope = periods * compounded / (1 + rate) * entry_cash_flow + fee * fee_slope
+            step = residual / slope
+            rate = rate - step
+            if not (np.abs(step) > tol * (1 + np.abs(rate))).any():
+                break
+        moic = to_lp / contributions
+
+    return NetReturns(
+        management_fees=management_fees,
+        carried_interest=to_gp,
+        irr=((1 + rate) ** periods_per_year - 1) * 100,
+        moic=moic,
+    )
+
+
+# (1 + r) ** n, _growth_sum and its derivative in r, (n (1 + r) ** n r - ((1 + r) ** n - 1)) / r ** 2,
+# sharing one log and exponential; near a zero rate the derivative takes its limit n (n + 1) / 2
+def _compounding(rate, periods):
+    less_one = np.expm1(periods * np.log1p(rate))
+    compounded = less_one + 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        growth_sum = np.where(rate == 0, periods, (1 + rate) * less_one / rate)
+        slope = np.where(
+            np.abs(rate) < 1e-6, periods * (periods + 1) / 2, (periods * compounded * rate - less_one) / rate ** 2
+        )
+    return compounded, growth_sum, slope
+
+
+# Net LP returns and flows of one underwritten deal (engine.DealResult), whose cash flows
+# are the stake's
+def deal_waterfall(deal, terms=DEFAULT_FUND_TERMS):
+    waterfall = distribution_waterfall(np.asarray(deal.cash_flows, dtype=float), terms)
+    return Waterfall(
+        lp_cash_flows=waterfall.lp_cash_flows.tolist(),
+        gp_cash_flows=waterfall.gp_cash_flows.tolist(),
+        net=NetReturns(
+            management_fees=float(waterfall.net.management_fees),
+            carried_interest=float(waterfall.net.carried_interest),
+            irr=float(waterfall.net.irr),
+            moic=float(waterfall.net.moic),
+        ),
+    )